@@ -0,0 +1,175 @@
+"""
+NephroMind - Control de admisión y backpressure
+Límites de concurrencia por endpoint con cola de espera acotada (middleware
+ASGI, rechaza antes de leer el cuerpo) y token bucket para las llamadas a Gemini.
+"""
+
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    """No se obtuvo turno del limitador dentro del tiempo máximo de espera."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    Semáforo con cola de espera acotada.
+
+    - Si hay hueco, la petición entra directamente.
+    - Si no, espera en cola hasta `queue_timeout` segundos (503 si vence).
+    - Si la cola ya tiene `max_queue` peticiones, se rechaza al instante (429).
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float, retry_after: int = 10):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.waiting = 0
+        self.active = 0
+
+    async def acquire(self) -> Optional[int]:
+        """
+        Intenta obtener un hueco.
+
+        Returns:
+            None si se admitió, o el código HTTP de rechazo (429/503)
+        """
+        if self.waiting >= self.max_queue and self._semaphore.locked():
+            return 429
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            return 503
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        return None
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+        }
+
+
+class AdmissionMiddleware:
+    """
+    Middleware ASGI que aplica un ConcurrencyLimiter por ruta.
+
+    Al ejecutarse antes que FastAPI, las peticiones rechazadas no llegan a
+    subir el cuerpo (hasta 50 MB en /analyze_pdf).
+    """
+
+    def __init__(self, app, limits: Dict[str, ConcurrencyLimiter]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limiter is None or scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        status = await limiter.acquire()
+        if status is not None:
+            logger.warning(f"Petición rechazada ({status}) en {scope['path']}: {limiter.stats()}")
+            await self._reject(send, status, limiter.retry_after)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+    @staticmethod
+    async def _reject(send, status: int, retry_after: int) -> None:
+        detail = ("Demasiadas peticiones en cola" if status == 429
+                  else "Servicio saturado, reintente más tarde")
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe: `rate` tokens por segundo, ráfagas de hasta
+    `capacity`. `acquire` bloquea hasta `max_wait` segundos (`acquire_async`
+    espera sin bloquear el event loop).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: float) -> float:
+        """Reserva tokens y devuelve cuánto hay que esperar para usarlos."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def _admit(self, tokens: float, max_wait: float) -> float:
+        """Reserva tokens o lanza RateLimitExceeded si la espera supera `max_wait`."""
+        wait = self._reserve(tokens)
+        if wait > max_wait:
+            # Devolver la reserva: no se va a usar
+            with self._lock:
+                self._tokens += tokens
+            raise RateLimitExceeded(
+                f"Límite de peticiones a Gemini alcanzado (espera estimada {wait:.0f}s)",
+                retry_after=wait
+            )
+        return wait
+
+    def acquire(self, tokens: float = 1.0, max_wait: float = 60.0) -> None:
+        """
+        Espera a que haya `tokens` disponibles.
+
+        Raises:
+            RateLimitExceeded: si la espera necesaria supera `max_wait`
+        """
+        wait = self._admit(tokens, max_wait)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1.0, max_wait: float = 60.0) -> None:
+        """Como `acquire`, pero la espera no bloquea el event loop."""
+        wait = self._admit(tokens, max_wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
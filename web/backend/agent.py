@@ -1,14 +1,28 @@
 """
 NephroMind - Medical Record Extractor Agent
 Uses Google Gemini AI to extract structured patient data from clinical PDF documents.
+
+El extractor está pensado como servicio de larga vida (una instancia por
+proceso): `genai.configure` reinicia los clientes del SDK, así que crear un
+extractor por petición abría un canal nuevo con Gemini cada vez. Con una
+sola instancia, todas las extracciones comparten el cliente asíncrono (un
+canal gRPC persistente, HTTP/2 multiplexado) y corren como corrutinas en
+el event loop, sin un hilo por petición.
 """
 
 import os
 import json
 import re
-from typing import Dict, Any, Optional
+import asyncio
+from typing import Dict, Any, Optional, Callable
 import google.generativeai as genai
 
+from clinical_scores import egfr_ckdepi
+from admission import TokenBucket, RateLimitExceeded
+from imputation import impute_record
+from json_stream import IncrementalObjectParser
+from pdf_triage import triage_pdf
+
 # Configuración de logging
 import logging
 logging.basicConfig(level=logging.INFO)
@@ -47,6 +61,34 @@ SAFETY_SETTINGS_DICT = [
 ]
 
 
+# Limitador compartido por todos los extractores del proceso: evita que una
+# ráfaga de PDFs choque con el rate limit del proveedor
+GEMINI_RATE_LIMITER = TokenBucket(
+    rate=float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60")) / 60,
+    capacity=float(os.getenv("GEMINI_BURST", "5"))
+)
+GEMINI_MAX_WAIT = float(os.getenv("GEMINI_RATE_LIMIT_MAX_WAIT", "60"))
+
+# Modo hedged: si la estrategia en curso no ha respondido en este tiempo (s)
+# se lanza la siguiente en paralelo y gana la primera respuesta válida.
+# 0 desactiva el modo (estrategias en serie, solo ante bloqueo de seguridad)
+GEMINI_HEDGE_DELAY = float(os.getenv("GEMINI_HEDGE_DELAY", "0"))
+
+# Campos en los que un 0 extraído significa "no encontrado" en el PDF
+EXTRACTION_ZERO_AS_MISSING = (
+    'BMI', 'PhysicalActivity', 'SystolicBP', 'DiastolicBP',
+    'FastingBloodSugar', 'HbA1c', 'HemoglobinLevels',
+    'SerumElectrolytesSodium', 'SerumElectrolytesPotassium',
+    'SerumElectrolytesCalcium', 'SerumElectrolytesPhosphorus',
+    'CholesterolTotal', 'CholesterolLDL', 'CholesterolHDL', 'CholesterolTriglycerides',
+    'MedicationAdherence', 'HealthLiteracy', 'MedicalCheckupsFrequency',
+)
+
+# Callback de progreso: on_event(tipo, datos). Tipos: 'progress' (etapa,
+# intento, estrategia) y 'field' (campo decodificado del streaming)
+EventCallback = Callable[[str, Dict[str, Any]], None]
+
+
 class MedicalRecordExtractor:
     """
     Extractor de datos médicos de historias clínicas en PDF usando Gemini AI.
@@ -81,12 +123,29 @@ class MedicalRecordExtractor:
         
         logger.error("No se pudo inicializar ningún modelo de Gemini")
     
-    def extract_patient_data(self, pdf_path: str) -> Dict[str, Any]:
+    def extract_patient_data(self, pdf_path: str, on_event: Optional[EventCallback] = None) -> Dict[str, Any]:
+        """
+        Versión síncrona de `extract_patient_data_async` (línea de comandos).
+        No usar desde el event loop del servidor.
+        """
+        return asyncio.run(self.extract_patient_data_async(pdf_path, on_event))
+
+    async def extract_patient_data_async(
+        self,
+        pdf_path: str,
+        on_event: Optional[EventCallback] = None
+    ) -> Dict[str, Any]:
         """
         Extrae datos estructurados del paciente desde un PDF de historia clínica.
         
+        Cancelar la corrutina (p.ej. al desconectarse el cliente) cancela las
+        llamadas a Gemini en curso y limpia el PDF reducido.
+        
         Args:
             pdf_path: Ruta al archivo PDF
+            on_event: Callback opcional de progreso. Los eventos 'field' son
+                provisionales (valor tal cual lo escribe Gemini); el resultado
+                devuelto, con gaps rellenados, es el definitivo
             
         Returns:
             Diccionario con los datos del paciente extraídos
@@ -97,7 +156,20 @@ class MedicalRecordExtractor:
         if not self.model:
             raise Exception("GEMINI_API_KEY no configurada. No se puede extraer datos sin IA.")
 
-        import time
+        emit = on_event or (lambda event, data: None)
+
+        # Triaje local: solo se suben las páginas con datos clínicos (CPU, fuera del loop)
+        upload_path, triage = await asyncio.to_thread(triage_pdf, pdf_path)
+        if triage:
+            emit('progress', {'stage': 'triage', **triage})
+        try:
+            return await self._extract_with_retries(upload_path, emit)
+        finally:
+            if upload_path != pdf_path and os.path.exists(upload_path):
+                os.remove(upload_path)
+
+    async def _extract_with_retries(self, pdf_path: str, emit: EventCallback) -> Dict[str, Any]:
+        """Sube el PDF y extrae con reintentos y estrategia neutral ante bloqueos."""
         max_retries = 10
         retry_delay = 2
 
@@ -107,15 +179,23 @@ class MedicalRecordExtractor:
                 
                 # Subir archivo a Gemini (si no existe ya, aunque aquí lo subimos cada vez para asegurar)
                 # En producción idealmente se reusaría el file handle si es posible
-                uploaded_file = genai.upload_file(pdf_path)
+                emit('progress', {'stage': 'upload', 'attempt': attempt + 1, 'max_attempts': max_retries})
+                await GEMINI_RATE_LIMITER.acquire_async(max_wait=GEMINI_MAX_WAIT)
+                # El SDK solo ofrece subida síncrona: se delega a un hilo
+                # durante la subida; la generación es asíncrona
+                uploaded_file = await asyncio.to_thread(genai.upload_file, pdf_path)
                 logger.info(f"Archivo subido: {uploaded_file.name}")
 
+                if GEMINI_HEDGE_DELAY > 0:
+                    return await self._hedged_extraction(uploaded_file, emit)
+
                 # ESTRATEGIA 1: Intento con prompt detallado
                 try:
-                    return self._try_extraction_with_prompt(
+                    return await self._try_extraction_with_prompt(
                         uploaded_file, 
                         self._build_extraction_prompt(),
-                        "detallado"
+                        "detallado",
+                        emit
                     )
                 except Exception as e:
                     error_msg = str(e)
@@ -123,14 +203,18 @@ class MedicalRecordExtractor:
                     # Si fue bloqueado por seguridad, intentar con prompt neutral
                     if "bloqueado" in error_msg.lower() or "safety" in error_msg.lower():
                         logger.warning("⚠ Primer intento bloqueado. Reintentando con prompt neutral...")
+                        emit('progress', {'stage': 'fallback', 'attempt': attempt + 1, 'strategy': 'neutral'})
                         
                         # ESTRATEGIA 2: Prompt más neutral para evitar filtros
                         try:
-                            return self._try_extraction_with_prompt(
+                            return await self._try_extraction_with_prompt(
                                 uploaded_file,
                                 self._build_neutral_prompt(),
-                                "neutral"
+                                "neutral",
+                                emit
                             )
+                        except RateLimitExceeded:
+                            raise
                         except Exception as e2:
                             logger.error(f"Segundo intento también falló: {e2}")
                             # Si no es el último intento, lanzar para que el loop externo lo capture y reintente
@@ -142,30 +226,108 @@ class MedicalRecordExtractor:
                         # No es un error de seguridad, relanzar
                         raise
 
+            except RateLimitExceeded:
+                # Sin turno en el limitador: reintentar solo empeoraría la cola
+                raise
             except Exception as e:
                 logger.error(f"Error en intento {attempt + 1}: {e}")
                 if attempt < max_retries - 1:
                     wait_time = retry_delay * (attempt + 1)
                     logger.info(f"Reintentando en {wait_time} segundos...")
-                    time.sleep(wait_time)
+                    emit('progress', {'stage': 'retry_wait', 'attempt': attempt + 1, 'wait_seconds': wait_time})
+                    await asyncio.sleep(wait_time)
                 else:
                     import traceback
                     traceback.print_exc()
                     raise Exception(f"No se pudo extraer datos después de {max_retries} intentos. Error: {str(e)}")
     
-    def _try_extraction_with_prompt(self, uploaded_file, prompt: str, strategy: str) -> Dict[str, Any]:
+    async def _hedged_extraction(self, uploaded_file, emit: EventCallback) -> Dict[str, Any]:
+        """
+        Ejecuta las estrategias de forma especulativa.
+
+        Arranca la detallada; si no termina en GEMINI_HEDGE_DELAY segundos (o
+        falla antes) arranca la neutral en paralelo. Gana la primera que pasa
+        parseo y validación y se cancelan las demás.
+
+        Si una estrategia se queda sin turno en el limitador de Gemini se sigue
+        esperando a las demás: RateLimitExceeded solo se propaga si ninguna
+        estrategia tiene éxito.
+        """
+        strategies = [
+            ("detallado", self._build_extraction_prompt()),
+            ("neutral", self._build_neutral_prompt()),
+        ]
+        pending: Dict[asyncio.Task, str] = {}
+        errors = []
+        rate_limited: Optional[RateLimitExceeded] = None
+
+        def launch() -> None:
+            strategy, prompt = strategies.pop(0)
+            if pending:
+                logger.info(f"Hedge: lanzando estrategia {strategy} en paralelo")
+            emit('progress', {'stage': 'hedge', 'strategy': strategy})
+            task = asyncio.create_task(
+                self._try_extraction_with_prompt(uploaded_file, prompt, strategy, emit)
+            )
+            pending[task] = strategy
+
+        launch()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, timeout=GEMINI_HEDGE_DELAY if strategies else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    strategy = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except RateLimitExceeded as e:
+                        logger.warning(f"Hedge: estrategia {strategy} sin turno en el limitador")
+                        rate_limited = e
+                        continue
+                    except Exception as e:
+                        logger.warning(f"Hedge: estrategia {strategy} falló: {e}")
+                        errors.append(f"{strategy}: {e}")
+                        continue
+                    logger.info(f"Hedge: gana la estrategia {strategy}")
+                    return result
+                # Venció el plazo o falló una estrategia: lanzar la siguiente
+                if strategies and (not done or not pending):
+                    launch()
+        finally:
+            # Perdedoras, o todas si se cancela la extracción
+            for task in pending:
+                task.cancel()
+
+        if rate_limited is not None:
+            raise rate_limited
+        raise Exception(f"Todas las estrategias fallaron: {'; '.join(errors)}")
+
+    async def _try_extraction_with_prompt(
+        self,
+        uploaded_file,
+        prompt: str,
+        strategy: str,
+        emit: EventCallback
+    ) -> Dict[str, Any]:
         """
         Intenta extraer datos con un prompt específico.
         
+        La respuesta se pide en streaming: cada campo de primer nivel se emite
+        como evento 'field' en cuanto llega completo.
+        
         Args:
             uploaded_file: Archivo subido a Gemini
             prompt: Prompt a usar
             strategy: Nombre de la estrategia para logging
+            emit: Callback de progreso
             
         Returns:
             Datos extraídos del PDF
         """
         logger.info(f"Intentando extracción con estrategia: {strategy}")
+        emit('progress', {'stage': 'extraction', 'strategy': strategy})
         
         # Configuración de generación para respuestas estructuradas
         generation_config = genai.GenerationConfig(
@@ -181,12 +343,16 @@ class MedicalRecordExtractor:
         for safety_config_name, safety_config in [("enum", SAFETY_SETTINGS), ("dict", SAFETY_SETTINGS_DICT)]:
             try:
                 logger.info(f"Intentando con safety config: {safety_config_name}")
-                response = self.model.generate_content(
+                await GEMINI_RATE_LIMITER.acquire_async(max_wait=GEMINI_MAX_WAIT)
+                response = await self.model.generate_content_async(
                     [uploaded_file, prompt],
                     generation_config=generation_config,
-                    safety_settings=safety_config
+                    safety_settings=safety_config,
+                    stream=True
                 )
                 break  # Si funciona, salir del loop
+            except RateLimitExceeded:
+                raise
             except Exception as e:
                 last_error = e
                 logger.warning(f"Fallo con safety config {safety_config_name}: {e}")
@@ -195,6 +361,16 @@ class MedicalRecordExtractor:
         if response is None:
             raise Exception(f"No se pudo generar respuesta con ninguna configuración de seguridad: {last_error}")
         
+        # Consumir el stream; al terminar, response agrega candidatos y texto
+        parser = IncrementalObjectParser()
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # Trozo sin texto (p.ej. cortado por seguridad): se comprueba abajo
+            for field, value in parser.feed(text):
+                emit('field', {'field': field, 'value': self._normalize_decimals(value)})
+        
         # Verificar si la respuesta fue bloqueada
         if not response.candidates:
             logger.error(f"❌ Gemini no devolvió candidatos ({strategy})")
@@ -257,6 +433,15 @@ class MedicalRecordExtractor:
         
         logger.debug(f"Respuesta de Gemini ({strategy}): {content[:500]}...")
         
+        # Parseo, imputación y validación son CPU: fuera del event loop
+        extracted_data = await asyncio.to_thread(self._finalize_extraction, content)
+        
+        logger.info(f"✓ Datos extraídos exitosamente ({strategy}) - Paciente de {extracted_data.get('Age', '?')} años")
+        
+        return extracted_data
+    
+    def _finalize_extraction(self, content: str) -> Dict[str, Any]:
+        """Parsea la respuesta de Gemini, rellena gaps clínicos y valida."""
         # Extraer y parsear JSON
         extracted_data = self._parse_json_response(content)
         
@@ -265,9 +450,6 @@ class MedicalRecordExtractor:
         
         # Validar datos críticos
         self._validate_extracted_data(extracted_data)
-        
-        logger.info(f"✓ Datos extraídos exitosamente ({strategy}) - Paciente de {extracted_data.get('Age', '?')} años")
-        
         return extracted_data
     
     def _build_extraction_prompt(self) -> str:
@@ -537,29 +719,18 @@ Recuerda: Este es material educativo con datos inventados.
 
     def _fill_clinical_gaps(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Rellena valores faltantes con lógica clínica y valores por defecto.
-        """
-        # ============================================
-        # IMC - Nunca debe ser 0
-        # ============================================
-        if not data.get('BMI') or data.get('BMI', 0) == 0:
-            if data.get('HistoryObesity') == 1:
-                data['BMI'] = 32.0
-            elif 'obesidad' in str(data).lower():
-                data['BMI'] = 32.0
-            elif 'sobrepeso' in str(data).lower():
-                data['BMI'] = 27.0
-            else:
-                data['BMI'] = 24.0
+        Corrige valores sospechosos de la extracción y rellena los que faltan
+        con el motor de imputación compartido (ver imputation.py).
         
+        Añade 'imputed_fields' con los campos que no venían en el PDF.
+        """
         # ============================================
         # Actividad Física - Valores sospechosos
         # ============================================
         # Si es muy baja (<0.5) y no es 0, probablemente hay error de extracción
-        if 'PhysicalActivity' in data and 0 < data['PhysicalActivity'] < 0.5:
-            logger.info(f"Ajustando PhysicalActivity sospechosa: {data['PhysicalActivity']} -> 2.0")
-            data['PhysicalActivity'] = 2.0
-        elif not data.get('PhysicalActivity'):
+        physical_activity = data.get('PhysicalActivity') or 0
+        if 0 < physical_activity < 0.5:
+            logger.info(f"Ajustando PhysicalActivity sospechosa: {physical_activity} -> 2.0")
             data['PhysicalActivity'] = 2.0
         
         # ============================================
@@ -570,118 +741,51 @@ Recuerda: Este es material educativo con datos inventados.
         
         # ============================================
         # Inferir condiciones desde labs/medicamentos
+        # (también cuando Gemini las devuelve explícitamente a 0)
         # ============================================
-        
-        # Diabetes desde HbA1c o medicamentos
-        if data.get('HbA1c', 0) > 6.5 or data.get('AntidiabeticMedications') == 1:
+        if (data.get('HbA1c') or 0) > 6.5 or data.get('AntidiabeticMedications') == 1:
             data['HistoryDiabetes'] = 1
         
-        # HTA desde TA o medicamentos
-        if (data.get('SystolicBP', 0) > 140 or 
-            data.get('DiastolicBP', 0) > 90 or
-            data.get('ACEInhibitors') == 1 or 
-            data.get('Diuretics') == 1 or 
+        if ((data.get('SystolicBP') or 0) > 140 or
+            (data.get('DiastolicBP') or 0) > 90 or
+            data.get('ACEInhibitors') == 1 or
+            data.get('Diuretics') == 1 or
             data.get('HTNmeds') == 1):
             data['HistoryHTN'] = 1
         
-        # Obesidad desde IMC
-        if data.get('BMI', 0) > 30:
-            data['HistoryObesity'] = 1
-        
-        # Dislipidemia desde estatinas
         if data.get('Statins') == 1:
             data['HistoryDLD'] = 1
         
         # ============================================
-        # Valores por defecto para electrolitos
-        # ============================================
-        defaults = {
-            'SerumElectrolytesSodium': 140.0,
-            'SerumElectrolytesPotassium': 4.5,
-            'SerumElectrolytesCalcium': 9.5,
-            'SerumElectrolytesPhosphorus': 3.5,
-            'CholesterolTotal': 200.0,
-            'CholesterolLDL': 100.0,
-            'CholesterolHDL': 50.0,
-            'CholesterolTriglycerides': 150.0,
-            'MedicationAdherence': 5.0,
-            'HealthLiteracy': 5.0,
-            'MedicalCheckupsFrequency': 1.0,
-        }
-        
-        for field, default_value in defaults.items():
-            if not data.get(field) or data.get(field, 0) == 0:
-                data[field] = default_value
-        
-        # ============================================
-        # Hemoglobina (ajustar si hay ERC)
+        # Conversión de unidades - ProteinInUrine
         # ============================================
-        if not data.get('HemoglobinLevels') or data.get('HemoglobinLevels', 0) == 0:
-            if data.get('SerumCreatinine', 0) > 2.0 or data.get('GFR', 100) < 45:
-                data['HemoglobinLevels'] = 11.0  # Anemia en ERC
-            else:
-                data['HemoglobinLevels'] = 14.0
+        # Los PDFs suelen reportar en mg/dL pero el modelo espera g/L
+        # Si el valor es > 10 g/L, probablemente está en mg/dL y necesita conversión
+        if (data.get('ProteinInUrine') or 0) > 10:
+            logger.info(f"Convirtiendo ProteinInUrine de mg/dL a g/L: {data['ProteinInUrine']} -> {data['ProteinInUrine']/100}")
+            data['ProteinInUrine'] = data['ProteinInUrine'] / 100
         
         # ============================================
-        # Tensión arterial por defecto
+        # Valores faltantes (Gemini devuelve 0 cuando no encuentra el dato)
         # ============================================
-        if not data.get('SystolicBP') or data.get('SystolicBP', 0) == 0:
-            if data.get('HistoryHTN') == 1:
-                data['SystolicBP'] = 140
-                data['DiastolicBP'] = 85
-            else:
-                data['SystolicBP'] = 120
-                data['DiastolicBP'] = 80
+        data, imputed = impute_record(data, zero_as_missing=EXTRACTION_ZERO_AS_MISSING)
         
-        # ============================================
-        # Control glucémico
-        # ============================================
-        if not data.get('FastingBloodSugar') or data.get('FastingBloodSugar', 0) == 0:
-            if data.get('HistoryDiabetes') == 1:
-                data['FastingBloodSugar'] = 130.0
-                if not data.get('HbA1c') or data.get('HbA1c', 0) == 0:
-                    data['HbA1c'] = 7.5
-            else:
-                data['FastingBloodSugar'] = 90.0
-                if not data.get('HbA1c') or data.get('HbA1c', 0) == 0:
-                    data['HbA1c'] = 5.5
+        # Obesidad desde IMC
+        if data['BMI'] > 30:
+            data['HistoryObesity'] = 1
         
-        # ============================================
         # Colesterol ajustado a dislipidemia
-        # ============================================
         if data.get('HistoryDLD') == 1:
-            if data.get('CholesterolTotal', 0) < 200:
+            if data['CholesterolTotal'] < 200:
                 data['CholesterolTotal'] = 240
-            if data.get('CholesterolLDL', 0) < 100:
+            if data['CholesterolLDL'] < 100:
                 data['CholesterolLDL'] = 130
         
-        # ============================================
-        # Mapeo de nombres alternativos
-        # ============================================
-        
-        # BUN -> BUNLevels (el modelo espera BUNLevels)
-        if 'BUN' in data and 'BUNLevels' not in data:
-            data['BUNLevels'] = data.pop('BUN')
-        elif 'BUNLevels' not in data:
-            data['BUNLevels'] = 15.0
-        
-        # Fatigue -> FatigueLevels (el modelo espera FatigueLevels)
-        if 'Fatigue' in data and 'FatigueLevels' not in data:
-            data['FatigueLevels'] = data.pop('Fatigue')
-        elif 'FatigueLevels' not in data:
-            data['FatigueLevels'] = 0
-        
-        # ============================================
-        # Conversión de unidades - ProteinInUrine
-        # ============================================
-        # Los PDFs suelen reportar en mg/dL pero el modelo espera g/L
-        # Si el valor es > 10 g/L, probablemente está en mg/dL y necesita conversión
-        if 'ProteinInUrine' in data and data['ProteinInUrine'] > 10:
-            logger.info(f"Convirtiendo ProteinInUrine de mg/dL a g/L: {data['ProteinInUrine']} -> {data['ProteinInUrine']/100}")
-            data['ProteinInUrine'] = data['ProteinInUrine'] / 100
+        data['imputed_fields'] = imputed
         
         logger.info(f"Gap-fill completado. IMC={data.get('BMI')}, "
-                   f"Diabetes={data.get('HistoryDiabetes')}, HTA={data.get('HistoryHTN')}")
+                   f"Diabetes={data.get('HistoryDiabetes')}, HTA={data.get('HistoryHTN')}, "
+                   f"imputados={len(imputed)}")
         
         return data
     
@@ -722,18 +826,7 @@ Recuerda: Este es material educativo con datos inventados.
         if not creatinine or creatinine <= 0:
             return 90.0  # Valor normal por defecto
         
-        kappa = 0.7 if gender == 1 else 0.9
-        alpha = -0.241 if gender == 1 else -0.302
-        
-        min_ratio = min(creatinine / kappa, 1.0)
-        max_ratio = max(creatinine / kappa, 1.0)
-        
-        egfr = 142 * (min_ratio ** alpha) * (max_ratio ** -1.200) * (0.9938 ** age)
-        
-        if gender == 1:  # Femenino
-            egfr *= 1.012
-        
-        return round(egfr, 1)
+        return float(egfr_ckdepi(creatinine, age, gender))
 
 
 # Para testing directo
@@ -0,0 +1,102 @@
+"""
+NephroMind - Puntuación columnar con Apache Arrow
+Entrada y salida binarias (Arrow IPC stream/file o Parquet) para
+integraciones servicio a servicio: las columnas llegan con los nombres de
+PatientData y se puntúan en bloque, sin pasar por dicts por paciente.
+"""
+
+import io
+import logging
+from typing import TYPE_CHECKING, Tuple
+
+import numpy as np
+import pandas as pd
+
+from imputation import impute
+import clinical_scores
+
+if TYPE_CHECKING:  # pyarrow se importa solo al usarse
+    import pyarrow as pa
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+REQUIRED_COLUMNS = ('Age', 'Gender')
+ID_COLUMN = 'patient_id'
+
+_ARROW_FILE_MAGIC = b"ARROW1"
+_PARQUET_MAGIC = b"PAR1"
+
+
+class ArrowInputError(ValueError):
+    """Cuerpo ilegible o sin las columnas obligatorias."""
+
+
+def read_table(body: bytes) -> pd.DataFrame:
+    """
+    Lee un Arrow IPC (stream o file) o Parquet, detectado por su cabecera.
+
+    La conversión a pandas reutiliza los buffers de Arrow para columnas
+    numéricas sin nulos (sin copia por fila).
+    """
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    try:
+        if body.startswith(_PARQUET_MAGIC):
+            import pyarrow.parquet as pq
+            table = pq.read_table(io.BytesIO(body))
+        elif body.startswith(_ARROW_FILE_MAGIC):
+            table = ipc.open_file(pa.py_buffer(body)).read_all()
+        else:
+            table = ipc.open_stream(pa.py_buffer(body)).read_all()
+    except (pa.ArrowInvalid, OSError) as e:
+        raise ArrowInputError(f"Cuerpo Arrow/Parquet inválido: {e}")
+
+    missing = [col for col in REQUIRED_COLUMNS if col not in table.column_names]
+    if missing:
+        raise ArrowInputError(f"Faltan columnas obligatorias: {missing}")
+    for col in REQUIRED_COLUMNS:
+        if table.column(col).null_count:
+            raise ArrowInputError(f"La columna {col} tiene {table.column(col).null_count} nulos")
+
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def score_table(model, df: pd.DataFrame) -> Tuple["pa.Table", int]:
+    """
+    Puntúa el lote: imputación, scaler y booster en una sola pasada.
+
+    Returns:
+        (tabla con patient_id si venía, probability, risk_class, egfr,
+        gfr_stage y n_imputed; número de filas)
+    """
+    import pyarrow as pa
+
+    ids = df.pop(ID_COLUMN) if ID_COLUMN in df else None
+    records, imputed = impute(df)
+    result = model.predict_batch(records, imputed=imputed)
+    egfr = records['GFR'].to_numpy(dtype=np.float64)
+
+    columns = {
+        'probability': pa.array(np.asarray(result['probability'], dtype=np.float64)),
+        'risk_class': pa.array(np.asarray(result['prediction'], dtype=np.int8)),
+        'egfr': pa.array(egfr),
+        'gfr_stage': pa.array(clinical_scores.gfr_stage(egfr)).dictionary_encode(),
+        'n_imputed': pa.array(imputed.to_numpy().sum(axis=1).astype(np.int16)),
+    }
+    if ids is not None:
+        columns = {ID_COLUMN: pa.array(ids), **columns}
+    return pa.table(columns), len(records)
+
+
+def write_stream(table) -> bytes:
+    """Serializa la tabla como Arrow IPC stream."""
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    sink = pa.BufferOutputStream()
+    with ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
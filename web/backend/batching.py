@@ -0,0 +1,111 @@
+"""
+NephroMind - Micro-batching de predicciones
+Agrupa peticiones concurrentes de /predict en lotes pequeños que se puntúan
+con una sola llamada vectorizada (scaler + booster + SHAP).
+"""
+
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, List, Tuple
+
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class PredictionBatcher:
+    """
+    Dispatcher en proceso: un hilo recoge peticiones de una cola, espera como
+    máximo `max_wait_ms` a que se junten hasta `max_batch_size` filas, las
+    puntúa con `KidneyDiseaseModel.predict_batch` y resuelve cada Future.
+
+    La latencia añadida está acotada por `max_wait_ms`; con carga baja cada
+    petición sale en un lote de una fila.
+    """
+
+    def __init__(self, model, max_batch_size: int = 64, max_wait_ms: float = 2.0):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Tuple[Dict[str, Any], List[str], Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="prediction-batcher", daemon=True)
+        self._running = False
+
+    def start(self) -> None:
+        """Arranca el hilo dispatcher."""
+        self._running = True
+        self._thread.start()
+        logger.info(f"Micro-batching activo: hasta {self.max_batch_size} filas / "
+                    f"{self.max_wait * 1000:.1f} ms")
+
+    def stop(self) -> None:
+        """Detiene el dispatcher tras vaciar la cola."""
+        self._running = False
+        self._queue.put(None)
+        self._thread.join()
+
+    def submit(self, input_data: Dict[str, Any], imputed: List[str]) -> Future:
+        """
+        Encola una predicción ya imputada con `impute_record`.
+
+        Returns:
+            Future que se resuelve con el mismo diccionario que `predict`
+        """
+        future: Future = Future()
+        self._queue.put((input_data, imputed, future))
+        return future
+
+    def _collect(self) -> List[Tuple[Dict[str, Any], List[str], Future]]:
+        """Bloquea hasta la primera petición y agrupa las que lleguen en la ventana."""
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._running = False
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while self._running or not self._queue.empty():
+            batch = self._collect()
+            if not batch:
+                continue
+
+            futures = [future for _, _, future in batch]
+            imputed = [fields for _, fields, _ in batch]
+            try:
+                records = pd.DataFrame([input_data for input_data, _, _ in batch])
+                mask = pd.DataFrame(
+                    [[col in fields for col in records.columns] for fields in imputed],
+                    index=records.index, columns=records.columns
+                )
+                result = self.model.predict_batch(records, explain=True, imputed=mask)
+                for i, future in enumerate(futures):
+                    future.set_result({
+                        "prediction": int(result["prediction"][i]),
+                        "probability": float(result["probability"][i]),
+                        "threshold": result["threshold"],
+                        "contributors": result["contributors"][i] if result["contributors"] else [],
+                        "imputed_fields": imputed[i]
+                    })
+            except Exception as e:
+                logger.error(f"Error en lote de predicción ({len(batch)} filas): {e}")
+                for future in futures:
+                    if not future.done():
+                        future.set_result({"error": str(e)})
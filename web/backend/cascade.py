@@ -0,0 +1,212 @@
+"""
+NephroMind - Cascada de dos etapas
+Un screener lineal (destilado de los márgenes del booster) decide los casos
+claramente lejos del threshold; el booster completo y SHAP solo se ejecutan
+dentro de una banda de incertidumbre calibrada alrededor del threshold.
+
+La banda se calibra sobre datos no usados para ajustar el screener y solo se
+acepta si la cascada mantiene la sensibilidad objetivo.
+
+Variables de entorno:
+    NEPHROMIND_CASCADE: '1' activa la cascada en serving (por defecto '0')
+"""
+
+import os
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CASCADE_ENABLED = os.getenv("NEPHROMIND_CASCADE", "0") == "1"
+
+# Pérdida de especificidad tolerada frente al booster solo
+MAX_SPECIFICITY_LOSS = 0.01
+# Resolución de la búsqueda de la banda (cuantiles de |logit - logit(threshold)|)
+BAND_GRID_SIZE = 60
+
+
+def _logit(p: np.ndarray) -> np.ndarray:
+    p = np.clip(p, 1e-7, 1 - 1e-7)
+    return np.log(p / (1 - p))
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def _fill_missing(X: np.ndarray) -> np.ndarray:
+    """
+    Entrada del screener: NaN -> 0, la media en el espacio escalado.
+
+    El booster trata los NaN de forma nativa, pero la regresión lineal no; el
+    mismo relleno se usa al ajustar, al calibrar la banda y en serving.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    return np.where(np.isnan(X), 0.0, X)
+
+
+def _rates(y_true: np.ndarray, y_pred: np.ndarray) -> Tuple[float, float]:
+    """Sensibilidad y especificidad (conteo directo: se evalúan miles de bandas)."""
+    positives = y_true == 1
+    n_pos, n_neg = int(positives.sum()), int((~positives).sum())
+    tp = int((y_pred[positives] == 1).sum())
+    tn = int((y_pred[~positives] == 0).sum())
+    sensitivity = tp / n_pos if n_pos > 0 else 0.0
+    specificity = tn / n_neg if n_neg > 0 else 0.0
+    return float(sensitivity), float(specificity)
+
+
+def fit_cascade(
+    booster,
+    X_fit: np.ndarray,
+    X_val: np.ndarray,
+    y_val: np.ndarray,
+    threshold: float,
+    target_sensitivity: float = 0.98
+) -> Dict[str, Any]:
+    """
+    Ajusta el screener y calibra la banda.
+
+    El screener es una regresión ridge sobre el logit del booster en
+    `X_fit` (features escaladas y seleccionadas, ausentes a 0), así su
+    salida está en la misma escala de probabilidad que el threshold. La banda [lower, upper]
+    se elige en `X_val` maximizando los casos resueltos por el screener con
+    sensibilidad >= objetivo y especificidad como mucho MAX_SPECIFICITY_LOSS
+    por debajo del booster solo.
+
+    Args:
+        booster: XGBClassifier entrenado
+        X_fit: Features con las que destilar el screener
+        X_val: Features de validación (no usadas en el ajuste)
+        y_val: Etiquetas de validación
+        threshold: Threshold del booster
+        target_sensitivity: Sensibilidad mínima de la cascada
+
+    Returns:
+        Cascada serializable: coeficientes, banda y métricas de validación
+    """
+    from sklearn.linear_model import Ridge
+
+    screener = Ridge(alpha=1.0).fit(_fill_missing(X_fit), _logit(booster.predict_proba(X_fit)[:, 1]))
+    coef, intercept = screener.coef_.astype(np.float64), float(screener.intercept_)
+
+    y_val = np.asarray(y_val).astype(int)
+    full_pred = (booster.predict_proba(X_val)[:, 1] >= threshold).astype(int)
+    full_sensitivity, full_specificity = _rates(y_val, full_pred)
+
+    # Distancia al threshold en logit; banda asimétrica [-below, +above]
+    distance = _fill_missing(X_val) @ coef + intercept - _logit(np.array([threshold]))[0]
+    grid = np.unique(np.concatenate([
+        np.quantile(np.abs(distance), np.linspace(0, 1, BAND_GRID_SIZE)), [np.inf]
+    ]))
+
+    best = None  # (resueltos, anchura, below, above, sensibilidad, especificidad)
+    for below in grid:
+        early_negative = distance < -below
+        for above in grid:
+            early_positive = distance > above
+            pred = np.where(early_negative, 0, np.where(early_positive, 1, full_pred))
+            sensitivity, specificity = _rates(y_val, pred)
+            if sensitivity < target_sensitivity or specificity < full_specificity - MAX_SPECIFICITY_LOSS:
+                continue
+            resolved = int(early_negative.sum() + early_positive.sum())
+            candidate = (resolved, below + above, below, above, sensitivity, specificity)
+            # Mismos resueltos: preferir la banda más ancha (más conservadora)
+            if best is None or candidate[:2] > best[:2]:
+                best = candidate
+
+    threshold_logit = _logit(np.array([threshold]))[0]
+    cascade = {
+        'coef': coef.tolist(),
+        'intercept': intercept,
+        'threshold': float(threshold),
+        'target_sensitivity': target_sensitivity,
+        'validation': {
+            'n_samples': int(len(y_val)),
+            'full_sensitivity': full_sensitivity,
+            'full_specificity': full_specificity,
+        },
+    }
+    if best is None or best[0] == 0:
+        cascade.update(lower=0.0, upper=1.0, passed=False)
+        cascade['validation']['early_exit_fraction'] = 0.0
+        logger.warning("Cascada: ninguna banda mantiene la sensibilidad objetivo. Desactivada.")
+        return cascade
+
+    resolved, _, below, above, sensitivity, specificity = best
+    cascade.update(
+        lower=float(_sigmoid(threshold_logit - below)) if np.isfinite(below) else 0.0,
+        upper=float(_sigmoid(threshold_logit + above)) if np.isfinite(above) else 1.0,
+        passed=True
+    )
+    cascade['validation'].update(
+        sensitivity=sensitivity,
+        specificity=specificity,
+        early_exit_fraction=resolved / len(y_val),
+    )
+    logger.info(
+        f"Cascada: banda [{cascade['lower']:.3f}, {cascade['upper']:.3f}], "
+        f"{resolved / len(y_val):.1%} de casos resueltos por el screener, "
+        f"sensibilidad {sensitivity:.3f} (booster {full_sensitivity:.3f}), "
+        f"especificidad {specificity:.3f} (booster {full_specificity:.3f})"
+    )
+    return cascade
+
+
+def screen(cascade: Dict[str, Any], X_selected: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Primera etapa.
+
+    Returns:
+        (probabilidad del screener, máscara de casos dentro de la banda que
+        necesitan el booster; incluye toda salida no finita)
+    """
+    with np.errstate(over='ignore', invalid='ignore'):
+        probability = _sigmoid(_fill_missing(X_selected) @ cascade['coef'] + cascade['intercept'])
+    uncertain = (
+        ((probability >= cascade['lower']) & (probability <= cascade['upper']))
+        | ~np.isfinite(probability)
+    )
+    return probability, uncertain
+
+
+def evaluate_cascade(cascade: Dict[str, Any], booster, X: np.ndarray, y: np.ndarray) -> Dict[str, Any]:
+    """
+    Métricas de la cascada sobre datos no usados para calibrar la banda.
+
+    Returns:
+        n_samples, sensitivity, specificity y early_exit_fraction
+    """
+    y = np.asarray(y).astype(int)
+    pred = (booster.predict_proba(X)[:, 1] >= cascade['threshold']).astype(int)
+    if cascade.get('passed'):
+        probability, uncertain = screen({**cascade, 'coef': np.asarray(cascade['coef'])}, X)
+        pred = np.where(uncertain, pred, (probability >= cascade['threshold']).astype(int))
+        resolved = int((~uncertain).sum())
+    else:
+        resolved = 0
+    sensitivity, specificity = _rates(y, pred)
+    return {
+        'n_samples': int(len(y)),
+        'sensitivity': sensitivity,
+        'specificity': specificity,
+        'early_exit_fraction': resolved / len(y),
+    }
+
+
+def serving_cascade(cascade: Optional[Dict[str, Any]], threshold: float) -> Optional[Dict[str, Any]]:
+    """Cascada a usar en serving, o None si está desactivada o no aplica."""
+    if not CASCADE_ENABLED or cascade is None:
+        return None
+    if not cascade.get('passed'):
+        logger.warning("Cascada no validada: se usa solo el booster")
+        return None
+    if abs(cascade['threshold'] - threshold) > 1e-9:
+        # Calibrada para otro threshold (p.ej. modelo compacto)
+        logger.warning("Cascada calibrada para otro threshold: se usa solo el booster")
+        return None
+    logger.info(f"Cascada activa: banda [{cascade['lower']:.3f}, {cascade['upper']:.3f}]")
+    return {**cascade, 'coef': np.asarray(cascade['coef'], dtype=np.float64)}
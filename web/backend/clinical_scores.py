@@ -0,0 +1,166 @@
+"""
+NephroMind - Scores clínicos vectorizados
+eGFR (CKD-EPI 2021), estadios KDIGO G/A, KFRE y riesgo cardio-renal sobre
+arrays de NumPy, para scoring por lotes y cohortes sin bucles por fila.
+"""
+
+from typing import Dict, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+ArrayLike = Union[float, np.ndarray, pd.Series]
+
+# Estadios KDIGO de filtrado glomerular (límites inferiores, ml/min/1.73m²)
+GFR_STAGE_BOUNDS = [15, 30, 45, 60, 90]
+GFR_STAGES = np.array(['G5', 'G4', 'G3b', 'G3a', 'G2', 'G1'])
+
+# Categorías KDIGO de albuminuria (ACR, mg/g)
+ACR_STAGE_BOUNDS = [30, 300]
+ACR_STAGES = np.array(['A1', 'A2', 'A3'])
+
+# KFRE 4 variables (Tangri et al. JAMA 2016), igual que calculateKFRE en app.js
+KFRE_BASELINE_SURVIVAL = {'2yr': 0.9832, '5yr': 0.9365}
+
+CARDIO_RENAL_CATEGORIES = np.array(['BAJO', 'MODERADO', 'ALTO', 'MUY ALTO'])
+
+
+def _as_float_array(values: ArrayLike) -> np.ndarray:
+    return np.asarray(values, dtype=float)
+
+
+def egfr_ckdepi(creatinine: ArrayLike, age: ArrayLike, gender: ArrayLike) -> np.ndarray:
+    """
+    eGFR con la fórmula CKD-EPI 2021 (sin raza).
+
+    Args:
+        creatinine: Creatinina sérica en mg/dL
+        age: Edad en años
+        gender: 0=Masculino, 1=Femenino
+
+    Returns:
+        eGFR en ml/min/1.73m² (NaN si la creatinina falta o no es positiva)
+    """
+    creatinine = _as_float_array(creatinine)
+    age = _as_float_array(age)
+    female = _as_float_array(gender) == 1
+
+    kappa = np.where(female, 0.7, 0.9)
+    alpha = np.where(female, -0.241, -0.302)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = creatinine / kappa
+        egfr = (142
+                * np.minimum(ratio, 1.0) ** alpha
+                * np.maximum(ratio, 1.0) ** -1.200
+                * 0.9938 ** age)
+    egfr = np.where(female, egfr * 1.012, egfr)
+
+    return np.where(creatinine > 0, np.round(egfr, 1), np.nan)
+
+
+def _stage(values: ArrayLike, bounds, labels: np.ndarray) -> np.ndarray:
+    """Asigna etiquetas por intervalos; los valores NaN quedan en None."""
+    values = np.atleast_1d(_as_float_array(values))
+    stages = labels[np.searchsorted(bounds, values, side='right')].astype(object)
+    stages[np.isnan(values)] = None
+    return stages
+
+
+def gfr_stage(gfr: ArrayLike) -> np.ndarray:
+    """Estadio KDIGO G1-G5 para cada valor de eGFR."""
+    return _stage(gfr, GFR_STAGE_BOUNDS, GFR_STAGES)
+
+
+def acr_stage(acr: ArrayLike) -> np.ndarray:
+    """Categoría KDIGO de albuminuria A1-A3 para cada valor de ACR (mg/g)."""
+    return _stage(acr, ACR_STAGE_BOUNDS, ACR_STAGES)
+
+
+def kfre(
+    age: ArrayLike,
+    gender: ArrayLike,
+    egfr: ArrayLike,
+    acr: ArrayLike
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Riesgo de fallo renal a 2 y 5 años (KFRE 4 variables), en porcentaje.
+
+    Solo aplica a eGFR < 60 con ACR positivo; el resto queda en NaN.
+    """
+    age = _as_float_array(age)
+    male = (_as_float_array(gender) == 0).astype(float)
+    egfr = _as_float_array(egfr)
+    acr = _as_float_array(acr)
+
+    applicable = (egfr > 0) & (egfr < 60) & (acr > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        linear_predictor = (-0.2201 * (age / 10 - 7.036)
+                            + 0.2467 * male
+                            - 0.5567 * (egfr / 5 - 7.222)
+                            + 0.4510 * (np.log(acr) - 5.137))
+        relative_risk = np.exp(linear_predictor)
+
+    risks = []
+    for survival in (KFRE_BASELINE_SURVIVAL['2yr'], KFRE_BASELINE_SURVIVAL['5yr']):
+        risk = np.clip((1 - survival ** relative_risk) * 100, 0, 100)
+        risks.append(np.where(applicable, risk, np.nan))
+
+    return risks[0], risks[1]
+
+
+def cardio_renal_risk(data: Union[pd.DataFrame, Dict[str, ArrayLike]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score cardio-renal integrado (misma lógica que calculateCardioRenalRisk).
+
+    Returns:
+        Tupla (score, categoría)
+    """
+    def column(name: str, default: float = 0.0) -> np.ndarray:
+        if name in data:
+            return np.nan_to_num(_as_float_array(data[name]), nan=default)
+        return np.full(n_rows, default)
+
+    n_rows = len(data) if isinstance(data, pd.DataFrame) else len(np.atleast_1d(next(iter(data.values()))))
+
+    age = column('Age')
+    gfr = column('GFR')
+    acr = column('ACR')
+
+    score = np.select([age >= 65, age >= 55], [2, 1], 0)
+    score += 2 * ((column('HistoryHTN') == 1) | (column('SystolicBP') > 140))
+    score += 2 * ((column('HistoryDiabetes') == 1) | (column('HbA1c') > 6.5))
+    score += np.select([(gfr > 0) & (gfr < 30), (gfr > 0) & (gfr < 45), (gfr > 0) & (gfr < 60)], [4, 3, 2], 0)
+    score += np.select([acr >= 300, acr >= 30], [3, 2], 0)
+    score += 2 * (column('HistoryCHD') == 1)
+    score += 1 * (column('HistoryVascular') == 1)
+    score += 1 * (column('CholesterolLDL') > 130)
+    score += 1 * (column('Smoking') == 1)
+    score += 1 * (column('BMI') > 30)
+
+    category = CARDIO_RENAL_CATEGORIES[np.searchsorted([3, 5, 8], score, side='right')]
+    return score, category
+
+
+def attach_scores(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Añade eGFR, estadios G/A, KFRE y riesgo cardio-renal a un DataFrame de
+    pacientes (columnas de PatientData). Si falta GFR se calcula desde la
+    creatinina.
+
+    Returns:
+        Copia del DataFrame con las columnas de scores añadidas
+    """
+    df = df.copy()
+    egfr = egfr_ckdepi(df['SerumCreatinine'], df['Age'], df['Gender'])
+    if 'GFR' in df:
+        egfr = np.where(df['GFR'].notna(), df['GFR'], egfr)
+    df['GFR'] = egfr
+
+    df['gfr_stage'] = gfr_stage(df['GFR'])
+    acr = df['ACR'] if 'ACR' in df else np.full(len(df), np.nan)
+    df['acr_stage'] = acr_stage(acr)
+    df['kfre_2yr'], df['kfre_5yr'] = kfre(df['Age'], df['Gender'], df['GFR'], acr)
+    df['cardio_renal_score'], df['cardio_renal_category'] = cardio_renal_risk(df)
+
+    return df
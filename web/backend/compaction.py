@@ -0,0 +1,194 @@
+"""
+NephroMind - Compactación del modelo de serving
+Genera un booster más pequeño (truncado o destilado) y mide explícitamente
+cuánta precisión se pierde frente al modelo completo.
+"""
+
+import os
+import json
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import confusion_matrix, roc_auc_score
+import xgboost as xgb
+
+from model import KidneyDiseaseModel
+from runtime import file_sha1
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Candidatos: primeros N árboles del modelo completo
+TRUNCATION_SIZES = [25, 50, 75, 100, 150]
+# Candidatos destilados: (n_árboles, profundidad) entrenados sobre la
+# probabilidad del modelo completo (soft labels)
+DISTILLATION_CONFIGS = [(30, 3), (50, 3), (50, 4), (80, 4)]
+
+
+def _latency_us(booster: xgb.Booster, X: np.ndarray, n_rows: int = 200) -> float:
+    """Latencia media por predicción de una fila, en microsegundos."""
+    rows = X[:n_rows]
+    start = time.perf_counter()
+    for row in rows:
+        booster.inplace_predict(row.reshape(1, -1))
+    return (time.perf_counter() - start) / len(rows) * 1e6
+
+
+def _score_candidate(
+    name: str,
+    booster: xgb.Booster,
+    X_calib: np.ndarray,
+    y_calib: np.ndarray,
+    X_eval: np.ndarray,
+    y_eval: np.ndarray,
+    reference_pred: np.ndarray,
+    target_sensitivity: float
+) -> Dict[str, Any]:
+    """Calibra el threshold del candidato y mide sus métricas de guardarraíl."""
+    threshold = KidneyDiseaseModel.find_threshold(
+        y_calib, booster.inplace_predict(X_calib), target_sensitivity
+    )
+    y_proba = booster.inplace_predict(X_eval)
+    y_pred = (y_proba >= threshold).astype(int)
+    tn, fp, fn, tp = confusion_matrix(y_eval, y_pred, labels=[0, 1]).ravel()
+
+    return {
+        'name': name,
+        'n_trees': booster.num_boosted_rounds(),
+        'threshold': threshold,
+        'roc_auc': float(roc_auc_score(y_eval, y_proba)),
+        'sensitivity': float(tp / (tp + fn)) if (tp + fn) > 0 else 0.0,
+        'specificity': float(tn / (tn + fp)) if (tn + fp) > 0 else 0.0,
+        'agreement': float((y_pred == reference_pred).mean()),
+        'latency_us': _latency_us(booster, X_eval),
+    }
+
+
+def compact_model(
+    model: KidneyDiseaseModel,
+    data_path: str,
+    target_sensitivity: float = 0.98,
+    max_auc_drop: float = 0.005,
+    min_agreement: float = 0.97,
+    output_path: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Busca el booster más pequeño que respeta los guardarraíles de precisión.
+
+    Evalúa truncados del modelo completo y modelos destilados más superficiales
+    con las mismas features y scaler. Cada candidato recibe su propio threshold
+    (calibrado en la mitad del split de test) y se mide en la otra mitad:
+    ROC AUC, sensibilidad al objetivo y acuerdo de decisiones con el modelo
+    completo. Se elige el de menor latencia entre los que cumplen.
+
+    Args:
+        model: Modelo completo cargado
+        data_path: Ruta al CSV de entrenamiento
+        target_sensitivity: Sensibilidad mínima exigida
+        max_auc_drop: Caída máxima de ROC AUC tolerada frente al completo
+        min_agreement: Acuerdo mínimo de decisiones con el completo
+        output_path: Ruta del modelo compacto (por defecto, mi_modelo_compact.json)
+
+    Returns:
+        Métricas del candidato elegido, o None si ninguno cumple
+    """
+    if model.model is None:
+        raise Exception("Modelo no entrenado o cargado")
+
+    df = model.load_data(data_path)
+    X = df[model.all_columns]
+    y = df['Diagnosis'].astype(int).to_numpy()
+
+    # Mismo split que train(); el test se divide en calibración y evaluación
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42, stratify=y
+    )
+    X_calib, X_eval, y_calib, y_eval = train_test_split(
+        X_test, y_test, test_size=0.5, random_state=42, stratify=y_test
+    )
+
+    selected_idx = [model.all_columns.index(col) for col in model.columns]
+
+    def prepare(frame):
+        return model.scaler.transform(frame)[:, selected_idx].astype(np.float32)
+
+    X_train, X_calib, X_eval = prepare(X_train), prepare(X_calib), prepare(X_eval)
+
+    teacher = model.model.get_booster()
+    full_threshold = model.threshold
+    reference_pred = (teacher.inplace_predict(X_eval) >= full_threshold).astype(int)
+
+    def score(name, booster):
+        return _score_candidate(
+            name, booster, X_calib, y_calib, X_eval, y_eval, reference_pred, target_sensitivity
+        )
+
+    full = score("completo", teacher)
+    logger.info(f"Modelo completo: {full['n_trees']} árboles, AUC={full['roc_auc']:.4f}, "
+                f"latencia={full['latency_us']:.0f}µs")
+
+    candidates: List[Dict[str, Any]] = []
+    boosters: Dict[str, xgb.Booster] = {}
+
+    # Truncados del modelo completo
+    for n_trees in TRUNCATION_SIZES:
+        if n_trees >= full['n_trees']:
+            continue
+        name = f"truncado_{n_trees}"
+        boosters[name] = teacher[:n_trees]
+        candidates.append(score(name, boosters[name]))
+
+    # Destilados: regresión logística sobre la probabilidad del modelo completo
+    soft_labels = teacher.inplace_predict(X_train)
+    dtrain = xgb.DMatrix(X_train, label=soft_labels)
+    for n_trees, depth in DISTILLATION_CONFIGS:
+        name = f"destilado_{n_trees}x{depth}"
+        boosters[name] = xgb.train(
+            {'objective': 'binary:logistic', 'max_depth': depth, 'eta': 0.15,
+             'tree_method': 'hist', 'seed': 42},
+            dtrain,
+            num_boost_round=n_trees
+        )
+        candidates.append(score(name, boosters[name]))
+
+    def passes(c):
+        return (c['sensitivity'] >= target_sensitivity
+                and c['roc_auc'] >= full['roc_auc'] - max_auc_drop
+                and c['agreement'] >= min_agreement)
+
+    for c in candidates:
+        c['passes'] = passes(c)
+        logger.info(f"{c['name']}: AUC={c['roc_auc']:.4f} Sens={c['sensitivity']:.4f} "
+                    f"Acuerdo={c['agreement']:.4f} latencia={c['latency_us']:.0f}µs "
+                    f"{'✓' if c['passes'] else '✗'}")
+
+    output_dir = os.path.dirname(model.model_path_json)
+    with open(os.path.join(output_dir, "compaction_report.json"), "w") as f:
+        json.dump({'full': full, 'candidates': candidates,
+                   'guardrails': {'target_sensitivity': target_sensitivity,
+                                  'max_auc_drop': max_auc_drop,
+                                  'min_agreement': min_agreement}}, f, indent=2)
+
+    valid = [c for c in candidates if c['passes']]
+    if not valid:
+        logger.warning("Ningún candidato cumple los guardarraíles. No se genera modelo compacto.")
+        return None
+
+    best = min(valid, key=lambda c: c['latency_us'])
+    booster = boosters[best['name']]
+    # El threshold viaja con el propio booster, junto con el modelo completo
+    # del que se deriva (load_model rechaza el compacto si ya no coincide)
+    booster.set_attr(
+        nephromind_threshold=str(best['threshold']),
+        nephromind_source_sha1=file_sha1(model.model_path_json),
+        nephromind_columns=json.dumps(model.columns)
+    )
+
+    output_path = output_path or os.path.join(output_dir, "mi_modelo_compact.json")
+    booster.save_model(output_path)
+    logger.info(f"Modelo compacto ({best['name']}) guardado en: {output_path}")
+
+    return best
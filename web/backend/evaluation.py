@@ -0,0 +1,177 @@
+"""
+NephroMind - Evaluación con validación cruzada
+K-fold estratificado con la receta de entrenamiento del modelo guardado, con
+intervalos de confianza para las métricas al threshold del modelo.
+"""
+
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from scipy import stats
+from sklearn.model_selection import StratifiedKFold
+from sklearn.metrics import confusion_matrix, roc_auc_score
+import xgboost as xgb
+
+from model import KidneyDiseaseModel
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+METRICS = ['roc_auc', 'sensitivity', 'specificity', 'accuracy']
+
+# Nombres de XGBClassifier -> nombres nativos de xgb.train
+NATIVE_PARAM_NAMES = {'learning_rate': 'eta', 'reg_lambda': 'lambda', 'reg_alpha': 'alpha'}
+
+
+def _booster_params(model: KidneyDiseaseModel) -> Dict[str, Any]:
+    """
+    Hiperparámetros con los que se entrenó el booster guardado.
+
+    Se leen de la metadata (`train_params`): la configuración interna de un
+    booster cargado desde JSON solo conserva scale_pos_weight, el resto son
+    los valores por defecto de XGBoost.
+    """
+    train_params = model.train_params
+    if train_params is None:
+        config = json.loads(model.model.get_booster().save_config())
+        loss_param = config['learner']['objective'].get('reg_loss_param', {})
+        train_params = {
+            **KidneyDiseaseModel.DEFAULT_TRAIN_PARAMS,
+            'scale_pos_weight': float(loss_param.get('scale_pos_weight', 1.0)),
+        }
+        logger.warning(f"Metadata sin train_params: se usa la receta de train() {train_params}")
+
+    params = {
+        'objective': 'binary:logistic',
+        'eval_metric': 'logloss',
+        'tree_method': 'hist',
+        'seed': 42,
+    }
+    for key, value in train_params.items():
+        params[NATIVE_PARAM_NAMES.get(key, key)] = value
+    return params
+
+
+def _confidence_interval(values: List[float], confidence: float = 0.95) -> Dict[str, float]:
+    """Media e intervalo de confianza t-Student sobre los folds."""
+    values = np.asarray(values, dtype=float)
+    mean = float(values.mean())
+    if len(values) < 2:
+        return {'mean': mean, 'std': 0.0, 'ci_low': mean, 'ci_high': mean}
+    std = float(values.std(ddof=1))
+    half_width = stats.t.ppf((1 + confidence) / 2, len(values) - 1) * std / np.sqrt(len(values))
+    return {
+        'mean': mean,
+        'std': std,
+        'ci_low': float(mean - half_width),
+        'ci_high': float(mean + half_width),
+    }
+
+
+def cross_validate(
+    model: KidneyDiseaseModel,
+    data_path: str,
+    n_splits: int = 5,
+    n_jobs: Optional[int] = None,
+    output_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Evalúa la receta de entrenamiento del modelo con k-fold estratificado.
+
+    Usa las columnas seleccionadas, los hiperparámetros de entrenamiento
+    guardados en la metadata y el threshold del modelo cargado. El dataset
+    se cuantiza una vez (QuantileDMatrix de referencia) y cada fold reutiliza
+    esos cortes: el sketch no usa etiquetas. El escalado se omite: los
+    árboles son invariantes a transformaciones afines crecientes de cada
+    feature.
+
+    Las columnas no se re-seleccionan por fold: RFE las eligió sobre el split
+    de train(), que solapa con todos los folds de test, así que las métricas
+    pueden ser algo optimistas. El informe lo indica en 'feature_selection'.
+
+    Los folds corren en hilos (XGBoost libera el GIL) y cada uno usa
+    `cpu_count // n_jobs` hilos, para no sobresuscribir los núcleos.
+
+    Args:
+        model: Modelo cargado o entrenado
+        data_path: Ruta al CSV de evaluación
+        n_splits: Número de folds
+        n_jobs: Folds en paralelo (por defecto, min(n_splits, núcleos))
+        output_path: Ruta del informe JSON (por defecto, cv_report.json)
+
+    Returns:
+        Informe con métricas por fold e intervalos de confianza
+    """
+    if model.model is None:
+        raise Exception("Modelo no entrenado o cargado")
+
+    df = model.load_data(data_path)
+    X = df[model.columns].to_numpy(dtype=np.float32)
+    y = df['Diagnosis'].to_numpy(dtype=int)
+
+    params = _booster_params(model)
+    num_boost_round = model.model.get_booster().num_boosted_rounds()
+
+    n_cpus = os.cpu_count() or 1
+    n_jobs = max(1, min(n_jobs or n_cpus, n_splits))
+    params['nthread'] = max(1, n_cpus // n_jobs)
+
+    folds = list(StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42).split(X, y))
+    # Cortes del histograma calculados una sola vez para todos los folds
+    reference = xgb.QuantileDMatrix(X, nthread=n_cpus)
+
+    def run_fold(fold: int) -> Dict[str, Any]:
+        train_idx, test_idx = folds[fold]
+        dtrain = xgb.QuantileDMatrix(
+            X[train_idx], label=y[train_idx], ref=reference, nthread=params['nthread']
+        )
+        booster = xgb.train(params, dtrain, num_boost_round=num_boost_round)
+
+        y_proba = booster.inplace_predict(X[test_idx])
+        y_pred = (y_proba >= model.threshold).astype(int)
+        tn, fp, fn, tp = confusion_matrix(y[test_idx], y_pred, labels=[0, 1]).ravel()
+
+        result = {
+            'fold': fold,
+            'n_samples': int(len(test_idx)),
+            'roc_auc': float(roc_auc_score(y[test_idx], y_proba)),
+            'sensitivity': float(tp / (tp + fn)) if (tp + fn) > 0 else 0.0,
+            'specificity': float(tn / (tn + fp)) if (tn + fp) > 0 else 0.0,
+            'accuracy': float((tp + tn) / len(test_idx)),
+            'confusion_matrix': [[int(tn), int(fp)], [int(fn), int(tp)]],
+        }
+        logger.info(f"Fold {fold}: AUC={result['roc_auc']:.4f} "
+                    f"Sens={result['sensitivity']:.4f} Esp={result['specificity']:.4f}")
+        return result
+
+    logger.warning("Las columnas RFE no se re-seleccionan por fold: métricas posiblemente optimistas")
+    logger.info(f"Evaluando {n_splits} folds ({n_jobs} en paralelo, {params['nthread']} hilos cada uno)...")
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        fold_results = list(pool.map(run_fold, range(n_splits)))
+
+    report = {
+        'n_splits': n_splits,
+        'n_samples': int(len(y)),
+        'threshold': float(model.threshold),
+        'features': model.columns,
+        'feature_selection': {
+            'per_fold': False,
+            'note': "Columnas elegidas por RFE en el split de train(), que solapa con "
+                    "los folds de test: las métricas pueden ser optimistas",
+        },
+        'params': params,
+        'num_boost_round': num_boost_round,
+        'summary': {m: _confidence_interval([r[m] for r in fold_results]) for m in METRICS},
+        'folds': fold_results,
+    }
+
+    output_path = output_path or os.path.join(os.path.dirname(model.model_path_json), "cv_report.json")
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Informe de validación cruzada guardado en: {output_path}")
+
+    return report
@@ -0,0 +1,105 @@
+"""
+NephroMind - Pools de ejecución
+Separa la inferencia (pool de hilos acotado, XGBoost con 1 hilo por worker)
+del entrenamiento (proceso aparte), con afinidad de CPU opcional para cada uno.
+
+Variables de entorno:
+    NEPHROMIND_INFERENCE_WORKERS: hilos de inferencia (por defecto min(4, núcleos))
+    NEPHROMIND_INFERENCE_CPUS: núcleos para inferencia, p. ej. "0-3"
+    NEPHROMIND_TRAINING_CPUS: núcleos para entrenamiento, p. ej. "4-7"
+"""
+
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional, Set
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INFERENCE_WORKERS = int(os.getenv("NEPHROMIND_INFERENCE_WORKERS", min(4, os.cpu_count() or 1)))
+
+_inference_pool: Optional[ThreadPoolExecutor] = None
+_training_pool: Optional[ProcessPoolExecutor] = None
+
+
+def parse_cpus(spec: Optional[str]) -> Optional[Set[int]]:
+    """Convierte "0-3,6" en {0, 1, 2, 3, 6}."""
+    if not spec:
+        return None
+    cpus = set()
+    for part in spec.split(','):
+        if '-' in part:
+            start, end = part.split('-')
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def _pin(cpus: Optional[Set[int]]) -> None:
+    """Fija la afinidad de CPU del hilo/proceso actual (solo Linux)."""
+    if cpus and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError as e:
+            logger.warning(f"No se pudo fijar afinidad {sorted(cpus)}: {e}")
+
+
+def inference_pool() -> ThreadPoolExecutor:
+    """Pool de hilos acotado para predicciones."""
+    global _inference_pool
+    if _inference_pool is None:
+        _inference_pool = ThreadPoolExecutor(
+            max_workers=INFERENCE_WORKERS,
+            thread_name_prefix="inference",
+            initializer=_pin,
+            initargs=(parse_cpus(os.getenv("NEPHROMIND_INFERENCE_CPUS")),)
+        )
+    return _inference_pool
+
+
+def training_pool() -> ProcessPoolExecutor:
+    """
+    Proceso dedicado a entrenamiento. Se usa 'spawn' para no heredar los
+    hilos del servidor al hacer fork.
+    """
+    global _training_pool
+    if _training_pool is None:
+        _training_pool = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_pin,
+            initargs=(parse_cpus(os.getenv("NEPHROMIND_TRAINING_CPUS")),)
+        )
+    return _training_pool
+
+
+def train_in_subprocess(data_path: str, incremental: bool = False) -> float:
+    """
+    Entrena (o continúa) el modelo y lo guarda en disco. Se ejecuta en el
+    proceso de entrenamiento; el servidor recarga el modelo al terminar.
+
+    Returns:
+        Threshold del modelo entrenado
+    """
+    from model import KidneyDiseaseModel
+
+    model = KidneyDiseaseModel()
+    if incremental:
+        model.train_incremental(data_path)
+    else:
+        model.train(data_path)
+    return model.threshold
+
+
+def shutdown() -> None:
+    """Cierra los pools abiertos."""
+    global _inference_pool, _training_pool
+    if _inference_pool is not None:
+        _inference_pool.shutdown(wait=False)
+        _inference_pool = None
+    if _training_pool is not None:
+        _training_pool.shutdown(wait=False, cancel_futures=True)
+        _training_pool = None
@@ -0,0 +1,309 @@
+"""
+NephroMind - Comparativa de modelos y remuestreo
+Ejecuta en paralelo combinaciones modelo x remuestreador (las del notebook:
+Random Forest, red neuronal, SMOTE/ADASYN) frente a XGBoost con la receta de
+producción (hiperparámetros y columnas RFE del modelo guardado), sobre un
+mismo split preprocesado una sola vez y cacheado en disco.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+from sklearn.impute import SimpleImputer
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import confusion_matrix, roc_auc_score
+
+from model import KidneyDiseaseModel
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TARGET_SENSITIVITY = 0.98
+CACHE_VERSION = 2
+
+
+def _make_resampler(name: str):
+    """Remuestreadores de imbalanced-learn (None = datos originales)."""
+    if name == 'none':
+        return None
+    from imblearn.over_sampling import ADASYN, SMOTE
+    if name == 'smote':
+        return SMOTE(random_state=42, k_neighbors=5)
+    if name == 'adasyn':
+        return ADASYN(random_state=42, sampling_strategy='auto')
+    raise ValueError(f"Remuestreador desconocido: {name}")
+
+
+def _make_model(name: str, scale_pos_weight: float, xgb_params: Optional[Dict[str, Any]] = None):
+    """Candidatos. Un hilo por modelo: el paralelismo está en el pool."""
+    if name == 'xgboost':
+        from xgboost import XGBClassifier
+        return XGBClassifier(
+            n_estimators=200, scale_pos_weight=scale_pos_weight, random_state=42,
+            n_jobs=1, eval_metric='logloss',
+            **(xgb_params or KidneyDiseaseModel.DEFAULT_TRAIN_PARAMS)
+        )
+    if name == 'random_forest':
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(
+            n_estimators=200, min_samples_split=5, random_state=42, n_jobs=1
+        )
+    if name == 'mlp':
+        # Misma arquitectura que la red Keras del notebook (64-32, early stopping)
+        from sklearn.neural_network import MLPClassifier
+        return MLPClassifier(
+            hidden_layer_sizes=(64, 32), learning_rate_init=0.001, alpha=1e-3,
+            early_stopping=True, max_iter=200, random_state=42
+        )
+    if name == 'logistic':
+        from sklearn.linear_model import LogisticRegression
+        return LogisticRegression(max_iter=1000, class_weight='balanced')
+    raise ValueError(f"Modelo desconocido: {name}")
+
+
+def _check_finite(name: str, X: np.ndarray) -> None:
+    """SMOTE/ADASYN, la red y la logística no admiten NaN: fallar al preparar."""
+    if not np.isfinite(X).all():
+        raise ValueError(f"{name} contiene valores no finitos tras imputar y escalar")
+
+
+MODELS = ('xgboost', 'random_forest', 'mlp', 'logistic')
+RESAMPLERS = ('none', 'smote', 'adasyn')
+
+
+def _production_recipe(model: KidneyDiseaseModel) -> Dict[str, Any]:
+    """
+    Hiperparámetros y columnas RFE del modelo guardado, para la fila XGBoost.
+
+    Sin modelo guardado se usa la receta de train() con todas las columnas.
+    scale_pos_weight no se copia: depende de cada remuestreo.
+    """
+    if not model.load_model(runtime='xgboost'):
+        logger.warning("Sin modelo guardado: XGBoost usa la receta de train() con todas las columnas")
+        return {'params': dict(KidneyDiseaseModel.DEFAULT_TRAIN_PARAMS), 'columns': None}
+
+    params = {**KidneyDiseaseModel.DEFAULT_TRAIN_PARAMS, **(model.train_params or {})}
+    params.pop('scale_pos_weight', None)
+    return {'params': params, 'columns': list(model.columns)}
+
+
+def prepare_splits(
+    model: KidneyDiseaseModel,
+    data_path: str,
+    resamplers: Sequence[str] = RESAMPLERS,
+    cache_root: Optional[str] = None
+) -> str:
+    """
+    Split estratificado (mismo test que train()), imputación, escalado y
+    remuestreo, una sola vez por dataset. Las matrices se guardan como .npy
+    para que los workers las abran con memory-map sin copiarlas.
+
+    XGBoost admite NaN, pero el resto de candidatos no: los ausentes se
+    imputan con la mediana de X_fit (0 si la columna no tiene valores) y se
+    aplica esa misma imputación a validación y test.
+
+    Returns:
+        Directorio del caché para este dataset
+    """
+    cache_root = cache_root or os.path.join(os.path.dirname(model.model_path_json), "experiment_cache")
+    with open(data_path, "rb") as f:
+        data_hash = hashlib.sha1(f.read()).hexdigest()
+    cache_dir = os.path.join(cache_root, f"{data_hash[:16]}_v{CACHE_VERSION}")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    def path(name: str) -> str:
+        return os.path.join(cache_dir, f"{name}.npy")
+
+    if not os.path.exists(path('X_test')):
+        logger.info("Preparando split y escalado...")
+        df = model.load_data(data_path)
+        X = df.drop('Diagnosis', axis=1)
+        y = df['Diagnosis'].astype(int)
+
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42, stratify=y
+        )
+        # Validación dentro de train para calibrar el threshold de cada candidato
+        X_fit, X_val, y_fit, y_val = train_test_split(
+            X_train, y_train, test_size=0.2, random_state=42, stratify=y_train
+        )
+
+        imputer = SimpleImputer(strategy='median', keep_empty_features=True)
+        scaler = StandardScaler()
+        matrices = {
+            'X_fit_none': scaler.fit_transform(imputer.fit_transform(X_fit)),
+            'X_val': scaler.transform(imputer.transform(X_val)),
+            'X_test': scaler.transform(imputer.transform(X_test)),
+        }
+        for name, matrix in matrices.items():
+            _check_finite(name, matrix)
+
+        np.save(path('X_fit_none'), matrices['X_fit_none'])
+        np.save(path('y_fit_none'), y_fit.to_numpy())
+        np.save(path('X_val'), matrices['X_val'])
+        np.save(path('y_val'), y_val.to_numpy())
+        np.save(path('y_test'), y_test.to_numpy())
+        np.save(path('X_test'), matrices['X_test'])  # Último: marca el caché como completo
+        with open(os.path.join(cache_dir, "columns.json"), "w") as f:
+            json.dump(X.columns.tolist(), f)
+    else:
+        logger.info(f"Split recuperado del caché: {cache_dir}")
+
+    X_fit = np.load(path('X_fit_none'), mmap_mode='r')
+    y_fit = np.load(path('y_fit_none'))
+    for name in resamplers:
+        if name == 'none' or os.path.exists(path(f'y_fit_{name}')):
+            continue
+        logger.info(f"Remuestreando con {name}...")
+        X_res, y_res = _make_resampler(name).fit_resample(np.asarray(X_fit), y_fit)
+        np.save(path(f'X_fit_{name}'), X_res)
+        np.save(path(f'y_fit_{name}'), y_res)  # Último: marca el remuestreo como completo
+        logger.info(f"  {name}: {len(y_fit)} -> {len(y_res)} filas ({int(y_res.sum())} positivos)")
+
+    return cache_dir
+
+
+def _run_experiment(
+    cache_dir: str,
+    model_name: str,
+    resampler: str,
+    target_sensitivity: float,
+    recipe: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Entrena un candidato sobre las matrices memory-mapped y lo evalúa.
+
+    XGBoost usa `recipe` (ver `_production_recipe`) y solo sus columnas; los
+    ausentes siguen imputados como para el resto de candidatos.
+    """
+    def load(name: str, mmap: bool = True) -> np.ndarray:
+        return np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode='r' if mmap else None)
+
+    X_fit, y_fit = load(f'X_fit_{resampler}'), load(f'y_fit_{resampler}', mmap=False)
+    X_val, y_val = load('X_val'), load('y_val', mmap=False)
+    X_test, y_test = load('X_test'), load('y_test', mmap=False)
+
+    xgb_params = None
+    if model_name == 'xgboost':
+        xgb_params = recipe['params']
+        if recipe['columns'] is not None:
+            with open(os.path.join(cache_dir, "columns.json")) as f:
+                all_columns = json.load(f)
+            selected_idx = [all_columns.index(col) for col in recipe['columns']]
+            X_fit, X_val, X_test = X_fit[:, selected_idx], X_val[:, selected_idx], X_test[:, selected_idx]
+
+    # Con remuestreo las clases ya están equilibradas
+    n_pos = y_fit.sum()
+    scale_pos_weight = 1.0 if resampler != 'none' else (len(y_fit) - n_pos) / n_pos
+    estimator = _make_model(model_name, scale_pos_weight, xgb_params)
+
+    start = time.perf_counter()
+    estimator.fit(X_fit, y_fit)
+    fit_seconds = time.perf_counter() - start
+
+    threshold = KidneyDiseaseModel.find_threshold(y_val, estimator.predict_proba(X_val)[:, 1], target_sensitivity)
+    y_proba = estimator.predict_proba(X_test)[:, 1]
+    tn, fp, fn, tp = confusion_matrix(y_test, (y_proba >= threshold).astype(int), labels=[0, 1]).ravel()
+
+    return {
+        'model': model_name,
+        'resampler': resampler,
+        'n_train_rows': int(len(y_fit)),
+        'n_features': int(X_fit.shape[1]),
+        'threshold': float(threshold),
+        'sensitivity': float(tp / (tp + fn)) if (tp + fn) > 0 else 0.0,
+        'specificity': float(tn / (tn + fp)) if (tn + fp) > 0 else 0.0,
+        'roc_auc': float(roc_auc_score(y_test, y_proba)),
+        'fit_seconds': round(fit_seconds, 2),
+    }
+
+
+def run_experiments(
+    model: KidneyDiseaseModel,
+    data_path: str,
+    models: Sequence[str] = MODELS,
+    resamplers: Sequence[str] = RESAMPLERS,
+    n_workers: Optional[int] = None,
+    target_sensitivity: float = TARGET_SENSITIVITY,
+    output_path: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Ejecuta todas las combinaciones modelo x remuestreador en paralelo.
+
+    El threshold de cada candidato se calibra en validación a la sensibilidad
+    objetivo y las métricas se miden en test. El ranking prioriza alcanzar la
+    sensibilidad en test, luego especificidad y ROC AUC.
+
+    Un ValueError (entradas inválidas, p. ej. NaN) aborta la comparativa en
+    lugar de registrarse como experimento fallido.
+
+    Args:
+        model: KidneyDiseaseModel (rutas, carga de datos y receta del modelo guardado)
+        data_path: Ruta al CSV
+        models: Candidatos (ver MODELS)
+        resamplers: Remuestreadores (ver RESAMPLERS)
+        n_workers: Procesos del pool (por defecto, núcleos disponibles)
+        target_sensitivity: Punto de operación
+        output_path: Ruta del informe (por defecto experiments_report.json)
+
+    Returns:
+        Resultados ordenados
+    """
+    logger.info("=" * 50)
+    logger.info("COMPARATIVA DE MODELOS")
+    logger.info("=" * 50)
+
+    cache_dir = prepare_splits(model, data_path, resamplers)
+    recipe = _production_recipe(model)
+
+    combinations = [(m, r) for m in models for r in resamplers]
+    n_workers = min(n_workers or os.cpu_count() or 1, len(combinations))
+    logger.info(f"Ejecutando {len(combinations)} experimentos en {n_workers} procesos...")
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        futures = {
+            pool.submit(_run_experiment, cache_dir, m, r, target_sensitivity, recipe): (m, r)
+            for m, r in combinations
+        }
+        results = []
+        for future, (m, r) in futures.items():
+            try:
+                results.append(future.result())
+            except ValueError:
+                pool.shutdown(cancel_futures=True)
+                raise
+            except Exception as e:
+                logger.error(f"Experimento {m} + {r} falló: {e}")
+                results.append({'model': m, 'resampler': r, 'error': str(e)})
+
+    ranked = sorted(
+        (r for r in results if 'error' not in r),
+        key=lambda r: (r['sensitivity'] >= target_sensitivity, r['specificity'], r['roc_auc']),
+        reverse=True
+    )
+    for rank, result in enumerate(ranked, start=1):
+        result['rank'] = rank
+        logger.info(f"{rank:2d}. {result['model']:>14} + {result['resampler']:<7} "
+                    f"sens={result['sensitivity']:.3f} spec={result['specificity']:.3f} "
+                    f"auc={result['roc_auc']:.3f} ({result['fit_seconds']}s)")
+
+    report = {
+        'data_path': os.path.abspath(data_path),
+        'target_sensitivity': target_sensitivity,
+        'xgboost_recipe': recipe,
+        'results': ranked,
+        'failed': [r for r in results if 'error' in r],
+    }
+    output_path = output_path or os.path.join(os.path.dirname(model.model_path_json), "experiments_report.json")
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Informe guardado en: {output_path}")
+
+    return ranked
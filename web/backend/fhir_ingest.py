@@ -0,0 +1,382 @@
+"""
+NephroMind - Ingesta FHIR Bulk Data (NDJSON)
+Pivota recursos Patient, Observation y MedicationStatement a filas de
+PatientData en una sola pasada y las puntúa por lotes.
+
+Uso:
+    python fhir_ingest.py Patient.ndjson Observation.ndjson ... --output scores.ndjson
+"""
+
+import io
+import json
+import logging
+from datetime import date, datetime, timezone
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import clinical_scores
+from imputation import impute, imputed_fields
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LOINC_SYSTEM = "http://loinc.org"
+
+# Índice (sistema, código) -> (campo de PatientData, {unidad: factor a la unidad del campo})
+# Las unidades no listadas se aceptan tal cual.
+LOINC_INDEX: Dict[Tuple[str, str], Tuple[str, Dict[str, float]]] = {}
+
+_LOINC_FIELDS = {
+    'SerumCreatinine': (['2160-0', '38483-4'], {'umol/L': 1 / 88.42}),
+    'BUN': (['3094-0', '6299-2'], {'mmol/L': 2.8}),
+    'GFR': (['98979-8', '62238-1', '33914-3', '48642-3', '48643-1'], {}),
+    'HbA1c': (['4548-4', '17856-6'], {}),
+    'FastingBloodSugar': (['1558-6'], {'mmol/L': 18.016}),  # 2345-7 es glucosa sin ayuno
+    'SystolicBP': (['8480-6'], {}),
+    'DiastolicBP': (['8462-4'], {}),
+    'BMI': (['39156-5'], {}),
+    'ACR': (['9318-7', '14959-1', '32294-1'], {'mg/mmol': 8.84}),
+    'ProteinInUrine': (['2888-6'], {'mg/dL': 0.01}),  # El campo está en g/L
+    'SerumElectrolytesSodium': (['2951-2', '2947-0'], {}),
+    'SerumElectrolytesPotassium': (['2823-3', '6298-4'], {}),
+    'SerumElectrolytesCalcium': (['17861-6'], {'mmol/L': 4.008}),
+    'SerumElectrolytesPhosphorus': (['2777-1'], {'mmol/L': 3.097}),
+    'HemoglobinLevels': (['718-7'], {'g/L': 0.1}),
+    'CholesterolTotal': (['2093-3'], {'mmol/L': 38.67}),
+    'CholesterolLDL': (['13457-7', '18262-6'], {'mmol/L': 38.67}),
+    'CholesterolHDL': (['2085-9'], {'mmol/L': 38.67}),
+    'CholesterolTriglycerides': (['2571-8'], {'mmol/L': 88.57}),
+    '_weight_kg': (['29463-7'], {'g': 0.001, '[lb_av]': 0.4536}),
+    '_height_cm': (['8302-2'], {'m': 100.0, '[in_i]': 2.54}),
+}
+for _field, (_codes, _units) in _LOINC_FIELDS.items():
+    for _code in _codes:
+        LOINC_INDEX[(LOINC_SYSTEM, _code)] = (_field, _units)
+
+# Observaciones que fechan la predicción (la pendiente de eGFR del historial)
+MEASURED_AT_FIELDS = ['SerumCreatinine', 'GFR']
+
+# Medicación: prefijos ATC y nombres (ES/EN) -> campos de PatientData.
+# Los ARA-II (C09C/C09D, "-sartán") no son IECA: solo cuentan como antihipertensivos
+ATC_SYSTEM = "http://www.whocc.no/atc"
+MEDICATION_ATC_PREFIXES = [
+    ('C09A', ['ACEInhibitors']),
+    ('C09B', ['ACEInhibitors']),
+    ('C09', ['HTNmeds']),
+    ('C03', ['Diuretics', 'HTNmeds']),
+    ('C07', ['HTNmeds']),
+    ('C08', ['HTNmeds']),
+    ('C10AA', ['Statins']),
+    ('A10', ['AntidiabeticMedications']),
+    ('M01A', ['NSAIDsUse']),
+]
+MEDICATION_KEYWORDS = {
+    'enalapril': ['ACEInhibitors', 'HTNmeds'], 'lisinopril': ['ACEInhibitors', 'HTNmeds'],
+    'ramipril': ['ACEInhibitors', 'HTNmeds'],
+    'losart': ['HTNmeds'], 'valsart': ['HTNmeds'], 'candesart': ['HTNmeds'],
+    'irbesart': ['HTNmeds'], 'telmisart': ['HTNmeds'], 'olmesart': ['HTNmeds'],
+    'furosem': ['Diuretics', 'HTNmeds'], 'hydrochlorothiazide': ['Diuretics', 'HTNmeds'],
+    'hidroclorotiazida': ['Diuretics', 'HTNmeds'],
+    'amlodipin': ['HTNmeds'], 'bisoprolol': ['HTNmeds'],
+    'atorvastatin': ['Statins'], 'simvastatin': ['Statins'], 'rosuvastatin': ['Statins'],
+    'metformin': ['AntidiabeticMedications'], 'insulin': ['AntidiabeticMedications'],
+    'insulina': ['AntidiabeticMedications'],
+    'ibuprof': ['NSAIDsUse'], 'naproxen': ['NSAIDsUse'], 'diclofenac': ['NSAIDsUse'],
+}
+
+def iter_ndjson(stream: Iterable) -> Iterator[Dict[str, Any]]:
+    """Itera recursos de un flujo NDJSON (líneas str o bytes)."""
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _reference_id(reference: Optional[Dict[str, Any]]) -> Optional[str]:
+    """'Patient/123' -> '123'."""
+    if not reference or 'reference' not in reference:
+        return None
+    return reference['reference'].split('/')[-1]
+
+
+def _age(birth_date: str, today: date) -> Optional[int]:
+    try:
+        born = date.fromisoformat(birth_date[:10])
+    except ValueError:
+        return None
+    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+
+
+def observation_time(timestamp: Optional[str]) -> Optional[float]:
+    """
+    Epoch de un dateTime FHIR; None si falta o es parcial (solo año o mes).
+
+    Una fecha sin hora se toma a medianoche UTC, igual que una hora sin zona.
+    """
+    if not timestamp or len(timestamp) < 10:
+        return None
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _quantity_value(units: Dict[str, float], quantity: Optional[Dict[str, Any]]) -> Optional[float]:
+    if not quantity or 'value' not in quantity:
+        return None
+    unit = quantity.get('code') or quantity.get('unit')
+    return float(quantity['value']) * units.get(unit, 1.0)
+
+
+class FHIRPivot:
+    """
+    Acumula en una pasada el último valor observado por paciente y campo.
+
+    Memoria O(pacientes × campos): no se guarda ningún recurso completo.
+    """
+
+    def __init__(self, today: Optional[date] = None):
+        self.today = today or date.today()
+        self.patients: Dict[str, Dict[str, Any]] = {}
+        # paciente -> campo -> (epoch para ordenar, dateTime original, valor)
+        self.observations: Dict[str, Dict[str, Tuple[float, Optional[str], float]]] = {}
+        self.medications: Dict[str, set] = {}
+        self.skipped = 0
+
+    def add(self, resource: Dict[str, Any]) -> None:
+        """Incorpora un recurso FHIR."""
+        resource_type = resource.get('resourceType')
+        if resource_type == 'Patient':
+            self._add_patient(resource)
+        elif resource_type == 'Observation':
+            self._add_observation(resource)
+        elif resource_type == 'MedicationStatement':
+            self._add_medication(resource)
+
+    def add_stream(self, stream: Iterable) -> None:
+        """Incorpora todos los recursos de un flujo NDJSON."""
+        for resource in iter_ndjson(stream):
+            self.add(resource)
+
+    def _add_patient(self, resource: Dict[str, Any]) -> None:
+        row = {}
+        if 'birthDate' in resource:
+            row['Age'] = _age(resource['birthDate'], self.today)
+        gender = resource.get('gender')
+        if gender in ('male', 'female'):
+            row['Gender'] = 0 if gender == 'male' else 1
+        self.patients.setdefault(resource['id'], {}).update(row)
+
+    def _add_observation(self, resource: Dict[str, Any]) -> None:
+        if resource.get('status') in ('entered-in-error', 'cancelled'):
+            return
+        patient_id = _reference_id(resource.get('subject'))
+        if patient_id is None:
+            self.skipped += 1
+            return
+
+        timestamp = resource.get('effectiveDateTime') or resource.get('issued')
+        # Se compara el instante, no el texto (zonas horarias, fechas sin hora);
+        # sin fecha interpretable la observación cuenta como la más antigua
+        epoch = observation_time(timestamp)
+        epoch = float('-inf') if epoch is None else epoch
+        # Paneles (p. ej. TA 85354-9) llevan los valores en component
+        parts = [resource] + resource.get('component', [])
+        for part in parts:
+            for coding in part.get('code', {}).get('coding', []):
+                entry = LOINC_INDEX.get((coding.get('system'), coding.get('code')))
+                if entry is None:
+                    continue
+                field, units = entry
+                value = _quantity_value(units, part.get('valueQuantity'))
+                if value is None:
+                    continue
+                latest = self.observations.setdefault(patient_id, {})
+                if field not in latest or epoch >= latest[field][0]:
+                    latest[field] = (epoch, timestamp, value)
+                break
+
+    def _add_medication(self, resource: Dict[str, Any]) -> None:
+        if resource.get('status') not in (None, 'active', 'completed', 'intended'):
+            return
+        patient_id = _reference_id(resource.get('subject'))
+        if patient_id is None:
+            self.skipped += 1
+            return
+
+        concept = resource.get('medicationCodeableConcept', {})
+        flags = self.medications.setdefault(patient_id, set())
+        for coding in concept.get('coding', []):
+            if coding.get('system') == ATC_SYSTEM:
+                for prefix, fields in MEDICATION_ATC_PREFIXES:
+                    if coding.get('code', '').startswith(prefix):
+                        flags.update(fields)
+
+        text = ' '.join([concept.get('text', '')] +
+                        [c.get('display', '') for c in concept.get('coding', [])]).lower()
+        for keyword, fields in MEDICATION_KEYWORDS.items():
+            if keyword in text:
+                flags.update(fields)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Construye una fila por paciente con los últimos valores observados.
+
+        Columnas adicionales: 'patient_id', 'observed_fields' y 'measured_at'
+        (effectiveDateTime de la última función renal observada, o de la
+        última observación si no hay creatinina ni GFR; None sin fecha).
+        """
+        patient_ids = sorted(set(self.patients) | set(self.observations) | set(self.medications))
+        rows = []
+        for patient_id in patient_ids:
+            row = dict(self.patients.get(patient_id, {}))
+            observations = self.observations.get(patient_id, {})
+            row.update({field: value for field, (_, _, value) in observations.items()})
+            for field in self.medications.get(patient_id, ()):
+                row[field] = 1
+            row['patient_id'] = patient_id
+            renal = [observations[field] for field in MEASURED_AT_FIELDS if field in observations]
+            latest = max(renal or observations.values(), key=lambda observation: observation[0], default=None)
+            row['measured_at'] = latest[1] if latest is not None else None
+            rows.append(row)
+
+        if not rows:
+            return pd.DataFrame(columns=['patient_id', 'observed_fields', 'measured_at'])
+
+        df = pd.DataFrame(rows)
+        for field in ['_weight_kg', '_height_cm', 'BMI']:
+            if field not in df:
+                df[field] = np.nan
+
+        # IMC desde peso/talla si no viene informado
+        bmi = df['_weight_kg'] / (df['_height_cm'] / 100) ** 2
+        df['BMI'] = df['BMI'].fillna(bmi)
+        df = df.drop(columns=['_weight_kg', '_height_cm'])
+
+        feature_cols = [c for c in df.columns if c not in ('patient_id', 'measured_at')]
+        df['observed_fields'] = df[feature_cols].notna().apply(
+            lambda mask: [c for c, seen in mask.items() if seen], axis=1
+        )
+        return df
+
+
+def score_batch(model, batch: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Puntúa un lote de filas pivotadas.
+
+    Los pacientes sin edad o sexo se devuelven con un error; el resto de
+    campos ausentes se rellenan con el motor de imputación.
+
+    Returns:
+        Un resultado por paciente
+    """
+    for col in ('Age', 'Gender'):
+        if col not in batch:
+            batch = batch.assign(**{col: np.nan})
+    valid = batch['Age'].notna() & batch['Gender'].notna()
+    results = [
+        {'patient_id': patient_id, 'error': "Faltan datos demográficos (edad/sexo)"}
+        for patient_id in batch.loc[~valid, 'patient_id']
+    ]
+
+    batch = batch[valid]
+    if batch.empty:
+        return results
+
+    features, imputed = impute(batch.drop(columns=['patient_id', 'observed_fields', 'measured_at']))
+    result = model.predict_batch(features, imputed=imputed)
+    scores = clinical_scores.attach_scores(features)
+    imputed = imputed_fields(imputed)
+
+    rows = zip(batch['patient_id'], batch['observed_fields'], batch['measured_at'])
+    for i, (patient_id, observed, measured_at) in enumerate(rows):
+        kfre_2yr = scores['kfre_2yr'].iat[i]
+        results.append({
+            'patient_id': patient_id,
+            'measured_at': measured_at if isinstance(measured_at, str) else None,
+            'probability': float(result['probability'][i]),
+            'risk_class': int(result['prediction'][i]),
+            'egfr': float(scores['GFR'].iat[i]),
+            'gfr_stage': scores['gfr_stage'].iat[i],
+            'acr_stage': scores['acr_stage'].iat[i],
+            'kfre_2yr': None if np.isnan(kfre_2yr) else float(kfre_2yr),
+            'observed_fields': observed,
+            'imputed_fields': imputed[i],
+        })
+    return results
+
+
+def iter_batches(df: pd.DataFrame, batch_size: int = 1000) -> Iterator[pd.DataFrame]:
+    """Lotes consecutivos de filas pivotadas."""
+    for start in range(0, len(df), batch_size):
+        yield df.iloc[start:start + batch_size]
+
+
+def score_frame(
+    model,
+    df: pd.DataFrame,
+    batch_size: int = 1000
+) -> Iterator[Dict[str, Any]]:
+    """
+    Puntúa por lotes las filas pivotadas (ver `score_batch`).
+
+    Yields:
+        Un resultado por paciente
+    """
+    for batch in iter_batches(df, batch_size):
+        yield from score_batch(model, batch)
+
+
+def pivot_streams(streams: Iterable[Iterable]) -> pd.DataFrame:
+    """Pivota todos los flujos NDJSON a una fila por paciente."""
+    pivot = FHIRPivot()
+    for stream in streams:
+        pivot.add_stream(stream)
+
+    df = pivot.to_frame()
+    logger.info(f"FHIR pivotado: {len(df)} pacientes ({pivot.skipped} recursos sin paciente)")
+    return df
+
+
+def ingest(
+    model,
+    streams: Iterable[Iterable],
+    batch_size: int = 1000
+) -> Iterator[Dict[str, Any]]:
+    """Pivota todos los flujos NDJSON y devuelve los resultados por paciente."""
+    return score_frame(model, pivot_streams(streams), batch_size)
+
+
+# Entry point para ingesta por línea de comandos
+if __name__ == "__main__":
+    import sys
+    import argparse
+    from model import KidneyDiseaseModel
+
+    parser = argparse.ArgumentParser(description="Ingesta FHIR Bulk Data NDJSON")
+    parser.add_argument("files", nargs="+", help="Ficheros NDJSON (Patient, Observation, MedicationStatement)")
+    parser.add_argument("--output", default="-", help="Fichero NDJSON de salida (- para stdout)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    model = KidneyDiseaseModel()
+    if not model.load_model():
+        raise SystemExit(1)
+
+    streams = [io.open(path, encoding='utf-8') for path in args.files]
+    out = open(args.output, "w") if args.output != "-" else sys.stdout
+    try:
+        for result in ingest(model, streams, args.batch_size):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        for stream in streams:
+            stream.close()
+        if out is not sys.stdout:
+            out.close()
@@ -0,0 +1,115 @@
+"""
+NephroMind - Huella de memoria del proceso de serving
+RSS tras cada fase de arranque, módulos pesados cargados y, opcionalmente,
+memoria asignada por subsistema con tracemalloc. Define también el perfil
+de serving "lean" para réplicas solo de predicción.
+
+Variables de entorno:
+    NEPHROMIND_SERVING_PROFILE: 'full' (por defecto) o 'lean' (sin extracción
+        de PDF, sin entrenamiento y sin SHAP salvo NEPHROMIND_EXPLAIN=1)
+    NEPHROMIND_TRACEMALLOC: '1' traza asignaciones desde el arranque (tiene coste)
+"""
+
+import os
+import sys
+import time
+import logging
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, Any, List
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SERVING_PROFILE = os.getenv("NEPHROMIND_SERVING_PROFILE", "full")
+LEAN_SERVING = SERVING_PROFILE == "lean"
+TRACEMALLOC_ENABLED = os.getenv("NEPHROMIND_TRACEMALLOC", "0") == "1"
+
+# Dependencias cuyo coste en memoria interesa vigilar
+HEAVY_MODULES = (
+    'pandas', 'scipy', 'sklearn', 'xgboost', 'shap', 'numba', 'llvmlite',
+    'google.generativeai', 'fitz', 'imblearn', 'pyarrow', 'onnxruntime', 'tl2cgen',
+)
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+_started = time.monotonic()
+_phases: List[Dict[str, Any]] = []
+
+
+def start() -> None:
+    """Arranca tracemalloc si está activado. Llamar antes de los imports pesados."""
+    if TRACEMALLOC_ENABLED and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def rss_mb() -> float:
+    """RSS actual del proceso en MB (pico si no hay /proc)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def mark(phase: str) -> None:
+    """Registra el RSS (y lo trazado) al terminar una fase de arranque."""
+    entry = {
+        'phase': phase,
+        'elapsed_s': round(time.monotonic() - _started, 2),
+        'rss_mb': round(rss_mb(), 1),
+    }
+    if tracemalloc.is_tracing():
+        entry['traced_mb'] = round(tracemalloc.get_traced_memory()[0] / 2**20, 1)
+    _phases.append(entry)
+    logger.info(f"Memoria tras {phase}: {entry['rss_mb']} MB RSS")
+
+
+def _subsystem(filename: str) -> str:
+    """Paquete de primer nivel (o módulo del backend) al que pertenece un fichero."""
+    parts = filename.replace("\\", "/").split("/")
+    for marker in ("site-packages", "dist-packages"):
+        if marker in parts:
+            package = parts[parts.index(marker) + 1:]
+            if package[0] == "google" and len(package) > 1:
+                return f"google.{package[1]}"
+            return package[0].split(".")[0]
+    if os.path.dirname(os.path.abspath(filename)) == _BACKEND_DIR:
+        return f"nephromind.{os.path.splitext(parts[-1])[0]}"
+    return "stdlib" if filename.startswith(sys.prefix) else "other"
+
+
+def report(top: int = 20) -> Dict[str, Any]:
+    """
+    Informe de memoria: perfil, RSS actual y por fase, módulos pesados
+    cargados y, con tracemalloc, los `top` subsistemas con más memoria viva.
+    """
+    result = {
+        'serving_profile': SERVING_PROFILE,
+        'rss_mb': round(rss_mb(), 1),
+        'phases': _phases,
+        'heavy_modules_loaded': {name: name in sys.modules for name in HEAVY_MODULES},
+        'tracemalloc': None,
+    }
+    if not tracemalloc.is_tracing():
+        return result
+
+    by_subsystem: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    for stat in tracemalloc.take_snapshot().statistics('filename'):
+        entry = by_subsystem[_subsystem(stat.traceback[0].filename)]
+        entry[0] += stat.size
+        entry[1] += stat.count
+    current, peak = tracemalloc.get_traced_memory()
+    result['tracemalloc'] = {
+        'traced_mb': round(current / 2**20, 1),
+        'peak_mb': round(peak / 2**20, 1),
+        'by_subsystem': [
+            {'subsystem': name, 'size_mb': round(size / 2**20, 2), 'blocks': count}
+            for name, (size, count) in sorted(by_subsystem.items(), key=lambda item: -item[1][0])[:top]
+        ],
+    }
+    return result
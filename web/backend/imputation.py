@@ -0,0 +1,338 @@
+"""
+NephroMind - Motor de imputación
+Tabla declarativa de reglas para los campos que faltan, compartida por el
+API, el extractor de PDFs, la ingesta FHIR y el modelo. Se aplica vectorizada
+sobre lotes y devuelve la máscara de campos imputados.
+"""
+
+import logging
+import math
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from clinical_scores import egfr_ckdepi
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Nombres alternativos aceptados en la entrada -> nombre que espera el modelo
+FIELD_ALIASES = {
+    'BUN': 'BUNLevels',
+    'Fatigue': 'FatigueLevels',
+}
+
+# Las condiciones y los valores calculados reciben un lote (DataFrame) o un
+# único paciente (diccionario de escalares, ver `ImputationEngine.impute_record`)
+Condition = Optional[Callable[[pd.DataFrame], pd.Series]]
+Value = Union[float, Callable[[pd.DataFrame], Any]]
+
+
+# Columna auxiliar con el texto libre de cada fila (solo existe durante la imputación)
+TEXT_COLUMN = '_text'
+
+
+def _mentions(word: str) -> Callable[[pd.DataFrame], pd.Series]:
+    """Condición: algún campo de texto de la fila menciona `word`."""
+    def condition(d):
+        text = d[TEXT_COLUMN]
+        if isinstance(text, str):
+            return word in text
+        return text.str.contains(word, regex=False)
+    return condition
+
+
+def _is_missing(value: Any) -> bool:
+    """None o NaN."""
+    return value is None or (isinstance(value, (float, np.floating)) and math.isnan(value))
+
+
+def _to_number(value: Any) -> Any:
+    """Coerción de un escalar como `pd.to_numeric(errors='coerce')`."""
+    if _is_missing(value):
+        return np.nan
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return np.nan
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _egfr(d: pd.DataFrame) -> np.ndarray:
+    """eGFR CKD-EPI 2021 desde creatinina (NaN si falta edad o sexo)."""
+    return egfr_ckdepi(d['SerumCreatinine'], d['Age'], d['Gender'])
+
+
+# Reglas por campo: (campo, valor, condición). Para cada fila se aplica la
+# primera regla del campo cuya condición se cumple (None = siempre). El valor
+# puede ser una función del lote; si devuelve NaN se pasa a la siguiente regla.
+# El orden importa: las condiciones leen campos ya imputados por reglas previas.
+IMPUTATION_RULES: List[Tuple[str, Value, Condition]] = [
+    # Demografía
+    ('Ethnicity', 3, None),  # Hispano
+    ('SocioeconomicStatus', 1, None),
+    ('EducationLevel', 1, None),
+
+    # Estilo de vida (IMC nunca 0)
+    ('BMI', 32.0, lambda d: d['HistoryObesity'] == 1),
+    ('BMI', 32.0, _mentions('obesidad')),
+    ('BMI', 27.0, _mentions('sobrepeso')),
+    ('BMI', 24.0, None),
+    ('Smoking', 0, None),
+    ('AlcoholConsumption', 0.0, None),
+    ('PhysicalActivity', 2.0, None),
+
+    # Historial familiar
+    ('FamilyHistoryKidneyDisease', 0, None),
+    ('FamilyHistoryHypertension', 0, None),
+    ('FamilyHistoryDiabetes', 0, None),
+
+    # Medicación
+    ('ACEInhibitors', 0, None),
+    ('Diuretics', 0, None),
+    ('HTNmeds', 0, None),
+    ('NSAIDsUse', 0.0, None),
+    ('Statins', 0, None),
+    ('AntidiabeticMedications', 0, None),
+
+    # Historial personal, inferido de labs y medicación cuando falta
+    ('HistoryDiabetes', 1, lambda d: (d['HbA1c'] > 6.5) | (d['AntidiabeticMedications'] == 1)),
+    ('HistoryDiabetes', 0, None),
+    ('HistoryHTN', 1, lambda d: (d['SystolicBP'] > 140) | (d['DiastolicBP'] > 90) |
+                                (d['ACEInhibitors'] == 1) | (d['Diuretics'] == 1) | (d['HTNmeds'] == 1)),
+    ('HistoryHTN', 0, None),
+    ('HistoryObesity', 1, lambda d: d['BMI'] > 30),
+    ('HistoryObesity', 0, None),
+    ('HistoryDLD', 1, lambda d: d['Statins'] == 1),
+    ('HistoryDLD', 0, None),
+    ('HistoryCHD', 0, None),
+    ('HistoryVascular', 0, None),
+    ('PreviousAcuteKidneyInjury', 0, None),
+    ('UrinaryTractInfections', 0, None),
+
+    # Tensión arterial
+    ('SystolicBP', 140, lambda d: d['HistoryHTN'] == 1),
+    ('SystolicBP', 120, None),
+    ('DiastolicBP', 85, lambda d: d['HistoryHTN'] == 1),
+    ('DiastolicBP', 80, None),
+
+    # Control glucémico
+    ('FastingBloodSugar', 130.0, lambda d: d['HistoryDiabetes'] == 1),
+    ('FastingBloodSugar', 90.0, None),
+    ('HbA1c', 7.5, lambda d: d['HistoryDiabetes'] == 1),
+    ('HbA1c', 5.5, None),
+
+    # Función renal
+    ('SerumCreatinine', 1.0, None),
+    ('BUNLevels', 15.0, None),
+    ('GFR', _egfr, None),
+    ('GFR', 90.0, None),
+    ('ProteinInUrine', 0.0, None),
+    ('ACR', 15.0, None),
+
+    # Electrolitos
+    ('SerumElectrolytesSodium', 140.0, None),
+    ('SerumElectrolytesPotassium', 4.5, None),
+    ('SerumElectrolytesCalcium', 9.5, None),
+    ('SerumElectrolytesPhosphorus', 3.5, None),
+
+    # Hemograma (anemia en ERC)
+    ('HemoglobinLevels', 11.0, lambda d: (d['SerumCreatinine'] > 2.0) | (d['GFR'] < 45)),
+    ('HemoglobinLevels', 14.0, None),
+
+    # Perfil lipídico
+    ('CholesterolTotal', 200.0, None),
+    ('CholesterolLDL', 100.0, None),
+    ('CholesterolHDL', 50.0, None),
+    ('CholesterolTriglycerides', 150.0, None),
+
+    # Síntomas
+    ('Edema', 0, None),
+    ('FatigueLevels', 0, None),
+    ('NauseaVomiting', 0, None),
+    ('MuscleCramps', 0, None),
+    ('Itching', 0.0, None),
+
+    # Exposiciones
+    ('HeavyMetalsExposure', 0, None),
+    ('OccupationalExposureChemicals', 0, None),
+
+    # Adherencia
+    ('MedicalCheckupsFrequency', 1.0, None),
+    ('MedicationAdherence', 5.0, None),
+    ('HealthLiteracy', 5.0, None),
+]
+
+
+class ImputationEngine:
+    """
+    Aplica una tabla de reglas de imputación a lotes de pacientes.
+
+    Las reglas se agrupan por campo al construir el motor; `impute` recorre
+    los campos una vez y solo evalúa condiciones en los que faltan valores.
+    """
+
+    def __init__(self, rules: List[Tuple[str, Value, Condition]], aliases: Optional[Dict[str, str]] = None):
+        self.aliases = aliases or {}
+        self.rules: Dict[str, List[Tuple[Value, Condition]]] = {}
+        for field, value, condition in rules:
+            self.rules.setdefault(field, []).append((value, condition))
+        self.fields = list(self.rules)
+        # Campos leídos por las condiciones que no tienen regla propia
+        self._inputs = ['Age', 'Gender']
+        # Campos enteros (todas sus reglas tienen valor int)
+        self.integer_fields = {
+            field for field, field_rules in self.rules.items()
+            if all(isinstance(value, int) for value, _ in field_rules)
+        }
+
+    def normalize(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Unifica alias (BUN -> BUNLevels) sin duplicar columnas."""
+        for alias, field in self.aliases.items():
+            if alias not in df:
+                continue
+            if field in df:
+                df[field] = df[field].fillna(df[alias])
+                df = df.drop(columns=alias)
+            else:
+                df = df.rename(columns={alias: field})
+        return df
+
+    def impute(
+        self,
+        df: pd.DataFrame,
+        zero_as_missing: Iterable[str] = ()
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Rellena los campos que faltan (ausentes, None o NaN).
+
+        Args:
+            df: Una fila por paciente
+            zero_as_missing: Campos en los que 0 también cuenta como ausente
+                (el extractor de PDFs devuelve 0 cuando no encuentra el dato)
+
+        Returns:
+            (DataFrame imputado, máscara booleana de campos imputados)
+        """
+        df = self.normalize(df.copy())
+
+        # Texto libre de la fila, calculado una vez por lote y solo si lo hay
+        text = df.select_dtypes(include=['object', 'string'])
+        if text.empty:
+            df[TEXT_COLUMN] = ''
+        else:
+            df[TEXT_COLUMN] = text.fillna('').astype(str).agg(' '.join, axis=1).str.lower()
+
+        for field in self.fields + self._inputs:
+            if field not in df:
+                df[field] = np.nan
+            elif not pd.api.types.is_numeric_dtype(df[field]):
+                df[field] = pd.to_numeric(df[field], errors='coerce')
+        for field in zero_as_missing:
+            if field in self.rules:
+                df[field] = df[field].mask(df[field] == 0)
+
+        imputed = pd.DataFrame(False, index=df.index, columns=self.fields)
+        for field, rules in self.rules.items():
+            initially_missing = df[field].isna()
+            if not initially_missing.any():
+                continue
+
+            missing = initially_missing
+            for value, condition in rules:
+                target = missing if condition is None else missing & condition(df).fillna(False).astype(bool)
+                if not target.any():
+                    continue
+                if callable(value):
+                    values = pd.Series(np.asarray(value(df), dtype=float), index=df.index)
+                    target = target & values.notna()
+                    df.loc[target, field] = values[target]
+                else:
+                    df.loc[target, field] = value
+                missing = missing & ~target
+                if not missing.any():
+                    break
+            imputed[field] = initially_missing & ~missing
+
+        return df.drop(columns=TEXT_COLUMN), imputed
+
+    def impute_record(
+        self,
+        data: Dict[str, Any],
+        zero_as_missing: Iterable[str] = ()
+    ) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Imputa un único paciente sin pasar por pandas.
+
+        Mismas reglas y resultado que `impute` sobre un lote de una fila, con
+        las condiciones evaluadas sobre escalares: /predict y el extractor
+        imputan pacientes sueltos y construir un DataFrame por petición
+        domina su coste.
+
+        Returns:
+            (diccionario completo, campos imputados en el orden de las reglas)
+        """
+        record = dict(data)
+        for alias, field in self.aliases.items():
+            if alias not in record:
+                continue
+            if field in record:
+                if _is_missing(record[field]):
+                    record[field] = record[alias]
+                del record[alias]
+            else:
+                record = {field if key == alias else key: value for key, value in record.items()}
+
+        text = ' '.join(value for value in record.values() if isinstance(value, str)).lower()
+
+        for field in self.fields + self._inputs:
+            record[field] = _to_number(record.get(field))
+        for field in zero_as_missing:
+            if field in self.rules and record[field] == 0:
+                record[field] = np.nan
+
+        record[TEXT_COLUMN] = text
+        imputed = []
+        for field, rules in self.rules.items():
+            if not _is_missing(record[field]):
+                continue
+            for value, condition in rules:
+                if condition is not None and not bool(condition(record)):
+                    continue
+                if callable(value):
+                    value = float(np.asarray(value(record), dtype=float).reshape(-1)[0])
+                    if math.isnan(value):
+                        continue
+                record[field] = value
+                imputed.append(field)
+                break
+        del record[TEXT_COLUMN]
+
+        for field in self.integer_fields:
+            value = record[field]
+            if isinstance(value, float) and value.is_integer():
+                record[field] = int(value)
+        return record, imputed
+
+
+engine = ImputationEngine(IMPUTATION_RULES, FIELD_ALIASES)
+
+
+def impute(df: pd.DataFrame, zero_as_missing: Iterable[str] = ()) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Imputa un lote con la tabla de reglas por defecto (ver `ImputationEngine.impute`)."""
+    return engine.impute(df, zero_as_missing)
+
+
+def impute_record(data: Dict[str, Any], zero_as_missing: Iterable[str] = ()) -> Tuple[Dict[str, Any], List[str]]:
+    """Imputa un único paciente; devuelve el diccionario completo y los campos imputados."""
+    return engine.impute_record(data, zero_as_missing)
+
+
+def imputed_fields(imputed: pd.DataFrame) -> List[List[str]]:
+    """Convierte la máscara en la lista de campos imputados por fila."""
+    columns = np.asarray(imputed.columns)
+    return [columns[row].tolist() for row in imputed.to_numpy()]
@@ -0,0 +1,81 @@
+"""
+NephroMind - Parser JSON incremental
+Decodifica los miembros de primer nivel de un objeto JSON a medida que llega
+el texto en trozos (respuesta en streaming de Gemini), sin esperar al cierre
+del objeto.
+"""
+
+import json
+from typing import Any, List, Tuple
+
+
+class IncrementalObjectParser:
+    """
+    Recorre el texto una sola vez siguiendo profundidad y strings; cada vez
+    que se cierra un miembro de primer nivel (',' o '}' a profundidad 1) lo
+    decodifica y lo devuelve.
+
+    Ignora el texto previo al primer '{' (p.ej. la valla ```json). Los
+    miembros que no se pueden decodificar (JSON inválido del modelo) se
+    descartan aquí: el parseo completo de la respuesta sigue siendo el
+    definitivo.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = -1
+        self.done = False
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """
+        Añade un trozo de texto.
+
+        Returns:
+            Lista de (clave, valor) completados con este trozo
+        """
+        self._buffer += text
+        buffer, members = self._buffer, []
+
+        i = self._pos
+        while i < len(buffer) and not self.done:
+            ch = buffer[i]
+            if self._member_start < 0:
+                if ch == '{':
+                    self._depth, self._member_start = 1, i + 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    members.extend(self._decode(buffer[self._member_start:i]))
+                    self.done = True
+            elif ch == ',' and self._depth == 1:
+                members.extend(self._decode(buffer[self._member_start:i]))
+                self._member_start = i + 1
+            i += 1
+
+        self._pos = i
+        return members
+
+    @staticmethod
+    def _decode(member: str) -> List[Tuple[str, Any]]:
+        member = member.strip()
+        if not member:  # Coma final
+            return []
+        try:
+            return list(json.loads("{" + member + "}").items())
+        except json.JSONDecodeError:
+            return []
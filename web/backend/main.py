@@ -4,17 +4,44 @@ FastAPI backend para predicción de riesgo de Enfermedad Renal Crónica.
 """
 
 import os
+import hmac
+import json
+import asyncio
 import shutil
 import logging
 import traceback
-from typing import Optional, Dict, Any
-
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
+
+# Antes de los imports pesados, para medir su huella (ver footprint.py)
+import footprint
+footprint.start()
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Header
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, Response, FileResponse
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
 
 from model import KidneyDiseaseModel
-from agent import MedicalRecordExtractor
+from batching import PredictionBatcher
+from monitoring import DriftMonitor
+from imputation import impute, impute_record, imputed_fields
+from store import PatientStore
+import execution
+from admission import AdmissionMiddleware, ConcurrencyLimiter, RateLimitExceeded
+import clinical_scores
+import fhir_ingest
+import arrow_io
+import profiling
+
+# Perfil lean: réplicas solo de predicción, sin cargar Gemini ni pymupdf
+if not footprint.LEAN_SERVING:
+    from agent import MedicalRecordExtractor
 
 # Configuración de logging
 logging.basicConfig(
@@ -22,6 +49,7 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+footprint.mark("imports")
 
 # ============================================
 # CONFIGURACIÓN DE LA APP
@@ -32,8 +60,29 @@ app = FastAPI(
     description="Sistema de detección temprana de Enfermedad Renal Crónica mediante IA",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
+)
+
+# Control de admisión por endpoint: (concurrencia, cola, espera máxima en s)
+# Las dos variantes de análisis de PDF comparten cupo. Las extracciones son
+# corrutinas (no ocupan hilo); el ritmo real lo marca GEMINI_RATE_LIMITER
+PDF_LIMITER = ConcurrencyLimiter(
+    max_concurrent=int(os.getenv("NEPHROMIND_PDF_CONCURRENCY", "16")),
+    max_queue=int(os.getenv("NEPHROMIND_PDF_QUEUE", "32")),
+    queue_timeout=float(os.getenv("NEPHROMIND_PDF_QUEUE_TIMEOUT", "30")),
+    retry_after=30
 )
+ADMISSION_LIMITS = {
+    "/analyze_pdf": PDF_LIMITER,
+    "/analyze_pdf/stream": PDF_LIMITER,
+    "/ingest/fhir": ConcurrencyLimiter(max_concurrent=1, max_queue=2, queue_timeout=5, retry_after=60),
+    "/predict": ConcurrencyLimiter(max_concurrent=256, max_queue=1024, queue_timeout=2, retry_after=1),
+    "/predict/batch": ConcurrencyLimiter(max_concurrent=4, max_queue=16, queue_timeout=10, retry_after=5),
+    "/predict/arrow": ConcurrencyLimiter(max_concurrent=2, max_queue=8, queue_timeout=10, retry_after=5),
+}
+# Se añade antes que CORS para que las respuestas 429/503 lleven cabeceras CORS
+app.add_middleware(AdmissionMiddleware, limits=ADMISSION_LIMITS)
 
 # CORS - Permitir todo para el hackathon
 app.add_middleware(
@@ -44,12 +93,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profiling por petición (ver profiling.py); sin activar no se añade el middleware
+if profiling.enabled():
+    app.add_middleware(profiling.ProfilingMiddleware)
+
 # ============================================
 # MODELO GLOBAL
 # ============================================
 
+# Se sustituye entero al recargar (ver load_serving_model): los handlers leen
+# la referencia una vez por petición y nunca ven un modelo a medio actualizar
 model = KidneyDiseaseModel()
 
+# Extractor compartido por todas las peticiones: un solo cliente de Gemini
+# (y un solo canal) por proceso. None en el perfil lean
+extractor = None if footprint.LEAN_SERVING else MedicalRecordExtractor()
+
+# Micro-batching opcional de /predict (ver batching.py)
+MICROBATCH_ENABLED = os.getenv("NEPHROMIND_MICROBATCH", "0") == "1"
+batcher = PredictionBatcher(
+    model,
+    max_batch_size=int(os.getenv("NEPHROMIND_BATCH_MAX_SIZE", "64")),
+    max_wait_ms=float(os.getenv("NEPHROMIND_BATCH_MAX_WAIT_MS", "2"))
+) if MICROBATCH_ENABLED else None
+
+# Usar el modelo compacto de serving si está disponible (ver compaction.py)
+USE_COMPACT_MODEL = os.getenv("NEPHROMIND_COMPACT_MODEL", "0") == "1"
+
+# Token de /retrain (cabecera X-Admin-Token). Sin él, el endpoint está deshabilitado
+ADMIN_TOKEN = os.getenv("NEPHROMIND_ADMIN_TOKEN")
+
 # Rutas de datos (Docker y local)
 DATA_PATHS = [
     "/app/archive/kidney_data.csv",  # Docker
@@ -62,33 +135,97 @@ DATA_PATHS = [
 # EVENTOS DE STARTUP
 # ============================================
 
+# Monitor de drift de las entradas de /predict (ver monitoring.py)
+drift_monitor = DriftMonitor(rename_map=KidneyDiseaseModel.COLUMN_RENAME_MAP)
+
+# Historial de predicciones y extracciones por paciente (ver store.py)
+patient_store = PatientStore()
+
+# Readiness: /predict no se acepta hasta que haya un modelo cargado
+model_ready = asyncio.Event()
+training_task: Optional[asyncio.Task] = None
+
+
+def load_serving_model() -> bool:
+    """
+    Carga el modelo guardado, lo prepara para inferencia y lo publica.
+    
+    El modelo nuevo se prepara completo aparte y se publica con una sola
+    asignación de referencia: cada predicción usa de principio a fin el
+    modelo con el que empezó, sin mezclar scaler, booster y threshold de
+    versiones distintas.
+    """
+    global model
+    serving_model = KidneyDiseaseModel()
+    if not serving_model.load_model(compact=USE_COMPACT_MODEL):
+        return False
+    serving_model.set_inference_threads(1)
+    footprint.mark("model_loaded")
+    warm_common_profiles(serving_model)
+    
+    model = serving_model
+    if batcher is not None:
+        batcher.model = serving_model
+    drift_monitor.reset(serving_model.reference_profile)
+    model_ready.set()
+    footprint.mark("ready")
+    return True
+
+
+async def train_and_reload(data_path: str, incremental: bool = False) -> None:
+    """Entrena en el proceso de entrenamiento y recarga el modelo al terminar."""
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(
+            execution.training_pool(), execution.train_in_subprocess, data_path, incremental
+        )
+        await loop.run_in_executor(execution.inference_pool(), load_serving_model)
+        logger.info("✓ Modelo entrenado exitosamente")
+    except Exception as e:
+        logger.error(f"Error entrenando: {e}")
+
+
 @app.on_event("startup")
 async def startup_event():
-    """Carga o entrena el modelo al iniciar."""
+    """Carga el modelo, o lanza el entrenamiento en segundo plano si no existe."""
+    global training_task
     logger.info("=" * 50)
     logger.info("INICIANDO NEPHROMIND API")
     logger.info("=" * 50)
     
+    if batcher is not None:
+        batcher.start()
+    patient_store.start()
+    
     # Intentar cargar modelo guardado primero
-    if model.load_model():
+    loop = asyncio.get_running_loop()
+    if await loop.run_in_executor(execution.inference_pool(), load_serving_model):
         logger.info("✓ Modelo cargado desde archivo")
         return
     
-    # Si no hay modelo, intentar entrenar
+    if footprint.LEAN_SERVING:
+        logger.warning("⚠ No hay modelo guardado y el perfil lean no entrena")
+        return
+    
+    # Si no hay modelo, entrenar fuera del event loop
     for data_path in DATA_PATHS:
         if os.path.exists(data_path):
             logger.info(f"Entrenando modelo con: {data_path}")
-            try:
-                model.train(data_path)
-                logger.info("✓ Modelo entrenado exitosamente")
-                return
-            except Exception as e:
-                logger.error(f"Error entrenando: {e}")
-                continue
+            training_task = asyncio.create_task(train_and_reload(data_path))
+            return
     
     logger.warning("⚠ No se encontró dataset ni modelo guardado")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Detiene el dispatcher de micro-batching, el historial y los pools de ejecución."""
+    if batcher is not None:
+        batcher.stop()
+    patient_store.stop()
+    execution.shutdown()
+
+
 # ============================================
 # MODELOS PYDANTIC
 # ============================================
@@ -96,95 +233,104 @@ async def startup_event():
 class PatientData(BaseModel):
     """
     Datos del paciente para predicción de riesgo de ERC.
-    Todos los campos tienen valores por defecto razonables.
+    Los campos opcionales que no se envíen se imputan con las reglas de
+    imputation.py y se devuelven en `imputed_fields`.
     """
     
+    # Identificador opcional: si se envía, la predicción se guarda en el historial
+    patient_id: Optional[str] = Field(default=None, max_length=128, description="Identificador del paciente")
+    # Fecha de la analítica: fecha la predicción en el historial (pendiente de eGFR)
+    measured_at: Optional[datetime] = Field(
+        default=None,
+        description="Fecha de la analítica (ISO 8601); por defecto, la de la petición"
+    )
+    
     # Demografía (Requeridos)
     Age: int = Field(..., ge=0, le=120, description="Edad en años")
     Gender: int = Field(..., ge=0, le=1, description="0=Masculino, 1=Femenino")
     
     # Demografía (Opcionales)
-    Ethnicity: int = Field(default=3, ge=0, le=4, description="Etnia (3=Hispano)")
-    SocioeconomicStatus: int = Field(default=1, ge=0, le=2)
-    EducationLevel: int = Field(default=1, ge=0, le=3)
+    Ethnicity: Optional[int] = Field(default=None, ge=0, le=4, description="Etnia (3=Hispano)")
+    SocioeconomicStatus: Optional[int] = Field(default=None, ge=0, le=2)
+    EducationLevel: Optional[int] = Field(default=None, ge=0, le=3)
     
     # Estilo de vida (Requerido: BMI)
     BMI: float = Field(..., ge=10, le=60, description="Índice de Masa Corporal")
-    Smoking: int = Field(default=0, ge=0, le=1)
-    AlcoholConsumption: float = Field(default=0.0, ge=0)
-    PhysicalActivity: float = Field(default=2.0, ge=0)
+    Smoking: Optional[int] = Field(default=None, ge=0, le=1)
+    AlcoholConsumption: Optional[float] = Field(default=None, ge=0)
+    PhysicalActivity: Optional[float] = Field(default=None, ge=0)
     
     # Historial Familiar
-    FamilyHistoryKidneyDisease: int = Field(default=0, ge=0, le=1)
-    FamilyHistoryHypertension: int = Field(default=0, ge=0, le=1)
-    FamilyHistoryDiabetes: int = Field(default=0, ge=0, le=1)
+    FamilyHistoryKidneyDisease: Optional[int] = Field(default=None, ge=0, le=1)
+    FamilyHistoryHypertension: Optional[int] = Field(default=None, ge=0, le=1)
+    FamilyHistoryDiabetes: Optional[int] = Field(default=None, ge=0, le=1)
     
     # Historial Personal
-    HistoryDiabetes: int = Field(default=0, ge=0, le=1)
-    HistoryCHD: int = Field(default=0, ge=0, le=1)
-    HistoryVascular: int = Field(default=0, ge=0, le=1)
-    HistoryHTN: int = Field(default=0, ge=0, le=1)
-    HistoryDLD: int = Field(default=0, ge=0, le=1)
-    HistoryObesity: int = Field(default=0, ge=0, le=1)
-    PreviousAcuteKidneyInjury: int = Field(default=0, ge=0, le=1)
-    UrinaryTractInfections: int = Field(default=0, ge=0, le=1)
+    HistoryDiabetes: Optional[int] = Field(default=None, ge=0, le=1)
+    HistoryCHD: Optional[int] = Field(default=None, ge=0, le=1)
+    HistoryVascular: Optional[int] = Field(default=None, ge=0, le=1)
+    HistoryHTN: Optional[int] = Field(default=None, ge=0, le=1)
+    HistoryDLD: Optional[int] = Field(default=None, ge=0, le=1)
+    HistoryObesity: Optional[int] = Field(default=None, ge=0, le=1)
+    PreviousAcuteKidneyInjury: Optional[int] = Field(default=None, ge=0, le=1)
+    UrinaryTractInfections: Optional[int] = Field(default=None, ge=0, le=1)
     
     # Signos Vitales (Requeridos)
     SystolicBP: int = Field(..., ge=60, le=250, description="TA Sistólica mmHg")
     DiastolicBP: int = Field(..., ge=40, le=150, description="TA Diastólica mmHg")
     
     # Glucemia
-    FastingBloodSugar: float = Field(default=90.0, ge=40, le=500)
-    HbA1c: float = Field(default=5.5, ge=3, le=15)
+    FastingBloodSugar: Optional[float] = Field(default=None, ge=40, le=500)
+    HbA1c: Optional[float] = Field(default=None, ge=3, le=15)
     
     # Función Renal
-    SerumCreatinine: float = Field(default=1.0, ge=0.1, le=20)
-    BUN: float = Field(default=15.0, ge=1, le=150, description="También acepta BUNLevels")
-    GFR: float = Field(default=90.0, ge=1, le=150, description="eGFR calculado")
-    ProteinInUrine: float = Field(default=0.0, ge=0, le=100, description="g/L - Permite valores patológicos extremos")
-    ACR: float = Field(default=15.0, ge=0, le=5000)
+    SerumCreatinine: Optional[float] = Field(default=None, ge=0.1, le=20)
+    BUN: Optional[float] = Field(default=None, ge=1, le=150, description="También acepta BUNLevels")
+    GFR: Optional[float] = Field(default=None, ge=1, le=150, description="eGFR calculado (si falta, CKD-EPI 2021 desde creatinina)")
+    ProteinInUrine: Optional[float] = Field(default=None, ge=0, le=100, description="g/L - Permite valores patológicos extremos")
+    ACR: Optional[float] = Field(default=None, ge=0, le=5000)
     
     # Electrolitos
-    SerumElectrolytesSodium: float = Field(default=140.0)
-    SerumElectrolytesPotassium: float = Field(default=4.5)
-    SerumElectrolytesCalcium: float = Field(default=9.5)
-    SerumElectrolytesPhosphorus: float = Field(default=3.5)
+    SerumElectrolytesSodium: Optional[float] = Field(default=None)
+    SerumElectrolytesPotassium: Optional[float] = Field(default=None)
+    SerumElectrolytesCalcium: Optional[float] = Field(default=None)
+    SerumElectrolytesPhosphorus: Optional[float] = Field(default=None)
     
     # Hemograma
-    HemoglobinLevels: float = Field(default=14.0)
+    HemoglobinLevels: Optional[float] = Field(default=None)
     
     # Perfil Lipídico
-    CholesterolTotal: float = Field(default=200.0)
-    CholesterolLDL: float = Field(default=100.0)
-    CholesterolHDL: float = Field(default=50.0)
-    CholesterolTriglycerides: float = Field(default=150.0)
+    CholesterolTotal: Optional[float] = Field(default=None)
+    CholesterolLDL: Optional[float] = Field(default=None)
+    CholesterolHDL: Optional[float] = Field(default=None)
+    CholesterolTriglycerides: Optional[float] = Field(default=None)
     
     # Medicación
-    ACEInhibitors: int = Field(default=0, ge=0, le=1)
-    Diuretics: int = Field(default=0, ge=0, le=1)
-    HTNmeds: int = Field(default=0, ge=0, le=1)
-    NSAIDsUse: float = Field(default=0.0, ge=0, le=10)
-    Statins: int = Field(default=0, ge=0, le=1)
-    AntidiabeticMedications: int = Field(default=0, ge=0, le=1)
+    ACEInhibitors: Optional[int] = Field(default=None, ge=0, le=1)
+    Diuretics: Optional[int] = Field(default=None, ge=0, le=1)
+    HTNmeds: Optional[int] = Field(default=None, ge=0, le=1)
+    NSAIDsUse: Optional[float] = Field(default=None, ge=0, le=10)
+    Statins: Optional[int] = Field(default=None, ge=0, le=1)
+    AntidiabeticMedications: Optional[int] = Field(default=None, ge=0, le=1)
     
     # Síntomas
-    Edema: int = Field(default=0, ge=0, le=1)
-    Fatigue: int = Field(default=0, ge=0, le=1, description="También acepta FatigueLevels")
-    NauseaVomiting: int = Field(default=0, ge=0, le=1)
-    MuscleCramps: int = Field(default=0, ge=0, le=1)
-    Itching: float = Field(default=0.0, ge=0, le=10)
+    Edema: Optional[int] = Field(default=None, ge=0, le=1)
+    Fatigue: Optional[int] = Field(default=None, ge=0, le=1, description="También acepta FatigueLevels")
+    NauseaVomiting: Optional[int] = Field(default=None, ge=0, le=1)
+    MuscleCramps: Optional[int] = Field(default=None, ge=0, le=1)
+    Itching: Optional[float] = Field(default=None, ge=0, le=10)
     
     # Exposiciones
-    HeavyMetalsExposure: int = Field(default=0, ge=0, le=1)
-    OccupationalExposureChemicals: int = Field(default=0, ge=0, le=1)
+    HeavyMetalsExposure: Optional[int] = Field(default=None, ge=0, le=1)
+    OccupationalExposureChemicals: Optional[int] = Field(default=None, ge=0, le=1)
     
     # Adherencia
-    MedicalCheckupsFrequency: float = Field(default=1.0, ge=0, le=12)
-    MedicationAdherence: float = Field(default=5.0, ge=0, le=10)
-    HealthLiteracy: float = Field(default=5.0, ge=0, le=10)
+    MedicalCheckupsFrequency: Optional[float] = Field(default=None, ge=0, le=12)
+    MedicationAdherence: Optional[float] = Field(default=None, ge=0, le=10)
+    HealthLiteracy: Optional[float] = Field(default=None, ge=0, le=10)
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "Age": 61,
                 "Gender": 1,
@@ -197,6 +343,38 @@ class PatientData(BaseModel):
                 "GFR": 42
             }
         }
+    )
+
+
+# Validador precompilado para lotes: valida el JSON crudo en una sola pasada
+PATIENT_BATCH_ADAPTER = TypeAdapter(List[PatientData])
+
+
+
+# Campos de PatientData que no son features del modelo
+NON_FEATURE_FIELDS = {'patient_id', 'measured_at'}
+
+
+def measured_epoch(measured_at: Optional[datetime]) -> Optional[float]:
+    """Epoch de la fecha de la analítica (sin zona horaria se toma UTC)."""
+    if measured_at is None:
+        return None
+    if measured_at.tzinfo is None:
+        measured_at = measured_at.replace(tzinfo=timezone.utc)
+    return measured_at.timestamp()
+
+
+def warm_common_profiles(serving_model: KidneyDiseaseModel) -> None:
+    """Precalcula explicaciones SHAP de los perfiles por defecto del formulario."""
+    example = PatientData.model_config["json_schema_extra"]["example"]
+    serving_model.warm_explanations([PatientData(**example).model_dump(exclude=NON_FEATURE_FIELDS)])
+
+
+class Contributor(BaseModel):
+    """Factor contribuyente (valor SHAP) de una predicción."""
+    feature: str
+    impact: float
+    value: float
 
 
 class PredictionResponse(BaseModel):
@@ -204,9 +382,25 @@ class PredictionResponse(BaseModel):
     risk_class: int
     risk_level: str
     probability: float
-    contributors: list
+    contributors: List[Contributor]
     gfr_stage: str
     model_threshold: float
+    egfr: float
+    acr_stage: str
+    kfre_2yr: Optional[float] = None
+    kfre_5yr: Optional[float] = None
+    imputed_fields: List[str] = []
+
+
+class BatchPredictionItem(BaseModel):
+    """Resultado de un paciente en /predict/batch."""
+    risk_class: int
+    probability: float
+    gfr_stage: str
+    egfr: float
+    acr_stage: str
+    kfre_2yr: Optional[float] = None
+    imputed_fields: List[str] = []
 
 
 class PDFAnalysisResponse(BaseModel):
@@ -214,6 +408,7 @@ class PDFAnalysisResponse(BaseModel):
     status: str
     message: str
     extracted_data: Dict[str, Any]
+    imputed_fields: List[str] = []
 
 
 # ============================================
@@ -231,8 +426,18 @@ def read_root():
         "model_loaded": model.model is not None,
         "endpoints": {
             "POST /predict": "Predecir riesgo de ERC",
+            "POST /predict/batch": "Predecir riesgo de ERC para una lista de pacientes",
+            "POST /predict/arrow": "Predicción por lotes en Arrow IPC/Parquet (servicio a servicio)",
             "POST /analyze_pdf": "Analizar historia clínica PDF",
-            "GET /health": "Estado del servicio"
+            "POST /analyze_pdf/stream": "Analizar historia clínica PDF con progreso (SSE)",
+            "POST /ingest/fhir": "Ingesta FHIR Bulk Data (NDJSON)",
+            "POST /retrain": "Re-entrenar el modelo en segundo plano",
+            "GET /health": "Estado del servicio",
+            "GET /monitoring/drift": "Drift de las entradas frente al entrenamiento",
+            "GET /monitoring/memory": "Huella de memoria del proceso",
+            "GET /profiles": "Perfiles de peticiones (cabecera X-Profile: 1)",
+            "GET /patients/{patient_id}/trajectory": "Historial de riesgo del paciente",
+            "GET /patients/{patient_id}/egfr_slope": "Pendiente de eGFR del paciente"
         }
     }
 
@@ -240,15 +445,54 @@ def read_root():
 @app.get("/health", tags=["Info"])
 def health_check():
     """Health check para monitoreo."""
+    current = model
     return {
         "status": "healthy",
-        "model_loaded": model.model is not None,
-        "model_threshold": model.threshold if model.model else None
+        "model_loaded": current.model is not None,
+        "ready": model_ready.is_set(),
+        "training": training_task is not None and not training_task.done(),
+        "admission": {path: limiter.stats() for path, limiter in ADMISSION_LIMITS.items()},
+        "model_threshold": current.threshold if current.model else None,
+        "cascade": {
+            "lower": current.active_cascade['lower'],
+            "upper": current.active_cascade['upper'],
+            "validation": current.active_cascade['validation']
+        } if current.active_cascade else None
     }
 
 
+@app.get("/monitoring/drift", tags=["Info"])
+def drift_report():
+    """
+    Drift de las entradas de /predict frente a los datos de entrenamiento.
+    
+    Por feature: PSI, tasa de ausentes y de valores por defecto, y cuantiles
+    aproximados frente a los de referencia.
+    """
+    return drift_monitor.report()
+
+
+@app.get("/monitoring/memory", tags=["Info"])
+def memory_report(top: int = 20):
+    """
+    Huella de memoria del proceso: RSS por fase de arranque, dependencias
+    pesadas cargadas y, con NEPHROMIND_TRACEMALLOC=1, memoria viva por
+    subsistema (los `top` mayores).
+    """
+    return footprint.report(top)
+
+
+def require_full_profile(feature: str) -> None:
+    """Rechaza funcionalidades que el perfil lean no carga."""
+    if footprint.LEAN_SERVING:
+        raise HTTPException(
+            status_code=501,
+            detail=f"{feature} no disponible en el perfil de serving lean"
+        )
+
+
 @app.post("/predict", response_model=PredictionResponse, tags=["Prediction"])
-def predict_risk(data: PatientData):
+async def predict_risk(data: PatientData):
     """
     Predice el riesgo de Enfermedad Renal Crónica.
     
@@ -256,48 +500,72 @@ def predict_risk(data: PatientData):
     - risk_class: 0 (bajo) o 1 (alto)
     - probability: probabilidad de ERC (0-1)
     - contributors: factores principales (XAI con SHAP)
-    - gfr_stage: clasificación KDIGO
+    - gfr_stage / acr_stage: clasificación KDIGO
+    - egfr: eGFR usado (CKD-EPI 2021 desde creatinina si no se informa)
+    - kfre_2yr / kfre_5yr: riesgo de fallo renal (solo eGFR < 60)
     """
+    if not model_ready.is_set():
+        raise HTTPException(
+            status_code=503,
+            detail="Modelo no disponible (entrenamiento en curso)",
+            headers={"Retry-After": "30"}
+        )
+    
     try:
-        input_data = data.dict()
+        # Imputar campos no enviados (eGFR con CKD-EPI 2021 desde creatinina)
+        input_data, imputed = impute_record(data.model_dump(exclude=NON_FEATURE_FIELDS))
         
         logger.info(f"Predicción para paciente: Edad={input_data.get('Age')}, "
                    f"Creatinina={input_data.get('SerumCreatinine')}, "
                    f"GFR={input_data.get('GFR')}")
         
-        # Realizar predicción
-        result = model.predict(input_data)
+        # Realizar predicción (agrupada en lotes si el micro-batching está activo)
+        with profiling.span("model.predict"):
+            if batcher is not None:
+                result = await asyncio.wrap_future(batcher.submit(input_data, imputed))
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    execution.inference_pool(), model.predict, input_data, imputed
+                )
         
         if "error" in result:
             raise HTTPException(status_code=500, detail=result["error"])
         
+        drift_monitor.observe(input_data, defaulted=imputed)
+        
         # Determinar nivel de riesgo
         risk_level = "Alto" if result["prediction"] == 1 else "Bajo"
         
-        # Clasificación GFR según KDIGO
-        gfr = input_data.get('GFR', 90)
-        if gfr >= 90:
-            gfr_stage = "G1"
-        elif gfr >= 60:
-            gfr_stage = "G2"
-        elif gfr >= 45:
-            gfr_stage = "G3a"
-        elif gfr >= 30:
-            gfr_stage = "G3b"
-        elif gfr >= 15:
-            gfr_stage = "G4"
-        else:
-            gfr_stage = "G5"
+        # Clasificación KDIGO y riesgo de fallo renal
+        gfr = input_data['GFR']
+        gfr_stage = clinical_scores.gfr_stage(gfr)[0]
+        acr_stage = clinical_scores.acr_stage(input_data['ACR'])[0]
+        kfre_2yr, kfre_5yr = clinical_scores.kfre(
+            input_data['Age'], input_data['Gender'], gfr, input_data['ACR']
+        )
         
-        return PredictionResponse(
+        response = PredictionResponse(
             risk_class=result["prediction"],
             risk_level=risk_level,
             probability=result["probability"],
             contributors=result.get("contributors", []),
             gfr_stage=gfr_stage,
-            model_threshold=model.threshold
+            model_threshold=result["threshold"],
+            egfr=gfr,
+            acr_stage=acr_stage,
+            kfre_2yr=None if np.isnan(kfre_2yr) else float(kfre_2yr),
+            kfre_5yr=None if np.isnan(kfre_5yr) else float(kfre_5yr),
+            imputed_fields=imputed
         )
         
+        if data.patient_id:
+            patient_store.record_prediction(
+                data.patient_id, response.model_dump(), input_data,
+                created_at=measured_epoch(data.measured_at)
+            )
+        
+        return response
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -306,13 +574,133 @@ def predict_risk(data: PatientData):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/predict/batch", response_model=List[BatchPredictionItem], tags=["Prediction"])
+async def predict_batch(request: Request):
+    """
+    Predice el riesgo de ERC para una lista de pacientes (JSON array de PatientData).
+    
+    El cuerpo se valida con un TypeAdapter precompilado directamente desde los
+    bytes, y el lote se puntúa con una sola llamada al scaler y al booster.
+    No incluye contribuyentes SHAP.
+    """
+    if not model_ready.is_set():
+        raise HTTPException(status_code=503, detail="Modelo no cargado", headers={"Retry-After": "30"})
+    
+    try:
+        patients = PATIENT_BATCH_ADAPTER.validate_json(await request.body())
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    
+    if not patients:
+        return []
+    
+    def score():
+        raw = pd.DataFrame(PATIENT_BATCH_ADAPTER.dump_python(patients, exclude={'__all__': NON_FEATURE_FIELDS}))
+        records, imputed = impute(raw)
+        result = model.predict_batch(records, imputed=imputed)
+        scores = clinical_scores.attach_scores(records)
+        return records, result, scores, imputed_fields(imputed)
+    
+    try:
+        with profiling.span("model.predict_batch"):
+            records, result, scores, imputed = await asyncio.get_running_loop().run_in_executor(
+                execution.inference_pool(), score
+            )
+    except Exception as e:
+        logger.error(f"Error en predicción por lotes: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    kfre_2yr = scores['kfre_2yr'].to_numpy()
+    items = [
+        {
+            "risk_class": int(result["prediction"][i]),
+            "probability": float(result["probability"][i]),
+            "gfr_stage": scores['gfr_stage'].iat[i],
+            "egfr": float(scores['GFR'].iat[i]),
+            "acr_stage": scores['acr_stage'].iat[i],
+            "kfre_2yr": None if np.isnan(kfre_2yr[i]) else float(kfre_2yr[i]),
+            "imputed_fields": imputed[i],
+        }
+        for i in range(len(patients))
+    ]
+    
+    for i, patient in enumerate(patients):
+        if patient.patient_id:
+            patient_store.record_prediction(
+                patient.patient_id, items[i], records.iloc[i].to_dict(), source="batch",
+                created_at=measured_epoch(patient.measured_at)
+            )
+    
+    return items
+
+
+@app.post("/predict/arrow", tags=["Prediction"])
+async def predict_arrow(request: Request):
+    """
+    Predicción por lotes columnar para integraciones (p.ej. la HCE).
+    
+    El cuerpo es un Arrow IPC (stream o file) o un Parquet con columnas de
+    PatientData (y opcionalmente patient_id). Devuelve un Arrow IPC stream con
+    probability, risk_class, egfr, gfr_stage y n_imputed por fila, en el mismo
+    orden. No incluye contribuyentes SHAP ni se guarda en el historial.
+    """
+    if not model_ready.is_set():
+        raise HTTPException(status_code=503, detail="Modelo no cargado", headers={"Retry-After": "30"})
+    
+    body = await request.body()
+    
+    def score():
+        df = arrow_io.read_table(body)
+        table, n_rows = arrow_io.score_table(model, df)
+        return arrow_io.write_stream(table), n_rows
+    
+    try:
+        with profiling.span("model.predict_batch"):
+            content, n_rows = await asyncio.get_running_loop().run_in_executor(execution.inference_pool(), score)
+    except arrow_io.ArrowInputError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error en predicción Arrow: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return Response(
+        content=content,
+        media_type=arrow_io.ARROW_STREAM_MEDIA_TYPE,
+        headers={"X-Rows": str(n_rows)}
+    )
+
+
+# Cada cuánto se comprueba si el cliente de /analyze_pdf sigue conectado
+DISCONNECT_POLL_SECONDS = 1.0
+
+
+async def _cancel_on_disconnect(request: Request, coro) -> Any:
+    """
+    Espera a `coro` y la cancela si el cliente cierra la conexión antes:
+    no se siguen gastando llamadas a Gemini para una respuesta que nadie leerá.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info("Cliente desconectado: extracción cancelada")
+                raise HTTPException(status_code=499, detail="Cliente desconectado")
+    finally:
+        task.cancel()
+
+
 @app.post("/analyze_pdf", response_model=PDFAnalysisResponse, tags=["PDF"])
-async def analyze_pdf(file: UploadFile = File(...)):
+async def analyze_pdf(request: Request, file: UploadFile = File(...), patient_id: Optional[str] = None):
     """
     Analiza un PDF de historia clínica usando IA (Gemini).
     
-    Extrae automáticamente los datos del paciente para el formulario.
+    Extrae automáticamente los datos del paciente para el formulario. Con
+    `patient_id`, la extracción se guarda en el historial del paciente.
     """
+    require_full_profile("La extracción de PDF")
     temp_file = f"temp_{file.filename}"
     
     try:
@@ -325,24 +713,37 @@ async def analyze_pdf(file: UploadFile = File(...)):
         
         # Guardar archivo temporal
         with open(temp_file, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+            await run_in_threadpool(shutil.copyfileobj, file.file, buffer)
         
         logger.info(f"Analizando PDF: {file.filename}")
         
-        # Extraer datos con IA
-        extractor = MedicalRecordExtractor()
-        extracted_data = extractor.extract_patient_data(temp_file)
+        # Extraer datos con IA (asíncrono: no bloquea /predict ni ocupa un hilo)
+        with profiling.span("extractor.extract_patient_data"):
+            extracted_data = await _cancel_on_disconnect(
+                request, extractor.extract_patient_data_async(temp_file)
+            )
         
         logger.info(f"Datos extraídos exitosamente")
         
+        imputed = extracted_data.pop('imputed_fields', [])
+        if patient_id:
+            patient_store.record_extraction(patient_id, extracted_data, file.filename, imputed)
+        
         return PDFAnalysisResponse(
             status="success",
             message="Datos extraídos correctamente del PDF",
-            extracted_data=extracted_data
+            extracted_data=extracted_data,
+            imputed_fields=imputed
         )
         
     except HTTPException:
         raise
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(int(e.retry_after) + 1)}
+        )
     except Exception as e:
         logger.error(f"Error analizando PDF: {e}")
         traceback.print_exc()
@@ -354,6 +755,208 @@ async def analyze_pdf(file: UploadFile = File(...)):
             os.remove(temp_file)
 
 
+# Comentario SSE enviado mientras Gemini no produce eventos, para que el
+# proxy no considere la conexión inactiva
+SSE_KEEPALIVE_SECONDS = float(os.getenv("NEPHROMIND_SSE_KEEPALIVE", "15"))
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    # orjson escribe NaN/Infinity como null: JSON.parse del navegador no acepta NaN
+    payload = orjson.dumps(data, default=str, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@app.post("/analyze_pdf/stream", tags=["PDF"])
+async def analyze_pdf_stream(file: UploadFile = File(...), patient_id: Optional[str] = None):
+    """
+    Variante de /analyze_pdf con Server-Sent Events.
+    
+    Eventos:
+    - progress: etapa (upload, extraction, fallback, retry_wait), intento y estrategia
+    - field: campo en cuanto Gemini lo escribe (provisional; un reintento puede cambiarlo)
+    - result: datos definitivos con gaps rellenados e imputed_fields
+    - error: detalle del fallo (con retry_after si Gemini está saturado)
+    """
+    require_full_profile("La extracción de PDF")
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Solo se aceptan archivos PDF")
+    
+    temp_file = f"temp_{file.filename}"
+    with open(temp_file, "wb") as buffer:
+        await run_in_threadpool(shutil.copyfileobj, file.file, buffer)
+    logger.info(f"Analizando PDF (streaming): {file.filename}")
+    
+    events: asyncio.Queue = asyncio.Queue()
+    
+    def on_event(event: str, data: Dict[str, Any]) -> None:
+        events.put_nowait((event, data))
+    
+    async def extract() -> Dict[str, Any]:
+        try:
+            with profiling.span("extractor.extract_patient_data"):
+                return await extractor.extract_patient_data_async(temp_file, on_event)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+    
+    async def stream():
+        task = asyncio.create_task(extract())
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(events.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is None:
+                    break
+                yield _sse(*item)
+        finally:
+            # Si el cliente se desconecta, Starlette cierra el generador:
+            # se cancelan las llamadas a Gemini y se limpia el temporal
+            task.cancel()
+        
+        try:
+            extracted_data = task.result()
+        except RateLimitExceeded as e:
+            yield _sse("error", {"detail": str(e), "retry_after": int(e.retry_after) + 1})
+            return
+        except Exception as e:
+            logger.error(f"Error analizando PDF: {e}")
+            yield _sse("error", {"detail": str(e)})
+            return
+        
+        imputed = extracted_data.pop('imputed_fields', [])
+        if patient_id:
+            patient_store.record_extraction(patient_id, extracted_data, file.filename, imputed)
+        yield _sse("result", {"extracted_data": extracted_data, "imputed_fields": imputed})
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def require_admin_token(token: Optional[str]) -> None:
+    """Exige la cabecera X-Admin-Token igual a NEPHROMIND_ADMIN_TOKEN."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=403,
+            detail="Endpoint deshabilitado: configura NEPHROMIND_ADMIN_TOKEN"
+        )
+    if token is None or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Token de administración inválido")
+
+
+@app.post("/retrain", tags=["Training"])
+async def retrain(incremental: bool = True, x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Re-entrena el modelo en el proceso de entrenamiento (incremental por
+    defecto) y lo recarga al terminar. El modelo actual sigue sirviendo.
+    
+    Requiere la cabecera X-Admin-Token con el valor de NEPHROMIND_ADMIN_TOKEN;
+    sin esa variable configurada el endpoint responde 403.
+    """
+    require_admin_token(x_admin_token)
+    require_full_profile("El entrenamiento")
+    global training_task
+    if training_task is not None and not training_task.done():
+        raise HTTPException(status_code=409, detail="Ya hay un entrenamiento en curso")
+    
+    data_path = next((path for path in DATA_PATHS if os.path.exists(path)), None)
+    if data_path is None:
+        raise HTTPException(status_code=404, detail="Dataset no encontrado")
+    
+    training_task = asyncio.create_task(train_and_reload(data_path, incremental))
+    return {"status": "training", "incremental": incremental, "data_path": data_path}
+
+
+@app.post("/ingest/fhir", tags=["Prediction"])
+async def ingest_fhir(files: List[UploadFile] = File(...), batch_size: int = 1000):
+    """
+    Ingesta FHIR Bulk Data (NDJSON de Patient, Observation y MedicationStatement).
+    
+    Pivota los últimos valores por paciente en una sola pasada, los puntúa por
+    lotes en el pool de inferencia y devuelve un resultado NDJSON por paciente.
+    """
+    if not model_ready.is_set():
+        raise HTTPException(status_code=503, detail="Modelo no cargado", headers={"Retry-After": "30"})
+    
+    df = await run_in_threadpool(fhir_ingest.pivot_streams, [upload.file for upload in files])
+    serving_model = model
+    
+    async def stream():
+        loop = asyncio.get_running_loop()
+        for batch in fhir_ingest.iter_batches(df, batch_size):
+            results = await loop.run_in_executor(
+                execution.inference_pool(), fhir_ingest.score_batch, serving_model, batch
+            )
+            for result in results:
+                if "error" not in result:
+                    patient_store.record_prediction(
+                        result['patient_id'], result, source="fhir",
+                        created_at=fhir_ingest.observation_time(result['measured_at'])
+                    )
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/profiles", tags=["Profiling"])
+def list_profiles():
+    """Índice de perfiles guardados (ver profiling.py), del más reciente al más antiguo."""
+    return {
+        "header_enabled": profiling.HEADER_ENABLED,
+        "sample_rate": profiling.SAMPLE_RATE,
+        "profiles": profiling.list_profiles(),
+    }
+
+
+@app.get("/profiles/{profile_id}", tags=["Profiling"])
+def get_profile(profile_id: str, format: str = "json"):
+    """
+    Un perfil: metadatos y tramos (`format=json`) o pilas en formato
+    collapsed (`format=folded`, para flamegraph.pl o speedscope).
+    """
+    if format not in ("json", "folded"):
+        raise HTTPException(status_code=400, detail="format debe ser 'json' o 'folded'")
+    path = profiling.profile_path(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    media_type = "application/json" if format == "json" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path))
+
+
+@app.get("/patients/{patient_id}/trajectory", tags=["Patients"])
+def patient_trajectory(patient_id: str, limit: int = 100):
+    """
+    Trayectoria de riesgo del paciente: sus predicciones guardadas en orden
+    cronológico (las `limit` más recientes).
+    
+    Las escrituras se vuelcan por lotes, así que una predicción puede tardar
+    unos cientos de milisegundos en aparecer.
+    """
+    summary = patient_store.patient_summary(patient_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Paciente sin historial")
+    return {**summary, "trajectory": patient_store.trajectory(patient_id, limit)}
+
+
+@app.get("/patients/{patient_id}/egfr_slope", tags=["Patients"])
+def patient_egfr_slope(patient_id: str):
+    """
+    Pendiente de eGFR (ml/min/1.73m² por año) a partir del historial.
+    
+    `rapid_decline` indica un descenso de más de 5 ml/min/1.73m² por año (KDIGO).
+    """
+    if patient_store.patient_summary(patient_id) is None:
+        raise HTTPException(status_code=404, detail="Paciente sin historial")
+    return patient_store.egfr_slope(patient_id)
+
+
 # ============================================
 # MAIN
 # ============================================
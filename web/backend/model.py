@@ -5,21 +5,33 @@ Incluye explicabilidad con SHAP.
 """
 
 import os
+import json
 import logging
+import threading
 import joblib
 import numpy as np
 import pandas as pd
-from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
 
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
-from sklearn.feature_selection import RFE
-from sklearn.metrics import (
-    accuracy_score, classification_report, 
-    confusion_matrix, roc_auc_score
-)
-from xgboost import XGBClassifier
-import shap
+
+from monitoring import build_reference_profile
+from imputation import FIELD_ALIASES, impute, impute_record
+from runtime import file_sha1, load_runtime
+from cascade import evaluate_cascade, fit_cascade, screen, serving_cascade
+from footprint import LEAN_SERVING
+
+# xgboost es opcional en serving si se usa un runtime exportado (ONNX/Treelite,
+# ver runtime.py); el entrenamiento lo necesita. shap (con numba/llvmlite) se
+# importa al construir el explainer, y no se carga con NEPHROMIND_EXPLAIN=0
+# (por defecto en el perfil lean, ver footprint.py)
+try:
+    from xgboost import XGBClassifier
+except ImportError:
+    XGBClassifier = None
+
+EXPLAIN_ENABLED = os.getenv("NEPHROMIND_EXPLAIN", "0" if LEAN_SERVING else "1") == "1"
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
@@ -48,37 +60,63 @@ class KidneyDiseaseModel:
     ]
     
     # Mapeo de nombres de columnas del frontend al modelo
-    COLUMN_RENAME_MAP = {
-        'BUN': 'BUNLevels',
-        'Fatigue': 'FatigueLevels'
-    }
+    COLUMN_RENAME_MAP = FIELD_ALIASES
+    
+    # Hiperparámetros de XGBClassifier que se guardan con el modelo: un
+    # XGBClassifier cargado desde JSON no los recupera (ver evaluation.py)
+    TRAIN_PARAM_KEYS = (
+        'learning_rate', 'max_depth', 'min_child_weight', 'subsample',
+        'colsample_bytree', 'reg_lambda', 'reg_alpha', 'gamma', 'scale_pos_weight'
+    )
+    # Receta de train(); también la de los modelos guardados sin train_params
+    DEFAULT_TRAIN_PARAMS = {'learning_rate': 0.1, 'max_depth': 5}
+    
+    # Caché de contribuciones SHAP para perfiles repetidos
+    EXPLANATION_CACHE_SIZE = 4096
+    EXPLANATION_QUANTUM = 1e-4  # Resolución (en desviaciones estándar) de la clave
     
     def __init__(self):
         """Inicializa el modelo."""
-        self.model: Optional[XGBClassifier] = None
+        self.model: Optional["XGBClassifier"] = None
         self.scaler: Optional[StandardScaler] = None
         self.columns: Optional[List[str]] = None  # Columnas seleccionadas por RFE
         self.all_columns: Optional[List[str]] = None  # Todas las columnas del scaler
-        self.explainer: Optional[shap.TreeExplainer] = None
+        self.explainer: Optional[Any] = None  # shap.TreeExplainer (import perezoso)
+        self.expected_value: Optional[float] = None  # Valor base SHAP (clase ERC)
+        self._explanation_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._explanation_lock = threading.Lock()
         self.threshold: float = 0.5
+        self.train_params: Optional[Dict[str, Any]] = None  # Hiperparámetros del último entrenamiento
+        self.data_path: Optional[str] = None  # Dataset del último entrenamiento
+        self.rows_seen: int = 0  # Filas del dataset ya consumidas
+        self.reference_profile: Optional[Dict[str, Any]] = None  # Perfil para drift (monitoring.py)
+        self.runtime = None  # Runtime ONNX/Treelite; None = XGBoost (ver runtime.py)
+        self.cascade: Optional[Dict[str, Any]] = None  # Screener + banda calibrada (ver cascade.py)
+        self.active_cascade: Optional[Dict[str, Any]] = None  # Cascada en uso al servir
         
         # Rutas de archivos
         current_dir = os.path.dirname(os.path.abspath(__file__))
         self.model_path_json = os.path.join(current_dir, "mi_modelo.json")  # XGBoost nativo
+        self.model_path_compact = os.path.join(current_dir, "mi_modelo_compact.json")  # Serving reducido
         self.metadata_path = os.path.join(current_dir, "model_metadata.pkl")  # Solo metadata
+        self.metrics_path = os.path.join(current_dir, "latest_metrics.json")  # Métricas del modelo guardado
+        self.loaded_model_path: Optional[str] = None  # Booster cargado (completo o compacto)
     
     def load_data(self, filepath: str) -> pd.DataFrame:
         """
         Carga y preprocesa el dataset.
         
         Args:
-            filepath: Ruta al archivo CSV
+            filepath: Ruta al archivo CSV (o Parquet, p.ej. de synthetic.py)
             
         Returns:
             DataFrame preprocesado
         """
         logger.info(f"Cargando datos desde: {filepath}")
-        df = pd.read_csv(filepath)
+        if filepath.endswith('.parquet'):
+            df = pd.read_parquet(filepath)
+        else:
+            df = pd.read_csv(filepath)
         
         # Eliminar columnas irrelevantes
         cols_to_drop = [col for col in self.COLUMNS_TO_DROP if col in df.columns]
@@ -94,12 +132,17 @@ class KidneyDiseaseModel:
         Args:
             data_path: Ruta al archivo CSV de entrenamiento
         """
+        from sklearn.model_selection import train_test_split
+        from sklearn.feature_selection import RFE
+        
         logger.info("=" * 50)
         logger.info("INICIANDO ENTRENAMIENTO DEL MODELO")
         logger.info("=" * 50)
         
         # Cargar datos
         df = self.load_data(data_path)
+        self.data_path = os.path.abspath(data_path)
+        self.rows_seen = len(df)
         
         X = df.drop('Diagnosis', axis=1)
         y = df['Diagnosis']
@@ -108,10 +151,14 @@ class KidneyDiseaseModel:
         logger.info(f"Features totales: {len(self.all_columns)}")
         logger.info(f"Distribución target: {y.value_counts().to_dict()}")
         
-        # Split estratificado
+        # Split estratificado; la validación (threshold y banda de la cascada)
+        # sale de train para que test solo se use en la evaluación final
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=0.2, random_state=42, stratify=y
         )
+        X_train, X_val, y_train, y_val = train_test_split(
+            X_train, y_train, test_size=0.2, random_state=42, stratify=y_train
+        )
         
         # Calcular pesos de clase
         n_pos = y_train.sum()
@@ -123,8 +170,12 @@ class KidneyDiseaseModel:
         logger.info("Escalando datos...")
         self.scaler = StandardScaler()
         X_train_scaled = self.scaler.fit_transform(X_train)
+        X_val_scaled = self.scaler.transform(X_val)
         X_test_scaled = self.scaler.transform(X_test)
         
+        # Perfil de referencia para el monitor de drift
+        self.reference_profile = build_reference_profile(X_train)
+        
         # Selección de features con RFE
         logger.info("Seleccionando features con RFE...")
         selector_model = XGBClassifier(
@@ -146,29 +197,32 @@ class KidneyDiseaseModel:
         
         # Transformar a features seleccionadas
         X_train_selected = rfe.transform(X_train_scaled)
+        X_val_selected = rfe.transform(X_val_scaled)
         X_test_selected = rfe.transform(X_test_scaled)
         
         # Entrenar modelo final
         logger.info("Entrenando XGBoost...")
         self.model = XGBClassifier(
             n_estimators=200,
-            learning_rate=0.1,
             scale_pos_weight=scale_pos_weight,
-            max_depth=5,
             random_state=42,
             n_jobs=-1,
-            eval_metric='logloss'
+            eval_metric='logloss',
+            **self.DEFAULT_TRAIN_PARAMS
         )
         self.model.fit(X_train_selected, y_train)
+        self._record_train_params()
         
         # Optimizar threshold para alta sensibilidad
-        self._optimize_threshold(X_test_selected, y_test)
+        self._optimize_threshold(X_val_selected, y_val)
+        
+        # Cascada: screener destilado en train, banda calibrada en validación
+        self.cascade = fit_cascade(self.model, X_train_selected, X_val_selected, y_val, self.threshold)
         
         # Inicializar SHAP
-        logger.info("Inicializando SHAP Explainer...")
-        self.explainer = shap.TreeExplainer(self.model)
+        self._init_explainer()
         
-        # Evaluar modelo
+        # Evaluar modelo (y la cascada) en test
         self._evaluate_model(X_test_selected, y_test)
         
         # Guardar modelo
@@ -177,8 +231,188 @@ class KidneyDiseaseModel:
         logger.info("=" * 50)
         logger.info("ENTRENAMIENTO COMPLETADO")
         logger.info("=" * 50)
-    
-    def _optimize_threshold(self, X_test: np.ndarray, y_test: pd.Series) -> None:
+
+    def train_incremental(
+        self,
+        data_path: str,
+        n_new_estimators: int = 50,
+        holdout_fraction: float = 0.2
+    ) -> None:
+        """
+        Continúa el entrenamiento del modelo guardado con casos nuevos.
+
+        Reutiliza las columnas seleccionadas por RFE, actualiza media/varianza
+        del scaler con `partial_fit` y añade `n_new_estimators` árboles al
+        booster existente. El threshold se re-optimiza solo sobre la ventana
+        más reciente de casos (held-out), que no se usa para entrenar.
+
+        Si `data_path` es el mismo dataset del último entrenamiento, solo se
+        consumen las filas añadidas desde entonces.
+
+        Args:
+            data_path: Ruta al CSV con casos etiquetados nuevos
+            n_new_estimators: Árboles a añadir al booster
+            holdout_fraction: Fracción final de casos nuevos para el threshold
+        """
+        logger.info("=" * 50)
+        logger.info("INICIANDO ENTRENAMIENTO INCREMENTAL")
+        logger.info("=" * 50)
+
+        if self.model is None and not self.load_model():
+            raise Exception("No hay modelo guardado. Ejecuta primero un entrenamiento completo.")
+
+        df = self.load_data(data_path)
+        data_path = os.path.abspath(data_path)
+        total_rows = len(df)
+
+        # Consumir solo las filas nuevas si es el mismo dataset
+        if data_path == self.data_path:
+            df = df.iloc[self.rows_seen:]
+        logger.info(f"Casos nuevos: {len(df)}")
+
+        missing = [col for col in self.all_columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"Faltan columnas en los casos nuevos: {missing}")
+
+        n_holdout = int(len(df) * holdout_fraction)
+        if len(df) - n_holdout < 10:
+            logger.warning("Muy pocos casos nuevos para entrenamiento incremental")
+            return
+
+        X = df[self.all_columns]
+        y = df['Diagnosis'].astype(int)
+
+        # Ventana held-out: los casos más recientes
+        X_new, y_new = X.iloc[:len(df) - n_holdout], y.iloc[:len(df) - n_holdout]
+        X_window, y_window = X.iloc[len(df) - n_holdout:], y.iloc[len(df) - n_holdout:]
+
+        # Actualizar estadísticas del scaler (media/varianza acumuladas)
+        old_mean = self.scaler.mean_.copy()
+        old_scale = self.scaler.scale_.copy()
+        self._update_scaler(X_new)
+        self._rescale_booster_thresholds(old_mean, old_scale)
+
+        selected_idx = [self.all_columns.index(col) for col in self.columns]
+        X_new_selected = self.scaler.transform(X_new)[:, selected_idx]
+
+        n_pos = y_new.sum()
+        n_neg = len(y_new) - n_pos
+        scale_pos_weight = n_neg / n_pos if n_pos > 0 else 1.0
+
+        # Continuar boosting desde el booster existente, con su misma receta
+        # (p. ej. la de un modelo afinado y promocionado); solo cambian el
+        # número de árboles y el peso de clase de los casos nuevos
+        logger.info(f"Añadiendo {n_new_estimators} árboles al booster...")
+        booster = self.model.get_booster()
+        params = {**self.DEFAULT_TRAIN_PARAMS, **(self.train_params or {})}
+        params['scale_pos_weight'] = scale_pos_weight
+        self.model = XGBClassifier(
+            n_estimators=n_new_estimators,
+            random_state=42,
+            n_jobs=-1,
+            eval_metric='logloss',
+            **params
+        )
+        self.model.fit(X_new_selected, y_new, xgb_model=booster)
+        self._record_train_params()
+
+        # Re-optimizar threshold solo en la ventana held-out
+        if n_holdout > 0 and y_window.nunique() == 2:
+            X_window_selected = self.scaler.transform(X_window)[:, selected_idx]
+            self._optimize_threshold(X_window_selected, y_window)
+            self.cascade = fit_cascade(self.model, X_new_selected, X_window_selected, y_window, self.threshold)
+            self._evaluate_model(X_window_selected, y_window)
+        else:
+            logger.warning("Ventana held-out sin ambas clases. Se mantiene el threshold actual.")
+            # El scaler ha cambiado: el screener ya no es válido y no hay con qué recalibrarlo
+            self.cascade = None
+
+        self._init_explainer()
+
+        self.data_path = data_path
+        self.rows_seen = total_rows
+        self.save_model()
+
+        logger.info("=" * 50)
+        logger.info("ENTRENAMIENTO INCREMENTAL COMPLETADO")
+        logger.info("=" * 50)
+
+    def _record_train_params(self) -> None:
+        """Guarda los hiperparámetros del booster recién entrenado (se persisten en la metadata)."""
+        params = self.model.get_params()
+        self.train_params = {
+            key: params[key] for key in self.TRAIN_PARAM_KEYS if params.get(key) is not None
+        }
+
+    def _update_scaler(self, X_new: pd.DataFrame) -> None:
+        """
+        Acumula los casos nuevos en media/varianza del scaler (`partial_fit`).
+
+        StandardScaler ignora los NaN, pero una columna sin ningún valor en el
+        bloque nuevo queda con escala NaN. Esas columnas conservan sus
+        estadísticas previas, y las que no tenían observaciones previas toman
+        las del bloque.
+        """
+        scaler = self.scaler
+        counts = X_new.notna().to_numpy().sum(axis=0)
+        old_seen = np.broadcast_to(scaler.n_samples_seen_, counts.shape).astype(np.int64)
+        old_stats = {attr: getattr(scaler, attr).copy() for attr in ('mean_', 'var_', 'scale_')}
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scaler.partial_fit(X_new)
+        seen = np.broadcast_to(scaler.n_samples_seen_, counts.shape).astype(np.int64)
+
+        unobserved = counts == 0
+        for attr, values in old_stats.items():
+            getattr(scaler, attr)[unobserved] = values[unobserved]
+        seen[unobserved] = old_seen[unobserved]
+
+        first = (old_seen == 0) & ~unobserved
+        if first.any():
+            values = X_new.to_numpy(dtype=np.float64)[:, first]
+            var = np.nanvar(values, axis=0)
+            scaler.mean_[first] = np.nanmean(values, axis=0)
+            scaler.var_[first] = var
+            scaler.scale_[first] = np.where(var > 0, np.sqrt(var), 1.0)
+            seen[first] = counts[first]
+        scaler.n_samples_seen_ = seen
+
+        if unobserved.any():
+            logger.info(f"Scaler: {int(unobserved.sum())} columnas sin valores en los casos nuevos conservan sus estadísticas")
+
+    def _rescale_booster_thresholds(self, old_mean: np.ndarray, old_scale: np.ndarray) -> None:
+        """
+        Ajusta los umbrales de split del booster tras actualizar el scaler.
+
+        Los árboles existentes se entrenaron sobre (x - old_mean) / old_scale.
+        Como el escalado es afín y creciente, basta con trasladar cada umbral
+        a la nueva escala para que las predicciones previas no cambien.
+        """
+        booster = self.model.get_booster()
+        config = json.loads(booster.save_raw(raw_format='json'))
+
+        selected_idx = [self.all_columns.index(col) for col in self.columns]
+        new_mean = self.scaler.mean_[selected_idx]
+        new_scale = self.scaler.scale_[selected_idx]
+        old_mean = old_mean[selected_idx]
+        old_scale = old_scale[selected_idx]
+
+        for tree in config['learner']['gradient_booster']['model']['trees']:
+            conditions = tree['split_conditions']
+            for node, (left, feature) in enumerate(zip(tree['left_children'], tree['split_indices'])):
+                if left == -1:  # Hoja: split_conditions guarda el valor de la hoja
+                    continue
+                raw_value = conditions[node] * old_scale[feature] + old_mean[feature]
+                conditions[node] = float((raw_value - new_mean[feature]) / new_scale[feature])
+
+        booster.load_model(bytearray(json.dumps(config).encode()))
+
+    def _optimize_threshold(
+        self,
+        X_test: np.ndarray,
+        y_test: pd.Series,
+        target_sensitivity: float = 0.98
+    ) -> None:
         """
         Optimiza el threshold para maximizar sensibilidad (>98%).
         
@@ -187,14 +421,29 @@ class KidneyDiseaseModel:
         logger.info("Optimizando threshold para alta sensibilidad...")
         
         y_proba = self.model.predict_proba(X_test)[:, 1]
+        self.threshold = self.find_threshold(y_test, y_proba, target_sensitivity)
+        logger.info(f"Threshold óptimo: {self.threshold:.2f}")
+    
+    @staticmethod
+    def find_threshold(
+        y_true: np.ndarray,
+        y_proba: np.ndarray,
+        target_sensitivity: float = 0.98
+    ) -> float:
+        """
+        Busca el threshold con mayor especificidad que logra la sensibilidad objetivo.
+        
+        Si ningún threshold la alcanza, devuelve el de máxima sensibilidad.
+        """
+        from sklearn.metrics import confusion_matrix
+        
         best_threshold = 0.5
         best_specificity = 0
-        target_sensitivity = 0.98
         
-        # Buscar threshold que logre ≥98% sensibilidad
+        # Buscar threshold que logre la sensibilidad objetivo
         for thresh in np.arange(0.05, 0.90, 0.01):
             y_pred = (y_proba >= thresh).astype(int)
-            tn, fp, fn, tp = confusion_matrix(y_test, y_pred).ravel()
+            tn, fp, fn, tp = confusion_matrix(y_true, y_pred, labels=[0, 1]).ravel()
             
             sensitivity = tp / (tp + fn) if (tp + fn) > 0 else 0
             specificity = tn / (tn + fp) if (tn + fp) > 0 else 0
@@ -204,24 +453,25 @@ class KidneyDiseaseModel:
                     best_specificity = specificity
                     best_threshold = thresh
         
-        # Si no se logra 98%, usar el threshold con máxima sensibilidad
+        # Si no se logra el objetivo, usar el threshold con máxima sensibilidad
         if best_specificity == 0:
-            logger.warning("No se logró 98% sensibilidad. Buscando máxima sensibilidad...")
+            logger.warning(f"No se logró {target_sensitivity:.0%} sensibilidad. Buscando máxima sensibilidad...")
             max_sensitivity = 0
             for thresh in np.arange(0.05, 0.90, 0.01):
                 y_pred = (y_proba >= thresh).astype(int)
-                tn, fp, fn, tp = confusion_matrix(y_test, y_pred).ravel()
+                tn, fp, fn, tp = confusion_matrix(y_true, y_pred, labels=[0, 1]).ravel()
                 sensitivity = tp / (tp + fn) if (tp + fn) > 0 else 0
                 
                 if sensitivity > max_sensitivity:
                     max_sensitivity = sensitivity
                     best_threshold = thresh
         
-        self.threshold = best_threshold
-        logger.info(f"Threshold óptimo: {self.threshold:.2f}")
+        return float(best_threshold)
     
     def _evaluate_model(self, X_test: np.ndarray, y_test: pd.Series) -> None:
-        """Evalúa el modelo y guarda métricas."""
+        """Evalúa el modelo y guarda métricas en `metrics_path` (latest_metrics.json)."""
+        from sklearn.metrics import accuracy_score, classification_report, confusion_matrix, roc_auc_score
+        
         logger.info("\n--- EVALUACIÓN DEL MODELO ---")
         
         y_proba = self.model.predict_proba(X_test)[:, 1]
@@ -229,7 +479,8 @@ class KidneyDiseaseModel:
         
         accuracy = accuracy_score(y_test, y_pred)
         roc_auc = roc_auc_score(y_test, y_proba)
-        cm = confusion_matrix(y_test, y_pred)
+        cm = confusion_matrix(y_test, y_pred, labels=[0, 1])
+        report = classification_report(y_test, y_pred, output_dict=True, zero_division=0)
         
         tn, fp, fn, tp = cm.ravel()
         sensitivity = tp / (tp + fn) if (tp + fn) > 0 else 0
@@ -241,18 +492,30 @@ class KidneyDiseaseModel:
         logger.info(f"Especificidad: {specificity:.4f}")
         logger.info(f"Threshold: {self.threshold:.2f}")
         logger.info(f"\nMatriz de confusión:\n{cm}")
-        logger.info(f"\nReporte de clasificación:\n{classification_report(y_test, y_pred)}")
+        
+        cascade_test = None
+        if self.cascade:
+            cascade_test = evaluate_cascade(self.cascade, self.model, X_test, y_test)
+            logger.info(f"Cascada en test: sensibilidad {cascade_test['sensitivity']:.4f}, "
+                        f"{cascade_test['early_exit_fraction']:.1%} resueltos por el screener")
         
         # Guardar métricas
-        metrics_path = os.path.join(os.path.dirname(self.model_path_json), "latest_metrics.txt")
-        with open(metrics_path, "w") as f:
-            f.write(f"Accuracy: {accuracy:.4f}\n")
-            f.write(f"ROC AUC: {roc_auc:.4f}\n")
-            f.write(f"Sensibilidad: {sensitivity:.4f}\n")
-            f.write(f"Especificidad: {specificity:.4f}\n")
-            f.write(f"Threshold: {self.threshold:.2f}\n")
-            f.write(f"\nClassification Report:\n{classification_report(y_test, y_pred)}")
-            f.write(f"\nConfusion Matrix:\n{cm}")
+        metrics = {
+            'accuracy': float(accuracy),
+            'roc_auc': float(roc_auc),
+            'sensitivity': float(sensitivity),
+            'specificity': float(specificity),
+            'threshold': float(self.threshold),
+            'n_samples': int(len(y_test)),
+            'confusion_matrix': cm.tolist(),
+            'classification_report': report,
+            'cascade': {
+                'validation': self.cascade['validation'],
+                'test': cascade_test,
+            } if self.cascade else None
+        }
+        with open(self.metrics_path, "w") as f:
+            json.dump(metrics, f, indent=2)
     
     def save_model(self) -> None:
         """Guarda el modelo usando XGBoost nativo JSON y metadata con joblib."""
@@ -265,15 +528,28 @@ class KidneyDiseaseModel:
             'scaler': self.scaler,
             'columns': self.columns,
             'all_columns': self.all_columns,
-            'threshold': self.threshold
+            'threshold': self.threshold,
+            'train_params': self.train_params,
+            'data_path': self.data_path,
+            'rows_seen': self.rows_seen,
+            'reference_profile': self.reference_profile,
+            'cascade': self.cascade
         }
         joblib.dump(metadata, self.metadata_path)
         logger.info(f"Metadata guardada en: {self.metadata_path}")
     
-    def load_model(self) -> bool:
+    def load_model(self, compact: bool = False, runtime: Optional[str] = None) -> bool:
         """
         Carga el modelo desde disco usando XGBoost nativo JSON.
         
+        Args:
+            compact: Si True y existe, carga el modelo compacto de serving
+                (ver compaction.py) con su propio threshold. Solo se usa si
+                se derivó del modelo completo actual
+            runtime: 'auto', 'onnx', 'treelite' o 'xgboost' (por defecto
+                NEPHROMIND_RUNTIME o 'auto'). Los runtimes exportados solo se
+                usan si corresponden al booster cargado
+        
         Returns:
             True si se cargó exitosamente, False si no existe
         """
@@ -286,24 +562,57 @@ class KidneyDiseaseModel:
             return False
         
         try:
+            metadata = joblib.load(self.metadata_path)
+            
             # Cargar modelo XGBoost usando método nativo
-            self.model = XGBClassifier()
-            self.model.load_model(self.model_path_json)
-            logger.info(f"Modelo XGBoost cargado desde: {self.model_path_json}")
+            model_path = self.model_path_json
+            if compact:
+                if not os.path.exists(self.model_path_compact):
+                    logger.warning(f"No se encontró modelo compacto en: {self.model_path_compact}")
+                elif self._compact_matches(metadata['columns']):
+                    model_path = self.model_path_compact
+            
+            if XGBClassifier is not None:
+                self.model = XGBClassifier()
+                self.model.load_model(model_path)
+                logger.info(f"Modelo XGBoost cargado desde: {model_path}")
+            else:
+                self.model = None
+            
+            # Runtime de inferencia (ONNX/Treelite si hay artefactos exportados)
+            runtime = runtime or os.getenv("NEPHROMIND_RUNTIME", "auto")
+            if self.model is None and runtime == 'xgboost':
+                runtime = 'auto'
+            self.runtime, manifest = load_runtime(
+                runtime, os.path.dirname(model_path), file_sha1(model_path)
+            )
+            if self.model is None and self.runtime is None:
+                logger.error("xgboost no está instalado y no hay runtime exportado para este modelo")
+                return False
             
             # Cargar metadata
-            metadata = joblib.load(self.metadata_path)
+            self.loaded_model_path = model_path
             self.scaler = metadata['scaler']
             self.columns = metadata['columns']
             self.all_columns = metadata.get('all_columns', self.columns)
             self.threshold = metadata.get('threshold', 0.5)
             
+            # El modelo compacto guarda su threshold calibrado en el booster
+            if self.model is not None:
+                compact_threshold = self.model.get_booster().attr('nephromind_threshold')
+                if model_path == self.model_path_compact and compact_threshold is not None:
+                    self.threshold = float(compact_threshold)
+            elif self.runtime is not None:
+                self.threshold = manifest['threshold']
+            self.train_params = metadata.get('train_params')
+            self.data_path = metadata.get('data_path')
+            self.rows_seen = metadata.get('rows_seen', 0)
+            self.reference_profile = metadata.get('reference_profile')
+            self.cascade = metadata.get('cascade')
+            self.active_cascade = serving_cascade(self.cascade, self.threshold)
+            
             # Inicializar SHAP
-            try:
-                self.explainer = shap.TreeExplainer(self.model)
-            except Exception as e:
-                logger.warning(f"No se pudo inicializar SHAP: {e}")
-                self.explainer = None
+            self._init_explainer()
             
             logger.info(f"Modelo cargado. Threshold: {self.threshold}")
             return True
@@ -314,25 +623,156 @@ class KidneyDiseaseModel:
             traceback.print_exc()
             return False
     
-    def predict(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _compact_matches(self, columns: List[str]) -> bool:
+        """
+        Comprueba que el modelo compacto se derivó del modelo completo actual:
+        compaction.py guarda en los atributos del booster el sha1 del completo
+        y sus columnas. Se lee el JSON directamente (no requiere xgboost).
+        """
+        with open(self.model_path_compact) as f:
+            attributes = json.load(f)['learner'].get('attributes', {})
+        
+        if attributes.get('nephromind_source_sha1') != file_sha1(self.model_path_json):
+            logger.error("El modelo compacto no corresponde al modelo completo actual (¿reentrenado?). "
+                         "Se usa el completo; regenera con train_model.py --compact")
+            return False
+        if json.loads(attributes.get('nephromind_columns', 'null')) != columns:
+            logger.error("El modelo compacto usa otras columnas que la metadata actual. Se usa el completo")
+            return False
+        return True
+    
+    def set_inference_threads(self, n_threads: int) -> None:
+        """
+        Fija los hilos de XGBoost para serving. Con un pool de inferencia,
+        1 hilo por worker evita sobresuscribir los núcleos.
+        """
+        if self.runtime is not None:
+            self.runtime = type(self.runtime)(self.runtime.path, self.runtime.manifest, n_threads)
+        if self.model is None:
+            return
+        self.model.set_params(n_jobs=n_threads)
+        self.model.get_booster().set_param('nthread', n_threads)
+    
+    def _init_explainer(self) -> None:
+        """
+        Construye el explainer SHAP una sola vez por modelo.
+        
+        TreeExplainer precalcula al construirse las estadísticas de camino de
+        cada árbol (cobertura de nodos); aquí se guarda además el valor base y
+        se invalida la caché de contribuciones del modelo anterior.
+        """
+        logger.info("Inicializando SHAP Explainer...")
+        with self._explanation_lock:
+            self._explanation_cache.clear()
+        
+        self.explainer = None
+        self.expected_value = None
+        if not EXPLAIN_ENABLED or self.model is None:
+            logger.info("SHAP desactivado: predicciones sin contribuyentes")
+            return
+        try:
+            import shap
+        except ImportError:
+            logger.info("SHAP no disponible: predicciones sin contribuyentes")
+            return
+        
+        try:
+            self.explainer = shap.TreeExplainer(self.model)
+            expected_value = np.atleast_1d(self.explainer.expected_value)
+            self.expected_value = float(expected_value[-1])
+        except Exception as e:
+            logger.warning(f"No se pudo inicializar SHAP: {e}")
+            self.explainer = None
+            self.expected_value = None
+    
+    def _explanation_key(self, row: np.ndarray) -> bytes:
+        """Clave de caché: vector de features seleccionadas cuantizado."""
+        return np.round(row / self.EXPLANATION_QUANTUM).astype(np.int64).tobytes()
+    
+    def _class_1_shap(self, input_selected: pd.DataFrame) -> np.ndarray:
+        """Valores SHAP de la clase ERC para un lote, shape (n_filas, n_features)."""
+        shap_values = self.explainer.shap_values(input_selected)
+        
+        if isinstance(shap_values, list):
+            return np.asarray(shap_values[1])
+        elif len(shap_values.shape) == 3:
+            return shap_values[:, :, 1]
+        return shap_values
+    
+    def _cached_shap(self, input_selected: np.ndarray) -> np.ndarray:
+        """
+        Valores SHAP de un lote usando la caché de perfiles repetidos.
+        
+        Solo las filas no cacheadas se calculan, en una única llamada a SHAP.
+        """
+        keys = [self._explanation_key(row) for row in input_selected]
+        shap_matrix = np.empty(input_selected.shape, dtype=float)
+        missing = []
+        
+        with self._explanation_lock:
+            for i, key in enumerate(keys):
+                cached = self._explanation_cache.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    shap_matrix[i] = cached
+                    self._explanation_cache.move_to_end(key)
+        
+        if missing:
+            computed = self._class_1_shap(pd.DataFrame(input_selected[missing], columns=self.columns))
+            shap_matrix[missing] = computed
+            with self._explanation_lock:
+                for i, values in zip(missing, computed):
+                    self._explanation_cache[keys[i]] = values
+                while len(self._explanation_cache) > self.EXPLANATION_CACHE_SIZE:
+                    self._explanation_cache.popitem(last=False)
+        
+        return shap_matrix
+    
+    def warm_explanations(self, profiles: List[Dict[str, Any]]) -> None:
+        """
+        Precalcula contribuciones para perfiles frecuentes (p. ej. los valores
+        por defecto del formulario) en una sola llamada a SHAP.
+        
+        Args:
+            profiles: Lista de diccionarios con datos de paciente
+        """
+        if self.explainer is None or not profiles:
+            return
+        
+        input_df, _ = impute(pd.DataFrame(profiles))
+        expected_cols = list(getattr(self.scaler, 'feature_names_in_', self.all_columns or self.columns))
+        input_df = input_df.reindex(columns=expected_cols)
+        input_selected = pd.DataFrame(
+            self.scaler.transform(input_df), columns=expected_cols
+        )[self.columns]
+        
+        shap_matrix = self._class_1_shap(input_selected)
+        with self._explanation_lock:
+            for row, values in zip(input_selected.to_numpy(), shap_matrix):
+                self._explanation_cache[self._explanation_key(row)] = values
+        logger.info(f"Caché de explicaciones precalentada con {len(profiles)} perfiles")
+    
+    def predict(self, input_data: Dict[str, Any], imputed: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         Realiza una predicción de riesgo de ERC.
         
         Args:
             input_data: Diccionario con los datos del paciente
+            imputed: Campos ya imputados si `input_data` viene de
+                `impute_record` (se omite la imputación); None para imputar aquí
             
         Returns:
-            Diccionario con predicción, probabilidad y factores contribuyentes
+            Diccionario con predicción, probabilidad, threshold aplicado y
+            factores contribuyentes
         """
-        if self.model is None:
+        if self.model is None and self.runtime is None:
             return {"error": "Modelo no entrenado o cargado"}
         
         try:
-            # Crear DataFrame
-            input_df = pd.DataFrame([input_data])
-            
-            # Renombrar columnas si es necesario
-            input_df = input_df.rename(columns=self.COLUMN_RENAME_MAP)
+            # Imputar campos faltantes (renombra alias como BUN -> BUNLevels)
+            if imputed is None:
+                input_data, imputed = impute_record(input_data)
             
             # Obtener columnas esperadas por el scaler
             if hasattr(self.scaler, 'feature_names_in_'):
@@ -340,34 +780,57 @@ class KidneyDiseaseModel:
             else:
                 expected_cols = self.all_columns or self.columns
             
-            # Asegurar que tenemos todas las columnas
-            for col in expected_cols:
-                if col not in input_df.columns:
-                    input_df[col] = 0
-            
-            # Mantener solo las columnas esperadas en el orden correcto
-            input_df = input_df[expected_cols]
+            # Solo las columnas esperadas, en el orden correcto
+            input_df = pd.DataFrame(
+                [[input_data.get(col, np.nan) for col in expected_cols]],
+                columns=expected_cols, dtype=np.float64
+            )
             
             logger.debug(f"Columnas de entrada: {input_df.columns.tolist()}")
             
-            # Escalar
-            input_scaled = self.scaler.transform(input_df)
-            input_scaled_df = pd.DataFrame(input_scaled, columns=expected_cols)
+            # Cascada: el screener resuelve los casos lejos del threshold
+            if self.active_cascade is not None:
+                selected_idx = [expected_cols.index(col) for col in self.columns]
+                screener_probability, uncertain = screen(
+                    self.active_cascade, self.scaler.transform(input_df)[:, selected_idx]
+                )
+                if not uncertain[0]:
+                    probability = float(screener_probability[0])
+                    return {
+                        "prediction": int(probability >= self.threshold),
+                        "probability": probability,
+                        "threshold": self.threshold,
+                        "contributors": [],
+                        "imputed_fields": imputed
+                    }
             
-            # Seleccionar features del modelo
-            input_selected = input_scaled_df[self.columns]
+            # Predecir con el runtime exportado si hay uno (escala internamente)
+            if self.runtime is not None:
+                probability = float(self.runtime.predict_proba(input_df.to_numpy(dtype=np.float64))[0])
             
-            # Predecir
-            probability = float(self.model.predict_proba(input_selected)[0][1])
-            prediction = int(probability >= self.threshold)
+            contributors = []
+            if self.runtime is None or self.explainer is not None:
+                # Escalar
+                input_scaled = self.scaler.transform(input_df)
+                input_scaled_df = pd.DataFrame(input_scaled, columns=expected_cols)
+                
+                # Seleccionar features del modelo
+                input_selected = input_scaled_df[self.columns]
+                
+                if self.runtime is None:
+                    probability = float(self.model.predict_proba(input_selected)[0][1])
+                
+                # Calcular SHAP values
+                contributors = self._get_shap_contributors(input_selected, input_df)
             
-            # Calcular SHAP values
-            contributors = self._get_shap_contributors(input_selected, input_df)
+            prediction = int(probability >= self.threshold)
             
             return {
                 "prediction": prediction,
                 "probability": probability,
-                "contributors": contributors
+                "threshold": self.threshold,
+                "contributors": contributors,
+                "imputed_fields": imputed
             }
             
         except Exception as e:
@@ -375,7 +838,91 @@ class KidneyDiseaseModel:
             import traceback
             traceback.print_exc()
             return {"error": str(e)}
-    
+
+    def predict_batch(
+        self,
+        records: pd.DataFrame,
+        explain: bool = False,
+        imputed: Optional[pd.DataFrame] = None
+    ) -> Dict[str, Any]:
+        """
+        Predicción vectorizada para un lote de pacientes.
+
+        Aplica el mismo preprocesado que `predict` (imputación, escalado y
+        selección RFE) en una sola llamada al scaler y al booster (o al
+        runtime exportado, que incluye ambos). Con la cascada activa, el
+        booster y SHAP solo se ejecutan para las filas dentro de la banda.
+
+        Args:
+            records: DataFrame con una fila por paciente
+            explain: Si True, calcula también los top 5 contribuyentes SHAP
+            imputed: Máscara de imputación si `records` ya viene de `impute`
+                (se omite la imputación); None para imputar aquí
+
+        Returns:
+            Diccionario con arrays 'probability' y 'prediction', el
+            'threshold' aplicado, la máscara
+            'imputed' (DataFrame booleano) y, si se pide, la lista
+            'contributors' por fila
+        """
+        if self.model is None and self.runtime is None:
+            raise Exception("Modelo no entrenado o cargado")
+
+        if imputed is None:
+            records, imputed = impute(records)
+        expected_cols = list(getattr(self.scaler, 'feature_names_in_', self.all_columns or self.columns))
+        input_df = records.reindex(columns=expected_cols)
+        selected_idx = [expected_cols.index(col) for col in self.columns]
+
+        input_selected = None
+        probability = None
+        rows = np.arange(len(input_df))  # Filas que necesitan el booster
+        if self.active_cascade is not None:
+            input_selected = self.scaler.transform(input_df)[:, selected_idx]
+            probability, uncertain = screen(self.active_cascade, input_selected)
+            rows = np.flatnonzero(uncertain)
+        # Si el screener no resuelve ninguna fila se evita la copia del indexado
+        full_rows = slice(None) if len(rows) == len(input_df) else rows
+
+        if len(rows) or probability is None:
+            if self.runtime is not None:
+                full_probability = self.runtime.predict_proba(input_df.to_numpy(dtype=np.float64)[full_rows])
+            else:
+                if input_selected is None:
+                    input_selected = self.scaler.transform(input_df)[:, selected_idx]
+                full_probability = self.model.predict_proba(input_selected[full_rows])[:, 1]
+            if probability is None:
+                probability = full_probability
+            else:
+                probability[rows] = full_probability
+        result = {
+            "probability": probability,
+            "prediction": (probability >= self.threshold).astype(int),
+            "threshold": self.threshold,
+            "imputed": imputed
+        }
+
+        if explain:
+            result["contributors"] = []
+            if self.explainer is not None:
+                # Las filas resueltas por el screener quedan sin contribuyentes
+                result["contributors"] = [[] for _ in range(len(input_df))]
+                if len(rows):
+                    if input_selected is None:
+                        input_selected = self.scaler.transform(input_df)[:, selected_idx]
+                    shap_matrix = self._cached_shap(input_selected[full_rows])
+                    values = input_df[self.columns].to_numpy(dtype=float)[full_rows]
+                    top = np.argsort(-np.abs(shap_matrix), axis=1, kind='stable')[:, :5]
+                    for k, (row, idx) in enumerate(zip(rows, top)):
+                        result["contributors"][row] = [
+                            {"feature": self.columns[i],
+                             "impact": float(shap_matrix[k, i]),
+                             "value": float(values[k, i])}
+                            for i in idx
+                        ]
+
+        return result
+
     def _get_shap_contributors(
         self, 
         input_selected: pd.DataFrame, 
@@ -391,15 +938,20 @@ class KidneyDiseaseModel:
             return []
         
         try:
-            shap_values = self.explainer.shap_values(input_selected)
+            # Perfiles repetidos se sirven desde la caché
+            key = self._explanation_key(input_selected.to_numpy()[0])
+            with self._explanation_lock:
+                class_1_shap = self._explanation_cache.get(key)
+                if class_1_shap is not None:
+                    self._explanation_cache.move_to_end(key)
             
-            # Obtener valores para clase 1 (ERC)
-            if isinstance(shap_values, list):
-                class_1_shap = shap_values[1][0]
-            elif len(shap_values.shape) == 3:
-                class_1_shap = shap_values[0, :, 1]
-            else:
-                class_1_shap = shap_values[0]
+            if class_1_shap is None:
+                # Obtener valores para clase 1 (ERC)
+                class_1_shap = self._class_1_shap(input_selected)[0]
+                with self._explanation_lock:
+                    self._explanation_cache[key] = class_1_shap
+                    if len(self._explanation_cache) > self.EXPLANATION_CACHE_SIZE:
+                        self._explanation_cache.popitem(last=False)
             
             # Crear lista de impactos
             impacts = []
@@ -0,0 +1,169 @@
+"""
+NephroMind - Monitor de drift de entrada
+Sketches en streaming de memoria constante por feature (histograma sobre los
+cortes de referencia, tasa de valores ausentes y por defecto) comparados con
+el perfil calculado en entrenamiento mediante PSI.
+"""
+
+import logging
+import threading
+from typing import Dict, Any, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Umbrales habituales de PSI
+PSI_WARNING = 0.1
+PSI_ALERT = 0.25
+PSI_EPSILON = 1e-4
+QUANTILES = (0.1, 0.5, 0.9)
+
+
+def build_reference_profile(X: pd.DataFrame, n_bins: int = 10) -> Dict[str, Any]:
+    """
+    Perfil de referencia por feature a partir de los datos de entrenamiento.
+
+    Los cortes son los cuantiles internos de cada feature (deduplicados, así
+    las binarias quedan con 1-2 cortes). Se guardan las proporciones por bin,
+    la tasa de ausentes y algunos cuantiles para comparar.
+    """
+    quantile_levels = np.linspace(0, 1, n_bins + 1)[1:-1]
+    features = {}
+    for col in X.columns:
+        values = X[col].to_numpy(dtype=float)
+        present = values[~np.isnan(values)]
+        edges = np.unique(np.quantile(present, quantile_levels)) if len(present) else np.array([])
+        counts = np.bincount(np.searchsorted(edges, present, side='right'), minlength=len(edges) + 1)
+        features[col] = {
+            'edges': edges.tolist(),
+            'proportions': (counts / max(len(present), 1)).tolist(),
+            'missing_rate': float(1 - len(present) / max(len(values), 1)),
+            'quantiles': {f"p{int(q * 100)}": float(np.quantile(present, q)) for q in QUANTILES} if len(present) else {},
+        }
+    return {'n_samples': int(len(X)), 'features': features}
+
+
+class DriftMonitor:
+    """
+    Acumula las entradas de /predict y calcula drift frente al perfil.
+
+    `observe` solo añade la fila a un buffer bajo un lock (O(1)); las filas
+    se vuelcan a los histogramas por lotes y de forma vectorizada, así el
+    coste por petición no depende del número de features.
+    """
+
+    def __init__(
+        self,
+        reference: Optional[Dict[str, Any]] = None,
+        rename_map: Optional[Dict[str, str]] = None,
+        flush_every: int = 256
+    ):
+        self.rename_map = rename_map or {}
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self.reset(reference)
+
+    def reset(self, reference: Optional[Dict[str, Any]]) -> None:
+        """Reinicia los sketches con un nuevo perfil de referencia."""
+        with self._lock:
+            self.reference = reference
+            self.features: List[str] = list(reference['features']) if reference else []
+            self._edges = [np.asarray(reference['features'][f]['edges']) for f in self.features]
+            self._counts = [np.zeros(len(e) + 1, dtype=np.int64) for e in self._edges]
+            self._missing = np.zeros(len(self.features), dtype=np.int64)
+            self._defaulted = np.zeros(len(self.features), dtype=np.int64)
+            self._buffer: List[List[float]] = []
+            self._buffer_defaulted: List[List[bool]] = []
+            self.n_observed = 0
+
+    def observe(self, input_data: Dict[str, Any], defaulted: Iterable[str] = ()) -> None:
+        """
+        Registra una entrada.
+
+        Args:
+            input_data: Datos del paciente (nombres de PatientData)
+            defaulted: Campos que no vinieron en la petición (valor por defecto)
+        """
+        if not self.features:
+            return
+        data = {self.rename_map.get(k, k): v for k, v in input_data.items()}
+        defaulted = {self.rename_map.get(k, k) for k in defaulted}
+        row = [np.nan if data.get(f) is None else float(data[f]) for f in self.features]
+        row_defaulted = [f in defaulted for f in self.features]
+
+        with self._lock:
+            self._buffer.append(row)
+            self._buffer_defaulted.append(row_defaulted)
+            if len(self._buffer) >= self.flush_every:
+                self._flush()
+
+    def _flush(self) -> None:
+        """Vuelca el buffer a los histogramas (llamar con el lock tomado)."""
+        if not self._buffer:
+            return
+        rows = np.asarray(self._buffer, dtype=float)
+        defaulted = np.asarray(self._buffer_defaulted, dtype=bool)
+        self._buffer, self._buffer_defaulted = [], []
+
+        missing = np.isnan(rows)
+        self._missing += missing.sum(axis=0)
+        self._defaulted += defaulted.sum(axis=0)
+        for j, edges in enumerate(self._edges):
+            column = rows[~missing[:, j], j]
+            self._counts[j] += np.bincount(
+                np.searchsorted(edges, column, side='right'), minlength=len(edges) + 1
+            )
+        self.n_observed += len(rows)
+
+    @staticmethod
+    def _approx_quantile(edges: np.ndarray, counts: np.ndarray, q: float) -> Optional[float]:
+        """Cuantil aproximado: borde superior del bin donde la masa acumulada alcanza q."""
+        total = counts.sum()
+        if total == 0 or len(edges) == 0:
+            return None
+        idx = int(np.searchsorted(np.cumsum(counts) / total, q))
+        return float(edges[min(idx, len(edges) - 1)])
+
+    def report(self) -> Dict[str, Any]:
+        """PSI, tasas de ausentes/por defecto y cuantiles aproximados por feature."""
+        if not self.features:
+            return {'status': 'unavailable', 'detail': 'El modelo no tiene perfil de referencia'}
+
+        with self._lock:
+            self._flush()
+            counts = [c.copy() for c in self._counts]
+            missing = self._missing.copy()
+            defaulted = self._defaulted.copy()
+            n = self.n_observed
+
+        features = {}
+        for j, name in enumerate(self.features):
+            ref = self.reference['features'][name]
+            expected = np.asarray(ref['proportions']) + PSI_EPSILON
+            observed = counts[j] / max(counts[j].sum(), 1) + PSI_EPSILON
+            psi = float(np.sum((observed - expected) * np.log(observed / expected))) if counts[j].sum() else None
+            features[name] = {
+                'psi': psi,
+                'status': None if psi is None else
+                          'alert' if psi >= PSI_ALERT else 'warning' if psi >= PSI_WARNING else 'ok',
+                'missing_rate': float(missing[j] / n) if n else None,
+                'defaulted_rate': float(defaulted[j] / n) if n else None,
+                'reference_missing_rate': ref['missing_rate'],
+                'quantiles': {f"p{int(q * 100)}": self._approx_quantile(self._edges[j], counts[j], q) for q in QUANTILES},
+                'reference_quantiles': ref['quantiles'],
+            }
+
+        drifted = sorted(
+            (f for f, v in features.items() if v['status'] in ('warning', 'alert')),
+            key=lambda f: -features[f]['psi']
+        )
+        return {
+            'status': 'ok',
+            'n_observed': n,
+            'n_reference': self.reference['n_samples'],
+            'drifted_features': drifted,
+            'features': features,
+        }
@@ -0,0 +1,158 @@
+"""
+NephroMind - Triaje de páginas de PDF
+Puntúa localmente cada página por densidad de términos de los campos que se
+extraen (creatinina, HbA1c, TA, filtrado glomerular...) y construye un PDF
+reducido con las más relevantes, para subir a Gemini solo lo que aporta datos.
+
+Variables de entorno:
+    NEPHROMIND_PDF_TRIAGE: '0' desactiva el triaje (por defecto activo)
+    NEPHROMIND_TRIAGE_MAX_PAGES: páginas máximas a enviar (por defecto 6)
+"""
+
+import os
+import re
+import logging
+import tempfile
+from typing import Dict, Any, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TRIAGE_ENABLED = os.getenv("NEPHROMIND_PDF_TRIAGE", "1") != "0"
+MAX_PAGES = int(os.getenv("NEPHROMIND_TRIAGE_MAX_PAGES", "6"))
+
+# Con pocas páginas el ahorro no compensa el riesgo de perder datos
+MIN_PAGES_TO_TRIAGE = 4
+# Por debajo, la página no tiene capa de texto (escaneada): no se puede puntuar
+MIN_TEXT_CHARS_PER_PAGE = 50
+
+# Grupos de campos y sus patrones (texto en minúsculas)
+FIELD_PATTERNS = {
+    'demographics': r'\b(edad|años|sexo|var[oó]n|mujer|fecha de nacimiento|f\. ?nac|etnia)\b',
+    'creatinine': r'\b(creatinina|cr\s*s[eé]rica|crs)\b',
+    'gfr': r'\b(filtrado glomerular|fg(e)?|e?tfg|egfr|ckd-?epi|mdrd)\b',
+    'urea': r'\b(urea|bun|nitr[oó]geno ureico)\b',
+    'albuminuria': r'\b(albuminuria|microalbuminuria|cociente alb[uú]mina|acr|cac|proteinuria|prote[ií]nas en orina)\b',
+    'glucose': r'\b(glucosa|glucemia|glicemia|hba1c|hemoglobina glicosilada|hb ?a1c)\b',
+    'blood_pressure': r'\b(t\.?a\.?|tensi[oó]n arterial|presi[oó]n arterial|pas|pad)\b|\d{2,3}\s*/\s*\d{2,3}\s*mm ?hg',
+    'hemoglobin': r'\b(hemoglobina|hb|hematocrito)\b',
+    'electrolytes': r'\b(sodio|potasio|calcio|f[oó]sforo)\b',
+    'lipids': r'\b(colesterol|ldl|hdl|triglic[eé]ridos)\b',
+    'anthropometry': r'\b(imc|peso|talla|[ií]ndice de masa corporal)\b',
+    'history': r'\b(diabetes|dm ?2?|hipertensi[oó]n|hta|dislipemia|obesidad|antecedentes)\b',
+    'medication': r'\b(ieca|ara ?ii|metformina|estatina|diur[eé]tico|aines?|tratamiento actual)\b',
+}
+_FIELD_REGEXES = {name: re.compile(pattern) for name, pattern in FIELD_PATTERNS.items()}
+# Valores con unidad de laboratorio: distinguen paneles de resultados de la narrativa
+_LAB_VALUE = re.compile(r'\d+(?:[.,]\d+)?\s*(?:mg/dl|mg/g|mmol/l|meq/l|g/dl|g/l|ml/min|mmhg|%)')
+
+
+def score_page(text: str) -> Dict[str, Any]:
+    """
+    Puntúa una página: grupos de campos presentes, aciertos totales y valores
+    con unidad por cada 1000 caracteres. 'chars' es la longitud de la capa de
+    texto (ver MIN_TEXT_CHARS_PER_PAGE).
+    """
+    text = text.lower()
+    hits = {name: len(regex.findall(text)) for name, regex in _FIELD_REGEXES.items()}
+    groups = {name for name, count in hits.items() if count}
+    lab_values = len(_LAB_VALUE.findall(text))
+    density = 1000 * (sum(hits.values()) + lab_values) / max(len(text), 1)
+    return {
+        'groups': groups,
+        'score': len(groups) + lab_values / 5 + density / 10,
+        'chars': len(text.strip()),
+    }
+
+
+def select_pages(scores: List[Dict[str, Any]], max_pages: int = MAX_PAGES) -> List[int]:
+    """
+    Elige páginas: siempre la primera (filiación), después en orden de
+    puntuación priorizando las que aportan grupos de campos aún no cubiertos.
+    Las páginas sin ningún acierto se descartan.
+
+    Las páginas sin capa de texto (escaneadas, p. ej. un informe de
+    laboratorio adjunto como imagen) no se pueden puntuar: se conservan
+    siempre, fuera del límite de `max_pages`.
+
+    Returns:
+        Índices de página en orden original
+    """
+    unscored = [i for i in range(1, len(scores)) if scores[i]['chars'] < MIN_TEXT_CHARS_PER_PAGE]
+    selected = [0]
+    covered = set(scores[0]['groups'])
+    remaining = [
+        i for i in range(1, len(scores))
+        if scores[i]['score'] > 0 and scores[i]['chars'] >= MIN_TEXT_CHARS_PER_PAGE
+    ]
+
+    while remaining and len(selected) < max_pages:
+        best = max(remaining, key=lambda i: (len(scores[i]['groups'] - covered), scores[i]['score']))
+        selected.append(best)
+        covered |= scores[best]['groups']
+        remaining.remove(best)
+
+    return sorted(selected + unscored)
+
+
+def triage_pdf(pdf_path: str, max_pages: int = MAX_PAGES) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Construye un PDF reducido con las páginas relevantes.
+
+    Si el triaje no aplica (pocas páginas, PDF escaneado, pymupdf no
+    instalado, PDF que pymupdf no puede procesar o ninguna página
+    descartada) devuelve el PDF original.
+
+    Returns:
+        (ruta a subir, informe del triaje o None). Si la ruta es distinta de
+        `pdf_path` es un temporal que el llamador debe borrar.
+    """
+    if not TRIAGE_ENABLED:
+        return pdf_path, None
+    try:
+        import fitz  # pymupdf
+    except ImportError:
+        logger.warning("pymupdf no instalado: se envía el PDF completo")
+        return pdf_path, None
+
+    reduced_path = None
+    try:
+        with fitz.open(pdf_path) as doc:
+            n_pages = doc.page_count
+            if n_pages < MIN_PAGES_TO_TRIAGE:
+                return pdf_path, None
+
+            texts = [page.get_text("text") for page in doc]
+            if sum(len(text.strip()) for text in texts) < MIN_TEXT_CHARS_PER_PAGE * n_pages:
+                logger.info("PDF sin capa de texto suficiente: se envía completo")
+                return pdf_path, None
+
+            scores = [score_page(text) for text in texts]
+            kept = select_pages(scores, max_pages)
+            if len(kept) == n_pages:
+                return pdf_path, None
+
+            fd, reduced_path = tempfile.mkstemp(prefix="triage_", suffix=".pdf")
+            os.close(fd)
+            with fitz.open() as reduced:
+                for page in kept:
+                    reduced.insert_pdf(doc, from_page=page, to_page=page)
+                reduced.save(reduced_path, garbage=4, deflate=True)
+    except Exception as e:
+        # PDF dañado o cifrado: Gemini puede leerlo aunque pymupdf no
+        logger.warning(f"Triaje PDF fallido ({e}): se envía completo")
+        if reduced_path is not None and os.path.exists(reduced_path):
+            os.remove(reduced_path)
+        return pdf_path, None
+
+    report = {
+        'n_pages': n_pages,
+        'kept_pages': [page + 1 for page in kept],
+        'bytes_before': os.path.getsize(pdf_path),
+        'bytes_after': os.path.getsize(reduced_path),
+    }
+    logger.info(
+        f"Triaje PDF: {len(kept)}/{n_pages} páginas ({report['kept_pages']}), "
+        f"{report['bytes_before'] // 1024} KB -> {report['bytes_after'] // 1024} KB"
+    )
+    return reduced_path, report
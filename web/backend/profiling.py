@@ -0,0 +1,218 @@
+"""
+NephroMind - Profiling por petición
+Muestreo de pilas bajo demanda (cabecera X-Profile: 1) o a una tasa
+configurable. Cada perfil se guarda en formato collapsed stacks (apto para
+flamegraph.pl o speedscope) junto a un JSON con duración, muestras y los
+tramos marcados con `span` (llamadas al modelo y al extractor).
+
+Sin profiling activo para la petición no se arranca ningún hilo: `span`
+solo consulta una ContextVar.
+
+Variables de entorno:
+    NEPHROMIND_PROFILE_HEADER: '1' permite activar el profiling con la cabecera
+    NEPHROMIND_PROFILE_RATE: fracción de peticiones perfiladas al azar (por defecto 0)
+    NEPHROMIND_PROFILE_DIR: directorio de perfiles (por defecto profiles/ junto al backend)
+    NEPHROMIND_PROFILE_MAX: perfiles conservados; se borran los más antiguos (por defecto 200)
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HEADER_ENABLED = os.getenv("NEPHROMIND_PROFILE_HEADER", "0") == "1"
+SAMPLE_RATE = float(os.getenv("NEPHROMIND_PROFILE_RATE", "0"))
+PROFILE_DIR = os.getenv(
+    "NEPHROMIND_PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+)
+MAX_PROFILES = int(os.getenv("NEPHROMIND_PROFILE_MAX", "200"))
+SAMPLE_INTERVAL = 0.005  # 200 Hz
+MAX_STACK_DEPTH = 128
+
+# Rutas que nunca se perfilan (consultar perfiles no debe generar perfiles)
+EXCLUDED_PREFIXES = ("/profiles", "/health", "/docs", "/redoc", "/openapi.json")
+
+_current: ContextVar[Optional["Profile"]] = ContextVar("nephromind_profile", default=None)
+
+
+def enabled() -> bool:
+    return HEADER_ENABLED or SAMPLE_RATE > 0
+
+
+class StackSampler:
+    """
+    Hilo que muestrea las pilas de todos los hilos del proceso.
+
+    Se muestrean todos porque el trabajo de una petición salta entre el event
+    loop, el pool de inferencia, el micro-batcher y el hilo del extractor; con
+    peticiones concurrentes aparecerán también sus pilas.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                frames = []
+                while frame is not None and len(frames) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(frames))] += 1
+            self.samples += 1
+
+
+class Profile:
+    """Perfil de una petición: muestreador y tramos marcados."""
+
+    def __init__(self, method: str, path: str):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.method, self.path = method, path
+        self.spans: List[Dict[str, Any]] = []
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self._sampler = StackSampler()
+        self._sampler.start()
+
+    def finish(self, status: Optional[int]) -> None:
+        stacks = self._sampler.stop()
+        duration = time.perf_counter() - self._start
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+
+        with open(os.path.join(PROFILE_DIR, f"{self.id}.folded"), "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(os.path.join(PROFILE_DIR, f"{self.id}.json"), "w") as f:
+            json.dump({
+                "id": self.id,
+                "method": self.method,
+                "path": self.path,
+                "status": status,
+                "created_at": self.started,
+                "duration_ms": round(duration * 1000, 2),
+                "samples": self._sampler.samples,
+                "spans": self.spans,
+            }, f, indent=2)
+        _prune()
+        logger.info(f"Perfil {self.id}: {self.method} {self.path} {duration * 1000:.0f} ms")
+
+
+@contextmanager
+def span(name: str):
+    """Marca un tramo (p.ej. 'model.predict') en el perfil de la petición, si lo hay."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.spans.append({
+            "name": name,
+            "start_ms": round((start - profile._start) * 1000, 2),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+        })
+
+
+def _prune() -> None:
+    """Mantiene como mucho MAX_PROFILES perfiles en disco."""
+    metas = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(".json"))
+    for name in metas[:max(len(metas) - MAX_PROFILES, 0)]:
+        for ext in (".json", ".folded"):
+            path = os.path.join(PROFILE_DIR, name[:-5] + ext)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Índice de perfiles guardados, del más reciente al más antiguo."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    index = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if name.endswith(".json"):
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                meta = json.load(f)
+            meta.pop("spans", None)
+            index.append(meta)
+    return index
+
+
+def profile_path(profile_id: str, ext: str) -> Optional[str]:
+    """Ruta del perfil o None si no existe (o el id no es válido)."""
+    if os.path.basename(profile_id) != profile_id:
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.{ext}")
+    return path if os.path.exists(path) else None
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI que perfila la petición completa (incluido el cuerpo de
+    respuestas en streaming) y devuelve el id en la cabecera X-Profile-Id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wanted(self, scope) -> bool:
+        if scope["type"] != "http" or scope["path"].startswith(EXCLUDED_PREFIXES):
+            return False
+        if HEADER_ENABLED and (b"x-profile", b"1") in scope.get("headers", []):
+            return True
+        return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope.get("method", ""), scope["path"])
+        token = _current.set(profile)
+        status = None
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _current.reset(token)
+            profile.finish(status)
@@ -0,0 +1,309 @@
+"""
+NephroMind - Runtimes de inferencia alternativos
+Exporta el pipeline entrenado (scaler + columnas RFE + booster + threshold) a
+ONNX y a una librería compilada con Treelite, comprobando la paridad con
+XGBoost, y carga el runtime disponible para servir.
+
+El manifiesto (mi_modelo_runtime.json) guarda los parámetros del scaler, las
+columnas, el threshold y los artefactos exportados con su paridad medida, así
+el serving no necesita el paquete xgboost si se usa otro runtime.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "mi_modelo_runtime.json"
+ARTIFACT_FILENAMES = {
+    'onnx': "mi_modelo.onnx",
+    'treelite': "mi_modelo_treelite.so",
+}
+# Orden de preferencia con NEPHROMIND_RUNTIME=auto
+AUTO_ORDER = ('treelite', 'onnx', 'xgboost')
+
+# Paridad exigida frente a XGBoost para registrar un artefacto
+PARITY_ATOL = 1e-4
+PARITY_ROWS = 2000
+ONNX_OPSET = 15
+
+
+def file_sha1(path: str) -> str:
+    """Hash del fichero del booster, para detectar artefactos desactualizados."""
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _expected_columns(model) -> List[str]:
+    return list(getattr(model.scaler, 'feature_names_in_', model.all_columns or model.columns))
+
+
+# ============================================
+# RUNTIMES
+# ============================================
+
+class _ScaledRuntime:
+    """Base: escala con los parámetros del manifiesto y selecciona columnas RFE."""
+
+    def __init__(self, manifest: Dict[str, Any]):
+        self.mean = np.asarray(manifest['scaler_mean'], dtype=np.float64)
+        self.scale = np.asarray(manifest['scaler_scale'], dtype=np.float64)
+        self.selected_idx = np.asarray(manifest['selected_idx'], dtype=np.intp)
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        return ((X - self.mean) / self.scale)[:, self.selected_idx].astype(np.float32)
+
+
+class ONNXRuntime:
+    """
+    Sesión de onnxruntime. El grafo incluye escalado y selección, así que
+    recibe directamente las columnas del scaler sin transformar.
+    """
+
+    name = 'onnx'
+
+    def __init__(self, path: str, manifest: Dict[str, Any], n_threads: int = 1):
+        import onnxruntime as ort
+
+        self.path, self.manifest = path, manifest
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = n_threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Probabilidad de la clase positiva para una matriz (n, columnas del scaler)."""
+        probabilities = self.session.run(['probabilities'], {self.input_name: X.astype(np.float32)})[0]
+        return probabilities[:, 1].astype(np.float64)
+
+
+class TreeliteRuntime(_ScaledRuntime):
+    """Librería compilada con Treelite/TL2cgen (sin dependencia de xgboost)."""
+
+    name = 'treelite'
+
+    def __init__(self, path: str, manifest: Dict[str, Any], n_threads: int = 1):
+        import tl2cgen
+
+        super().__init__(manifest)
+        self.path, self.manifest = path, manifest
+        self._tl2cgen = tl2cgen
+        self.predictor = tl2cgen.Predictor(path, nthread=n_threads)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        dmat = self._tl2cgen.DMatrix(self.transform(X), dtype='float32')
+        return np.asarray(self.predictor.predict(dmat)).reshape(len(X), -1)[:, -1].astype(np.float64)
+
+
+RUNTIME_CLASSES = {'onnx': ONNXRuntime, 'treelite': TreeliteRuntime}
+
+
+def load_manifest(output_dir: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(output_dir, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_runtime(
+    name: str,
+    output_dir: str,
+    model_sha1: Optional[str] = None,
+    n_threads: int = 1
+):
+    """
+    Carga el runtime pedido ('auto', 'onnx', 'treelite' o 'xgboost').
+
+    Con 'auto' se prueba en orden AUTO_ORDER. Solo se usan artefactos cuyo
+    manifiesto corresponde al booster cargado (`model_sha1`) y que pasaron la
+    comprobación de paridad.
+
+    Returns:
+        (runtime o None para XGBoost, manifiesto o None)
+    """
+    manifest = load_manifest(output_dir)
+    candidates = AUTO_ORDER if name == 'auto' else (name,)
+
+    for candidate in candidates:
+        if candidate == 'xgboost':
+            return None, manifest
+        if manifest is None:
+            if name != 'auto':
+                logger.warning(f"Runtime {candidate}: no hay {MANIFEST_FILENAME}")
+            continue
+        if model_sha1 is not None and manifest.get('model_sha1') != model_sha1:
+            logger.warning(f"Runtime {candidate}: artefactos exportados de otro booster, se ignoran")
+            continue
+        artifact = manifest.get('artifacts', {}).get(candidate)
+        if artifact is None:
+            continue
+        try:
+            runtime = RUNTIME_CLASSES[candidate](os.path.join(output_dir, artifact['file']), manifest, n_threads)
+        except ImportError as e:
+            logger.warning(f"Runtime {candidate} no disponible: {e}")
+            continue
+        logger.info(f"Runtime de inferencia: {candidate} ({artifact['file']})")
+        return runtime, manifest
+
+    if name != 'auto':
+        logger.warning(f"Runtime '{name}' no disponible, se usa XGBoost")
+    return None, manifest
+
+
+# ============================================
+# EXPORTACIÓN
+# ============================================
+
+def _export_onnx(model, path: str) -> None:
+    """Booster a ONNX con el escalado y la selección RFE como nodos previos."""
+    import onnx
+    from onnx import TensorProto, helper, compose
+    from onnxmltools.convert import convert_xgboost
+    from onnxmltools.convert.common.data_types import FloatTensorType
+
+    expected_cols = _expected_columns(model)
+    booster = model.model.get_booster().copy()
+    booster.feature_names = None  # onnxmltools exige nombres f0..fn
+    tree_model = convert_xgboost(
+        booster,
+        initial_types=[('features', FloatTensorType([None, len(model.columns)]))],
+        target_opset=ONNX_OPSET
+    )
+
+    selected_idx = [expected_cols.index(col) for col in model.columns]
+    preprocess = helper.make_graph(
+        [
+            helper.make_node('Sub', ['input', 'scaler_mean'], ['centered']),
+            helper.make_node('Div', ['centered', 'scaler_scale'], ['scaled']),
+            helper.make_node('Gather', ['scaled', 'selected_idx'], ['features'], axis=1),
+        ],
+        'nephromind_preprocess',
+        [helper.make_tensor_value_info('input', TensorProto.FLOAT, [None, len(expected_cols)])],
+        [helper.make_tensor_value_info('features', TensorProto.FLOAT, [None, len(model.columns)])],
+        initializer=[
+            helper.make_tensor('scaler_mean', TensorProto.FLOAT, [len(expected_cols)], model.scaler.mean_.tolist()),
+            helper.make_tensor('scaler_scale', TensorProto.FLOAT, [len(expected_cols)], model.scaler.scale_.tolist()),
+            helper.make_tensor('selected_idx', TensorProto.INT64, [len(selected_idx)], selected_idx),
+        ]
+    )
+    preprocess_model = helper.make_model(
+        preprocess,
+        opset_imports=[helper.make_opsetid('', ONNX_OPSET)],
+        ir_version=tree_model.ir_version
+    )
+
+    pipeline = compose.merge_models(preprocess_model, tree_model, io_map=[('features', 'features')])
+    helper.set_model_props(pipeline, {'nephromind_threshold': str(model.threshold)})
+    onnx.checker.check_model(pipeline)
+    onnx.save(pipeline, path)
+
+
+def _export_treelite(model, path: str) -> None:
+    """Compila el booster a una librería compartida con Treelite + TL2cgen."""
+    import treelite
+    import tl2cgen
+
+    tl_model = treelite.frontend.from_xgboost(model.model.get_booster())
+    tl2cgen.export_lib(
+        tl_model, toolchain='gcc', libpath=path,
+        params={'parallel_comp': os.cpu_count() or 1}
+    )
+
+
+EXPORTERS = {'onnx': _export_onnx, 'treelite': _export_treelite}
+
+
+def _check_parity(runtime, model, X_raw: np.ndarray) -> Dict[str, Any]:
+    """Compara probabilidades y decisiones del runtime con XGBoost."""
+    expected_cols = _expected_columns(model)
+    selected_idx = [expected_cols.index(col) for col in model.columns]
+    reference = model.model.predict_proba(model.scaler.transform(X_raw)[:, selected_idx])[:, 1]
+    candidate = runtime.predict_proba(X_raw)
+
+    diff = np.abs(reference - candidate)
+    flips = int(np.sum((reference >= model.threshold) != (candidate >= model.threshold)))
+    return {
+        'n_rows': int(len(X_raw)),
+        'max_abs_diff': float(diff.max()),
+        'mean_abs_diff': float(diff.mean()),
+        'decision_flips': flips,
+        'passed': bool(diff.max() <= PARITY_ATOL and flips == 0),
+    }
+
+
+def export_runtimes(
+    model,
+    data_path: str,
+    formats: Sequence[str] = ('onnx', 'treelite'),
+    model_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Exporta el modelo cargado a los formatos pedidos y escribe el manifiesto.
+
+    Cada artefacto se vuelve a cargar con su runtime y se compara con XGBoost
+    sobre hasta PARITY_ROWS filas del dataset; solo se registran en el
+    manifiesto los que pasan la paridad (ver PARITY_ATOL).
+
+    Args:
+        model: KidneyDiseaseModel cargado
+        data_path: CSV con el que medir la paridad
+        formats: Formatos a exportar ('onnx', 'treelite')
+        model_path: Fichero del booster exportado (por defecto mi_modelo.json)
+
+    Returns:
+        Manifiesto escrito
+    """
+    model_path = model_path or model.model_path_json
+    output_dir = os.path.dirname(model.model_path_json)
+    expected_cols = _expected_columns(model)
+
+    df = model.load_data(data_path)
+    X_raw = df[expected_cols].to_numpy(dtype=np.float64)
+    if len(X_raw) > PARITY_ROWS:
+        X_raw = X_raw[np.random.default_rng(42).choice(len(X_raw), PARITY_ROWS, replace=False)]
+
+    manifest = {
+        'model_file': os.path.basename(model_path),
+        'model_sha1': file_sha1(model_path),
+        'threshold': float(model.threshold),
+        'expected_columns': expected_cols,
+        'columns': list(model.columns),
+        'selected_idx': [expected_cols.index(col) for col in model.columns],
+        'scaler_mean': model.scaler.mean_.tolist(),
+        'scaler_scale': model.scaler.scale_.tolist(),
+        'artifacts': {},
+        'rejected': {},
+    }
+
+    for fmt in formats:
+        filename = ARTIFACT_FILENAMES[fmt]
+        path = os.path.join(output_dir, filename)
+        try:
+            EXPORTERS[fmt](model, path)
+            parity = _check_parity(RUNTIME_CLASSES[fmt](path, manifest), model, X_raw)
+        except ImportError as e:
+            logger.warning(f"Exportación {fmt} omitida (dependencia no instalada): {e}")
+            manifest['rejected'][fmt] = {'reason': str(e)}
+            continue
+
+        if parity['passed']:
+            manifest['artifacts'][fmt] = {'file': filename, 'parity': parity}
+            logger.info(f"✓ {fmt}: {filename} (max |Δp| = {parity['max_abs_diff']:.2e})")
+        else:
+            manifest['rejected'][fmt] = {'reason': 'parity', 'parity': parity}
+            logger.error(f"✗ {fmt}: paridad insuficiente ({parity})")
+
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Manifiesto de runtimes guardado en: {manifest_path}")
+
+    return manifest
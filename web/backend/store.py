@@ -0,0 +1,328 @@
+"""
+NephroMind - Almacén local de pacientes
+Historial de predicciones y extracciones de PDF en SQLite (WAL). Las
+escrituras se encolan y un hilo las vuelca por lotes en una transacción, así
+los endpoints no esperan al disco.
+
+Variables de entorno:
+    NEPHROMIND_DB_PATH: fichero SQLite (por defecto nephromind.db junto al backend)
+"""
+
+import os
+import json
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv(
+    "NEPHROMIND_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "nephromind.db")
+)
+
+# Descenso de eGFR considerado progresión rápida (KDIGO: > 5 ml/min/1.73m²/año)
+RAPID_DECLINE_PER_YEAR = -5.0
+SECONDS_PER_YEAR = 365.25 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    patient_id TEXT PRIMARY KEY,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id TEXT NOT NULL REFERENCES patients(patient_id),
+    created_at REAL NOT NULL,
+    source TEXT NOT NULL,
+    probability REAL NOT NULL,
+    risk_class INTEGER NOT NULL,
+    model_threshold REAL,
+    egfr REAL,
+    gfr_stage TEXT,
+    acr_stage TEXT,
+    kfre_2yr REAL,
+    inputs TEXT,
+    imputed_fields TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_patient_time ON predictions (patient_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_time ON predictions (created_at);
+CREATE TABLE IF NOT EXISTS pdf_extractions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id TEXT NOT NULL REFERENCES patients(patient_id),
+    created_at REAL NOT NULL,
+    filename TEXT,
+    extracted_data TEXT NOT NULL,
+    imputed_fields TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_extractions_patient_time ON pdf_extractions (patient_id, created_at);
+"""
+
+INSERT_PATIENT = """
+INSERT INTO patients (patient_id, first_seen, last_seen) VALUES (?, ?, ?)
+ON CONFLICT(patient_id) DO UPDATE SET last_seen = MAX(last_seen, excluded.last_seen)
+"""
+INSERT_PREDICTION = """
+INSERT INTO predictions (patient_id, created_at, source, probability, risk_class, model_threshold,
+                         egfr, gfr_stage, acr_stage, kfre_2yr, inputs, imputed_fields)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+INSERT_EXTRACTION = """
+INSERT INTO pdf_extractions (patient_id, created_at, filename, extracted_data, imputed_fields)
+VALUES (?, ?, ?, ?, ?)
+"""
+
+
+def _json(value: Any) -> Optional[str]:
+    return None if value is None else json.dumps(value, ensure_ascii=False, default=float)
+
+
+def _egfr_imputed(imputed_fields: Optional[str]) -> bool:
+    """
+    eGFR inventado por el motor de imputación: sin GFR ni creatinina medidos
+    (creatinina por defecto 1.0 o GFR por defecto 90). Un eGFR calculado con
+    CKD-EPI desde la creatinina observada sí cuenta como medida.
+    """
+    imputed = json.loads(imputed_fields) if imputed_fields else []
+    return 'GFR' in imputed and 'SerumCreatinine' in imputed
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+class PatientStore:
+    """
+    Historial de pacientes en SQLite.
+
+    `record_prediction` y `record_extraction` solo encolan; un hilo escritor
+    agrupa hasta `batch_size` filas (o lo acumulado en `flush_interval`
+    segundos) y las inserta con `executemany` en una única transacción.
+    Las lecturas usan su propia conexión y no bloquean al escritor (WAL).
+    """
+
+    def __init__(self, path: str = DB_PATH, batch_size: int = 256, flush_interval: float = 0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Tuple[str, tuple]]]" = queue.Queue()
+        self._local = threading.local()
+        self._thread: Optional[threading.Thread] = None
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """Conexión de lectura por hilo."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Arranca el hilo escritor."""
+        self._thread = threading.Thread(target=self._run, name="patient-store-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Historial de pacientes en: {self.path}")
+
+    def stop(self) -> None:
+        """Vuelca lo pendiente y detiene el escritor."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def record_prediction(
+        self,
+        patient_id: str,
+        result: Dict[str, Any],
+        inputs: Optional[Dict[str, Any]] = None,
+        source: str = "api",
+        created_at: Optional[float] = None
+    ) -> None:
+        """
+        Encola una predicción.
+
+        Args:
+            patient_id: Identificador del paciente
+            result: Respuesta de la predicción (probability, risk_class, egfr, ...)
+            inputs: Datos de entrada ya imputados
+            source: Origen ('api', 'batch', 'fhir')
+            created_at: Fecha de la analítica (epoch); None para la hora actual
+        """
+        self._queue.put(("prediction", (
+            patient_id, created_at or time.time(), source,
+            float(result["probability"]), int(result["risk_class"]), result.get("model_threshold"),
+            result.get("egfr"), result.get("gfr_stage"), result.get("acr_stage"), result.get("kfre_2yr"),
+            _json(inputs), _json(result.get("imputed_fields"))
+        )))
+
+    def record_extraction(
+        self,
+        patient_id: str,
+        extracted_data: Dict[str, Any],
+        filename: Optional[str] = None,
+        imputed_fields: Optional[List[str]] = None
+    ) -> None:
+        """Encola los datos extraídos de un PDF."""
+        self._queue.put(("extraction", (
+            patient_id, time.time(), filename, _json(extracted_data), _json(imputed_fields)
+        )))
+
+    def _collect(self) -> Tuple[List[Tuple[str, tuple]], bool]:
+        """Espera la primera escritura y agrupa las que lleguen en la ventana."""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _write(self, conn: sqlite3.Connection, batch: List[Tuple[str, tuple]]) -> None:
+        predictions = [row for kind, row in batch if kind == "prediction"]
+        extractions = [row for kind, row in batch if kind == "extraction"]
+        patients = {}
+        for row in predictions + extractions:
+            patient_id, created_at = row[0], row[1]
+            first, last = patients.get(patient_id, (created_at, created_at))
+            patients[patient_id] = (min(first, created_at), max(last, created_at))
+
+        with conn:
+            conn.executemany(INSERT_PATIENT, [(pid, first, last) for pid, (first, last) in patients.items()])
+            if predictions:
+                conn.executemany(INSERT_PREDICTION, predictions)
+            if extractions:
+                conn.executemany(INSERT_EXTRACTION, extractions)
+
+    def _run(self) -> None:
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if not batch:
+                continue
+            try:
+                self._write(conn, batch)
+            except sqlite3.Error as e:
+                logger.error(f"Error guardando historial ({len(batch)} filas): {e}")
+        conn.close()
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def trajectory(self, patient_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Predicciones del paciente en orden cronológico (las `limit` más recientes)."""
+        rows = self._reader().execute(
+            """
+            SELECT * FROM (
+                SELECT created_at, source, probability, risk_class, model_threshold,
+                       egfr, gfr_stage, acr_stage, kfre_2yr, imputed_fields
+                FROM predictions WHERE patient_id = ?
+                ORDER BY created_at DESC LIMIT ?
+            ) ORDER BY created_at
+            """,
+            (patient_id, limit)
+        ).fetchall()
+
+        trajectory = []
+        for row in rows:
+            item = dict(row)
+            item["created_at"] = _iso(row["created_at"])
+            item["imputed_fields"] = json.loads(row["imputed_fields"]) if row["imputed_fields"] else []
+            trajectory.append(item)
+        return trajectory
+
+    def egfr_slope(self, patient_id: str) -> Dict[str, Any]:
+        """
+        Pendiente de eGFR por mínimos cuadrados (ml/min/1.73m² por año).
+
+        Solo usa predicciones con eGFR o creatinina medidos: un eGFR imputado
+        repetiría un valor por defecto y ocultaría una progresión rápida.
+        No se calcula si hay menos de dos medidas o todas son del mismo día.
+        """
+        rows = self._reader().execute(
+            "SELECT created_at, egfr, imputed_fields FROM predictions "
+            "WHERE patient_id = ? AND egfr IS NOT NULL ORDER BY created_at",
+            (patient_id,)
+        ).fetchall()
+        measured = [row for row in rows if not _egfr_imputed(row["imputed_fields"])]
+
+        result = {
+            "patient_id": patient_id,
+            "n_measurements": len(measured),
+            "n_imputed_excluded": len(rows) - len(measured),
+            "slope_per_year": None,
+        }
+        rows = measured
+        if not rows:
+            return result
+
+        times = np.array([row["created_at"] for row in rows])
+        egfr = np.array([row["egfr"] for row in rows])
+        span_days = float((times[-1] - times[0]) / 86400)
+        result.update(
+            first_measurement=_iso(times[0]),
+            last_measurement=_iso(times[-1]),
+            span_days=round(span_days, 1),
+            latest_egfr=float(egfr[-1]),
+        )
+
+        if len(rows) >= 2 and span_days >= 1:
+            years = (times - times[0]) / SECONDS_PER_YEAR
+            slope = float(np.polyfit(years, egfr, 1)[0])
+            result["slope_per_year"] = round(slope, 2)
+            result["rapid_decline"] = slope <= RAPID_DECLINE_PER_YEAR
+        return result
+
+    def patient_summary(self, patient_id: str) -> Optional[Dict[str, Any]]:
+        """Fechas y recuentos del paciente, o None si no existe."""
+        row = self._reader().execute(
+            """
+            SELECT p.first_seen, p.last_seen,
+                   (SELECT COUNT(*) FROM predictions WHERE patient_id = p.patient_id) AS n_predictions,
+                   (SELECT COUNT(*) FROM pdf_extractions WHERE patient_id = p.patient_id) AS n_extractions
+            FROM patients p WHERE p.patient_id = ?
+            """,
+            (patient_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "patient_id": patient_id,
+            "first_seen": _iso(row["first_seen"]),
+            "last_seen": _iso(row["last_seen"]),
+            "n_predictions": row["n_predictions"],
+            "n_extractions": row["n_extractions"],
+        }
@@ -0,0 +1,186 @@
+"""
+NephroMind - Generador de datos sintéticos
+Ajusta una cópula gaussiana por clase (marginales empíricas + correlación de
+rangos normalizados) al CSV de entrenamiento y genera tantas filas
+etiquetadas como se pidan, por bloques y con semilla determinista. Sirve
+para pruebas de escala de `load_data`, `train` y la inferencia por lotes sin
+datos reales de pacientes.
+
+Los huecos del CSV original (columnas que solo existen en parte de las
+fuentes) se reproducen copiando el patrón de nulos de filas reales de la
+misma clase.
+"""
+
+import os
+import logging
+from typing import Dict, Any, Iterator
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr, ndtri
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TARGET = 'Diagnosis'
+DEFAULT_CHUNK_SIZE = 200_000
+# Columnas con pocos valores distintos se muestrean sobre su soporte (sin interpolar)
+MAX_DISCRETE_VALUES = 20
+
+
+def _normal_scores(values: pd.Series) -> np.ndarray:
+    """Rangos -> N(0, 1); los nulos se quedan en NaN."""
+    ranks = values.rank(method='average')
+    return ndtri(ranks / (values.notna().sum() + 1)).to_numpy()
+
+
+def _nearest_correlation(corr: np.ndarray) -> np.ndarray:
+    """Recorta autovalores negativos (correlaciones por pares con nulos) y renormaliza."""
+    eigenvalues, eigenvectors = np.linalg.eigh(corr)
+    corr = eigenvectors @ np.diag(np.clip(eigenvalues, 1e-6, None)) @ eigenvectors.T
+    d = np.sqrt(np.diag(corr))
+    return corr / np.outer(d, d)
+
+
+def _fit_class(df: pd.DataFrame) -> Dict[str, Any]:
+    """Marginales, Cholesky de la correlación y patrones de nulos de una clase."""
+    z = pd.DataFrame({col: _normal_scores(df[col]) for col in df.columns})
+    corr = z.corr(min_periods=30).fillna(0.0).to_numpy(copy=True)
+    np.fill_diagonal(corr, 1.0)
+
+    marginals = []
+    for col in df.columns:
+        observed = np.sort(df[col].dropna().to_numpy(dtype=np.float64))
+        if observed.size == 0:
+            observed = np.array([np.nan])
+        marginals.append({
+            'values': observed,
+            'discrete': np.unique(observed).size <= MAX_DISCRETE_VALUES,
+            'integer': bool(np.all(np.mod(observed[~np.isnan(observed)], 1) == 0)),
+        })
+
+    return {
+        'n_rows': len(df),
+        'cholesky': np.linalg.cholesky(_nearest_correlation(corr)),
+        'marginals': marginals,
+        'missing': df.isna().to_numpy(),
+    }
+
+
+def fit(data_path: str) -> Dict[str, Any]:
+    """
+    Ajusta la cópula al CSV.
+
+    Returns:
+        Parámetros por clase, columnas y prevalencia
+    """
+    df = pd.read_csv(data_path).select_dtypes(include='number')
+    y = df.pop(TARGET).astype(int)
+    logger.info(f"Ajustando cópula sobre {len(df)} filas x {df.shape[1]} columnas")
+    return {
+        'columns': df.columns.tolist(),
+        'prevalence': float(y.mean()),
+        'classes': {label: _fit_class(df[y == label].reset_index(drop=True)) for label in (0, 1)},
+    }
+
+
+def _sample_class(params: Dict[str, Any], n: int, rng: np.random.Generator) -> np.ndarray:
+    u = ndtr(rng.standard_normal((n, params['cholesky'].shape[0])) @ params['cholesky'].T)
+    out = np.empty_like(u)
+    for j, marginal in enumerate(params['marginals']):
+        values = marginal['values']
+        if marginal['discrete']:
+            out[:, j] = values[np.minimum((u[:, j] * values.size).astype(np.intp), values.size - 1)]
+        else:
+            # Cuantil empírico con interpolación lineal entre observaciones
+            out[:, j] = np.interp(u[:, j] * (values.size - 1), np.arange(values.size), values)
+            if marginal['integer']:
+                out[:, j] = np.round(out[:, j])
+
+    # Patrón de nulos de una fila real de la misma clase
+    out[params['missing'][rng.integers(0, params['n_rows'], n)]] = np.nan
+    return out
+
+
+def generate(
+    copula: Dict[str, Any],
+    n_rows: int,
+    seed: int = 42,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[pd.DataFrame]:
+    """
+    Genera filas sintéticas por bloques.
+
+    Cada bloque usa su propia semilla derivada de (seed, índice de bloque),
+    así el resultado es reproducible para un mismo `chunk_size`.
+
+    Yields:
+        DataFrames de hasta `chunk_size` filas con las columnas originales y Diagnosis
+    """
+    for index, start in enumerate(range(0, n_rows, chunk_size)):
+        n = min(chunk_size, n_rows - start)
+        rng = np.random.default_rng([seed, index])
+        y = (rng.random(n) < copula['prevalence']).astype(np.int8)
+
+        X = np.empty((n, len(copula['columns'])))
+        for label in (0, 1):
+            mask = y == label
+            X[mask] = _sample_class(copula['classes'][label], int(mask.sum()), rng)
+
+        chunk = pd.DataFrame(X, columns=copula['columns'])
+        chunk[TARGET] = y
+        yield chunk
+
+
+def write(
+    data_path: str,
+    output_path: str,
+    n_rows: int,
+    seed: int = 42,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> None:
+    """
+    Genera `n_rows` filas en `output_path` (.csv o .parquet) sin tenerlas
+    todas en memoria.
+    """
+    copula = fit(data_path)
+    parquet = output_path.endswith('.parquet')
+    writer = None
+    written = 0
+
+    try:
+        for chunk in generate(copula, n_rows, seed, chunk_size):
+            if parquet:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema, compression='zstd')
+                writer.write_table(table)
+            else:
+                chunk.to_csv(output_path, mode='w' if written == 0 else 'a', header=written == 0, index=False)
+            written += len(chunk)
+            logger.info(f"  {written:,}/{n_rows:,} filas")
+    finally:
+        if writer is not None:
+            writer.close()
+
+    logger.info(f"Dataset sintético guardado en: {output_path} ({os.path.getsize(output_path) / 1e6:.1f} MB)")
+
+
+# Entry point por línea de comandos
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Genera un dataset sintético a partir del CSV de entrenamiento")
+    parser.add_argument("output", help="Fichero de salida (.csv o .parquet)")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument(
+        "--data", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive/kidney_data.csv"),
+        help="CSV de referencia"
+    )
+    args = parser.parse_args()
+
+    write(args.data, args.output, args.rows, args.seed, args.chunk_size)
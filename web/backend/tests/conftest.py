@@ -0,0 +1,53 @@
+"""
+NephroMind - Configuración de pytest
+Los módulos del backend se importan como módulos de primer nivel (igual que
+al arrancar uvicorn desde web/backend).
+"""
+
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DATA_PATH = os.path.join(BACKEND_DIR, "archive", "kidney_data.csv")
+
+
+@pytest.fixture(scope="session")
+def data_path():
+    """CSV de entrenamiento incluido en el repositorio (con valores ausentes)."""
+    return DATA_PATH
+
+
+@pytest.fixture(scope="session")
+def dataset():
+    """Dataset de entrenamiento incluido en el repositorio, ya preprocesado."""
+    from model import KidneyDiseaseModel
+    return KidneyDiseaseModel().load_data(DATA_PATH)
+
+
+def _model_in(directory):
+    """Modelo que guarda sus artefactos en `directory` y no en el backend."""
+    from model import KidneyDiseaseModel
+    model = KidneyDiseaseModel()
+    model.model_path_json = os.path.join(directory, "mi_modelo.json")
+    model.model_path_compact = os.path.join(directory, "mi_modelo_compact.json")
+    model.metadata_path = os.path.join(directory, "model_metadata.pkl")
+    model.metrics_path = os.path.join(directory, "latest_metrics.json")
+    return model
+
+
+@pytest.fixture(scope="session")
+def model_in():
+    """Construye modelos cuyos artefactos viven en el directorio indicado."""
+    return _model_in
+
+
+@pytest.fixture(scope="session")
+def model_dir(tmp_path_factory, data_path):
+    """Directorio con un modelo entrenado sobre el CSV incluido."""
+    directory = tmp_path_factory.mktemp("model")
+    _model_in(directory).train(data_path)
+    return directory
@@ -0,0 +1,35 @@
+"""Tests del pivotado FHIR."""
+
+from fhir_ingest import FHIRPivot
+
+
+def _observation(code: str, value: float, effective=None):
+    resource = {
+        "resourceType": "Observation",
+        "subject": {"reference": "Patient/p1"},
+        "code": {"coding": [{"system": "http://loinc.org", "code": code}]},
+        "valueQuantity": {"value": value},
+    }
+    if effective is not None:
+        resource["effectiveDateTime"] = effective
+    return resource
+
+
+def test_latest_observation_compares_instants_not_strings():
+    pivot = FHIRPivot()
+    for resource in [
+        {"resourceType": "Patient", "id": "p1", "birthDate": "1960-01-01", "gender": "female"},
+        _observation("2160-0", 2.0, "2024-03-01T09:30:00Z"),
+        _observation("2160-0", 1.4, "2024-03-01T10:00:00+01:00"),  # 09:00Z: anterior
+        _observation("4548-4", 7.0, "2024-03-02"),
+        _observation("4548-4", 9.0),  # Sin fecha: la más antigua
+        _observation("2345-7", 200.0, "2024-03-03"),  # Glucosa sin ayuno: no es FastingBloodSugar
+    ]:
+        pivot.add(resource)
+
+    row = pivot.to_frame().iloc[0]
+
+    assert row["SerumCreatinine"] == 2.0
+    assert row["HbA1c"] == 7.0
+    assert row["measured_at"] == "2024-03-01T09:30:00Z"
+    assert "FastingBloodSugar" not in row
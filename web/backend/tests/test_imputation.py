@@ -0,0 +1,34 @@
+"""Tests del motor de imputación."""
+
+import math
+
+import pandas as pd
+import pytest
+
+from imputation import engine, imputed_fields
+
+RECORDS = [
+    {},
+    {'Age': 60, 'Gender': 1, 'SerumCreatinine': 1.4},
+    {'Age': 70, 'Gender': 0, 'BUN': '40', 'HbA1c': 8.0, 'SystolicBP': None},
+    {'Age': 45, 'BMI': 0, 'GFR': 0, 'notas': 'Paciente con OBESIDAD'},
+    {'Age': 50, 'Fatigue': 2, 'FatigueLevels': None, 'Statins': 1, 'notas': 'sobrepeso'},
+]
+
+
+@pytest.mark.parametrize('data', RECORDS)
+def test_impute_record_matches_batch_path(data):
+    zero_as_missing = ['BMI', 'GFR']
+    record, imputed = engine.impute_record(data, zero_as_missing)
+    df, mask = engine.impute(pd.DataFrame([data]), zero_as_missing)
+
+    assert imputed == imputed_fields(mask)[0]
+    assert set(record) == set(df.columns)
+    for field, expected in df.iloc[0].items():
+        value = record[field]
+        if isinstance(expected, float) and math.isnan(expected):
+            assert isinstance(value, float) and math.isnan(value), field
+        else:
+            assert value == expected, field
+    for field in engine.integer_fields:
+        assert isinstance(record[field], int), field
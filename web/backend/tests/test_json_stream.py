@@ -0,0 +1,56 @@
+"""Tests del parser JSON incremental de la respuesta en streaming."""
+
+import json
+
+import pytest
+
+from json_stream import IncrementalObjectParser
+
+BODY = json.dumps({
+    'Age': 61,
+    'notas': 'Refiere "cansancio", dolor {lumbar} y [edema], ruta C:\\informes',
+    'labs': {'SerumCreatinine': 1.4, 'HbA1c': [7.2, {'unidad': '%'}]},
+    'medicacion': [['IECA', 'estatina'], []],
+    'Gender': None,
+}, ensure_ascii=False)
+FENCED = "```json\n" + BODY + "\n```"
+
+
+def _feed_in_chunks(text, size):
+    parser = IncrementalObjectParser()
+    members = []
+    for start in range(0, len(text), size):
+        members.extend(parser.feed(text[start:start + size]))
+    return parser, members
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, len(FENCED)])
+def test_members_match_json_loads(size):
+    parser, members = _feed_in_chunks(FENCED, size)
+
+    assert parser.done
+    assert dict(members) == json.loads(BODY)
+    assert [key for key, _ in members] == list(json.loads(BODY))
+
+
+def test_any_split_point_gives_the_same_members():
+    expected = list(json.loads(BODY).items())
+    for split in range(1, len(FENCED)):
+        parser = IncrementalObjectParser()
+        members = parser.feed(FENCED[:split]) + parser.feed(FENCED[split:])
+        assert members == expected, FENCED[:split]
+
+
+def test_trailing_comma_is_ignored():
+    parser, members = _feed_in_chunks('```json\n{"Age": 61, "labs": {"GFR": 45},}\n```', 4)
+
+    assert parser.done
+    assert dict(members) == {'Age': 61, 'labs': {'GFR': 45}}
+
+
+def test_member_is_emitted_before_the_object_closes():
+    parser = IncrementalObjectParser()
+
+    assert parser.feed('{"notas": "a \\"b\\", c", "Age"') == [('notas', 'a "b", c')]
+    assert parser.feed(': 61') == []
+    assert parser.feed('}') == [('Age', 61)]
@@ -0,0 +1,29 @@
+"""Tests de KidneyDiseaseModel sobre el dataset incluido."""
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from model import KidneyDiseaseModel
+
+
+def test_update_scaler_keeps_columns_without_new_values(dataset):
+    X = dataset.drop(columns='Diagnosis')
+    old, new = X.iloc[:2000], X.iloc[2000:]
+    unobserved = new.isna().all().to_numpy()
+    assert unobserved.any()
+
+    model = KidneyDiseaseModel()
+    model.scaler = StandardScaler().fit(old)
+    old_mean, old_scale = model.scaler.mean_.copy(), model.scaler.scale_.copy()
+    model._update_scaler(new)
+
+    np.testing.assert_array_equal(model.scaler.mean_[unobserved], old_mean[unobserved])
+    np.testing.assert_array_equal(model.scaler.scale_[unobserved], old_scale[unobserved])
+
+    # Toda columna con algún valor queda como si se hubiera ajustado de una vez
+    full = StandardScaler().fit(X)
+    observed = X.notna().any().to_numpy()
+    assert np.isfinite(model.scaler.scale_[observed]).all()
+    np.testing.assert_allclose(model.scaler.mean_[observed], full.mean_[observed])
+    np.testing.assert_allclose(model.scaler.scale_[observed], full.scale_[observed])
+    np.testing.assert_array_equal(model.scaler.n_samples_seen_, full.n_samples_seen_)
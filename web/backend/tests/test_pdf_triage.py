@@ -0,0 +1,13 @@
+"""Tests del triaje de páginas de PDF."""
+
+from pdf_triage import score_page, select_pages
+
+LABS = "Creatinina 1.4 mg/dl, HbA1c 7.2 %, TA 145/90 mmHg, colesterol 210 mg/dl."
+NARRATIVE = "El paciente acude a consulta acompañado por su familia y refiere buen estado general."
+
+
+def test_select_pages_keeps_pages_without_text_layer():
+    texts = ["Informe. Edad 61 años, mujer.", NARRATIVE, LABS, "", NARRATIVE, LABS]
+    kept = select_pages([score_page(text) for text in texts], max_pages=2)
+
+    assert kept == [0, 2, 3]
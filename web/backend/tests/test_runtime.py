@@ -0,0 +1,49 @@
+"""Tests de paridad de los runtimes exportados (ONNX y Treelite) con XGBoost."""
+
+import os
+
+import numpy as np
+import pytest
+
+import runtime
+
+
+def _check_runtime_parity(model, fmt, dataset, data_path):
+    manifest = runtime.export_runtimes(model, data_path, formats=(fmt,))
+    assert fmt in manifest['artifacts'], manifest['rejected']
+
+    output_dir = os.path.dirname(model.model_path_json)
+    loaded, _ = runtime.load_runtime(fmt, output_dir, runtime.file_sha1(model.model_path_json))
+    assert loaded is not None and loaded.name == fmt
+
+    X_raw = dataset[manifest['expected_columns']].iloc[:500].to_numpy(dtype=np.float64)
+    X_model = model.scaler.transform(X_raw)[:, manifest['selected_idx']]
+    expected = model.model.predict_proba(X_model)[:, 1]
+    probability = loaded.predict_proba(X_raw)
+
+    np.testing.assert_allclose(probability, expected, atol=runtime.PARITY_ATOL, rtol=0)
+    assert np.array_equal(probability >= model.threshold, expected >= model.threshold)
+
+
+@pytest.fixture
+def trained_model(model_in, model_dir, tmp_path):
+    """Copia del modelo entrenado para que los artefactos no se mezclen entre tests."""
+    model = model_in(model_dir)
+    assert model.load_model()
+    model.model_path_json = str(tmp_path / "mi_modelo.json")
+    model.metadata_path = str(tmp_path / "model_metadata.pkl")
+    model.save_model()
+    return model
+
+
+def test_onnx_runtime_matches_xgboost(trained_model, dataset, data_path):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnxmltools")
+    _check_runtime_parity(trained_model, 'onnx', dataset, data_path)
+
+
+def test_treelite_runtime_matches_xgboost(trained_model, dataset, data_path):
+    pytest.importorskip("treelite")
+    pytest.importorskip("tl2cgen")
+    _check_runtime_parity(trained_model, 'treelite', dataset, data_path)
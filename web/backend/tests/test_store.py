@@ -0,0 +1,30 @@
+"""Tests del historial de pacientes."""
+
+from datetime import datetime, timezone
+
+from store import PatientStore
+
+
+def _epoch(year: int) -> float:
+    return datetime(year, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def test_egfr_slope_ignores_imputed_egfr(tmp_path):
+    store = PatientStore(path=str(tmp_path / "historial.db"))
+    store.start()
+    for year, egfr, imputed in [
+        (2024, 64.5, []),
+        (2025, 39.6, []),
+        (2026, 64.5, ['SerumCreatinine', 'GFR']),  # Sin creatinina: creatinina 1.0 por defecto
+    ]:
+        result = {"probability": 0.5, "risk_class": 1, "egfr": egfr, "imputed_fields": imputed}
+        store.record_prediction("p1", result, created_at=_epoch(year))
+    store.stop()
+
+    slope = store.egfr_slope("p1")
+
+    assert slope["n_measurements"] == 2
+    assert slope["n_imputed_excluded"] == 1
+    assert slope["latest_egfr"] == 39.6
+    assert slope["rapid_decline"]
+    assert slope["slope_per_year"] < -20
@@ -0,0 +1,12 @@
+"""Tests del generador sintético (cópula gaussiana)."""
+
+import synthetic
+
+
+def test_fit_and_generate_on_shipped_dataset(data_path):
+    copula = synthetic.fit(data_path)
+    chunks = list(synthetic.generate(copula, n_rows=500, chunk_size=200))
+
+    assert [len(chunk) for chunk in chunks] == [200, 200, 100]
+    assert chunks[0].columns.tolist() == copula['columns'] + [synthetic.TARGET]
+    assert set(chunks[0][synthetic.TARGET].unique()) <= {0, 1}
@@ -0,0 +1,84 @@
+"""Tests de entrenamiento sobre el dataset incluido (contiene NaN)."""
+
+import shutil
+
+import numpy as np
+import pytest
+
+import cascade
+from cascade import screen
+
+
+def test_train_fits_cascade_on_data_with_missing_values(model_in, model_dir, dataset):
+    assert dataset.drop(columns='Diagnosis').isna().any().any()
+
+    model = model_in(model_dir)
+    assert model.load_model()
+    assert model.cascade is not None
+    assert np.isfinite(model.cascade['coef']).all()
+    assert np.isfinite(model.cascade['intercept'])
+
+
+def test_screen_fills_missing_and_sends_non_finite_rows_to_booster():
+    active = {'coef': np.array([1.0, 1.0]), 'intercept': 0.0, 'lower': 0.9, 'upper': 0.95}
+    X = np.array([[0.0, 0.0], [np.nan, np.nan], [np.inf, -np.inf]])
+
+    probability, uncertain = screen(active, X)
+
+    np.testing.assert_allclose(probability[:2], 0.5)
+    assert uncertain.tolist() == [False, False, True]
+
+
+def test_predictions_with_cascade_are_finite(model_in, model_dir, dataset, monkeypatch):
+    monkeypatch.setattr(cascade, 'CASCADE_ENABLED', True)
+    model = model_in(model_dir)
+    model.load_model()
+    model.active_cascade = {**model.cascade, 'coef': np.asarray(model.cascade['coef'])}
+
+    records = dataset.drop(columns='Diagnosis').iloc[:200]
+    assert records.isna().any(axis=1).any()
+    result = model.predict_batch(records)
+    assert np.isfinite(result['probability']).all()
+
+    row = records[records.isna().any(axis=1)].iloc[0]
+    single = model.predict({k: v for k, v in row.items() if v == v})
+    assert 'error' not in single
+    assert np.isfinite(single['probability'])
+
+
+def test_train_incremental_keeps_the_saved_recipe(model_in, model_dir, data_path, tmp_path):
+    # Modelo guardado con una receta afinada (como tras tune_model --promote)
+    tuned = model_in(model_dir)
+    tuned.load_model()
+    tuned.train_params = {**tuned.train_params, 'learning_rate': 0.05, 'max_depth': 3, 'subsample': 0.85}
+    tuned.model_path_json = str(tmp_path / "mi_modelo.json")
+    tuned.metadata_path = str(tmp_path / "model_metadata.pkl")
+    tuned.save_model()
+    new_data = tmp_path / "nuevos.csv"
+    shutil.copy(data_path, new_data)
+
+    model = model_in(tmp_path)
+    model.train_incremental(str(new_data))
+
+    assert model.cascade is not None
+    assert np.isfinite(model.cascade['coef']).all()
+    params = model.model.get_params()
+    assert (params['learning_rate'], params['max_depth'], params['subsample']) == (0.05, 3, 0.85)
+    assert model.train_params['learning_rate'] == 0.05
+
+
+def test_predict_batch_skips_imputation_for_imputed_records(model_in, model_dir, dataset, monkeypatch):
+    import model as model_module
+    from imputation import impute
+
+    model = model_in(model_dir)
+    model.load_model()
+    raw = dataset.drop(columns='Diagnosis').iloc[:200]
+    expected = model.predict_batch(raw)
+
+    records, imputed = impute(raw)
+    monkeypatch.setattr(model_module, 'impute', lambda records: pytest.fail("imputación repetida"))
+    result = model.predict_batch(records, imputed=imputed)
+
+    np.testing.assert_array_equal(result['probability'], expected['probability'])
+    assert result['imputed'] is imputed
@@ -6,6 +6,7 @@ Ejecutar este script para entrenar o re-entrenar el modelo de predicción de ERC
 import os
 import sys
 import logging
+import argparse
 
 # Configurar logging
 logging.basicConfig(
@@ -33,8 +34,52 @@ def find_dataset():
     return None
 
 
+def parse_args():
+    """Parsea los argumentos de línea de comandos."""
+    parser = argparse.ArgumentParser(description="Entrenamiento del modelo NephroMind")
+    parser.add_argument(
+        "--incremental", metavar="CSV", nargs="?", const="",
+        help="Continúa el modelo guardado con casos nuevos (por defecto, filas añadidas al dataset)"
+    )
+    parser.add_argument(
+        "--new-estimators", type=int, default=50,
+        help="Árboles a añadir en modo incremental"
+    )
+    parser.add_argument(
+        "--tune", metavar="N_TRIALS", type=int,
+        help="Búsqueda de hiperparámetros en paralelo con N trials"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Procesos (--tune, --experiments) o folds en paralelo (--cv)"
+    )
+    parser.add_argument(
+        "--cv", metavar="K", type=int,
+        help="Evalúa el modelo guardado con validación cruzada de K folds"
+    )
+    parser.add_argument(
+        "--experiments", action="store_true",
+        help="Compara modelos y remuestreos (SMOTE/ADASYN) en paralelo sobre un split cacheado"
+    )
+    parser.add_argument(
+        "--compact", action="store_true",
+        help="Genera un modelo compacto de serving a partir del modelo guardado"
+    )
+    parser.add_argument(
+        "--export", metavar="FORMATS", nargs="?", const="onnx,treelite",
+        help="Exporta el modelo guardado a runtimes alternativos (onnx,treelite) con comprobación de paridad"
+    )
+    parser.add_argument(
+        "--promote", action="store_true",
+        help="Con --tune, guarda el mejor modelo como modelo de producción"
+    )
+    return parser.parse_args()
+
+
 def main():
     """Función principal de entrenamiento."""
+    args = parse_args()
+    
     logger.info("=" * 60)
     logger.info("NEPHROMIND - ENTRENAMIENTO DE MODELO")
     logger.info("=" * 60)
@@ -43,7 +88,7 @@ def main():
     from model import KidneyDiseaseModel
     
     # Buscar dataset
-    data_path = find_dataset()
+    data_path = args.incremental or find_dataset()
     
     if data_path is None:
         logger.error("❌ Dataset no encontrado.")
@@ -56,7 +101,39 @@ def main():
     model = KidneyDiseaseModel()
     
     try:
-        model.train(data_path)
+        if args.cv:
+            from evaluation import cross_validate
+            if not model.load_model():
+                sys.exit(1)
+            cross_validate(model, data_path, n_splits=args.cv, n_jobs=args.workers)
+            return
+        elif args.experiments:
+            from experiments import run_experiments
+            run_experiments(model, data_path, n_workers=args.workers)
+            return
+        elif args.export:
+            from runtime import export_runtimes
+            if not model.load_model(compact=args.compact, runtime='xgboost'):
+                sys.exit(1)
+            model_path = model.loaded_model_path
+            manifest = export_runtimes(model, data_path, args.export.split(','), model_path)
+            if not manifest['artifacts']:
+                sys.exit(1)
+            return
+        elif args.compact:
+            from compaction import compact_model
+            if not model.load_model():
+                sys.exit(1)
+            if compact_model(model, data_path) is None:
+                sys.exit(1)
+            return
+        elif args.tune:
+            from tuning import tune_model
+            model = tune_model(data_path, n_trials=args.tune, n_workers=args.workers, promote=args.promote)
+        elif args.incremental is not None:
+            model.train_incremental(data_path, n_new_estimators=args.new_estimators)
+        else:
+            model.train(data_path)
         logger.info("=" * 60)
         logger.info("✅ ENTRENAMIENTO COMPLETADO EXITOSAMENTE")
         logger.info(f"   Modelo guardado en: {model.model_path_json}")
@@ -0,0 +1,280 @@
+"""
+NephroMind - Búsqueda de hiperparámetros
+Búsqueda aleatoria en paralelo de parámetros del booster y sensibilidad objetivo,
+con early stopping sobre un split de validación estratificado.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+
+import joblib
+import numpy as np
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+from sklearn.feature_selection import RFE
+from sklearn.metrics import confusion_matrix, roc_auc_score
+from xgboost import XGBClassifier
+
+from cascade import fit_cascade
+from model import KidneyDiseaseModel
+from monitoring import build_reference_profile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Requisito clínico: ningún candidato puede operar por debajo de esta sensibilidad
+MIN_TARGET_SENSITIVITY = 0.98
+
+# Espacio de búsqueda. n_estimators es un tope: el early stopping decide
+# cuántos árboles se usan, nunca más que el modelo de producción.
+SEARCH_SPACE = {
+    'max_depth': [3, 4, 5, 6],
+    'learning_rate': [0.03, 0.05, 0.1, 0.2],
+    'subsample': [0.7, 0.85, 1.0],
+    'colsample_bytree': [0.6, 0.8, 1.0],
+    'min_child_weight': [1, 3, 5],
+    'reg_lambda': [0.5, 1.0, 5.0],
+    'target_sensitivity': [0.98, 0.99],
+}
+MAX_ESTIMATORS = 200
+EARLY_STOPPING_ROUNDS = 20
+N_FEATURES = 20
+
+# Datos compartidos por los procesos worker (se cargan una vez por proceso)
+_worker_data: Dict[str, np.ndarray] = {}
+
+
+def _init_worker(X_fit, y_fit, X_val, y_val, scale_pos_weight):
+    """Inicializa los datos del worker para no serializarlos en cada trial."""
+    _worker_data.update(
+        X_fit=X_fit, y_fit=y_fit, X_val=X_val, y_val=y_val,
+        scale_pos_weight=scale_pos_weight
+    )
+
+
+def _run_trial(trial_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Entrena un candidato con early stopping y evalúa en validación."""
+    start = time.perf_counter()
+    booster_params = {k: v for k, v in params.items() if k != 'target_sensitivity'}
+
+    model = XGBClassifier(
+        n_estimators=MAX_ESTIMATORS,
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+        scale_pos_weight=_worker_data['scale_pos_weight'],
+        random_state=42,
+        n_jobs=1,  # Un hilo por trial: el paralelismo está en el pool
+        eval_metric='logloss',
+        **booster_params
+    )
+    model.fit(
+        _worker_data['X_fit'], _worker_data['y_fit'],
+        eval_set=[(_worker_data['X_val'], _worker_data['y_val'])],
+        verbose=False
+    )
+
+    y_val = _worker_data['y_val']
+    y_proba = model.predict_proba(_worker_data['X_val'])[:, 1]
+    threshold = KidneyDiseaseModel.find_threshold(y_val, y_proba, params['target_sensitivity'])
+    tn, fp, fn, tp = confusion_matrix(y_val, (y_proba >= threshold).astype(int), labels=[0, 1]).ravel()
+
+    return {
+        'trial': trial_id,
+        'params': params,
+        'n_trees': int(model.best_iteration) + 1,
+        'threshold': threshold,
+        'sensitivity': float(tp / (tp + fn)) if (tp + fn) > 0 else 0.0,
+        'specificity': float(tn / (tn + fp)) if (tn + fp) > 0 else 0.0,
+        'roc_auc': float(roc_auc_score(y_val, y_proba)),
+        'seconds': round(time.perf_counter() - start, 2),
+    }
+
+
+def _sample_params(n_trials: int, seed: int) -> List[Dict[str, Any]]:
+    """Muestrea combinaciones del espacio de búsqueda (sin repetir)."""
+    rng = np.random.default_rng(seed)
+    trials, seen = [], set()
+    max_combinations = int(np.prod([len(v) for v in SEARCH_SPACE.values()]))
+
+    while len(trials) < min(n_trials, max_combinations):
+        params = {k: v[rng.integers(len(v))] for k, v in SEARCH_SPACE.items()}
+        params = {k: v.item() if isinstance(v, np.generic) else v for k, v in params.items()}
+        key = tuple(sorted(params.items()))
+        if key not in seen:
+            seen.add(key)
+            trials.append(params)
+
+    return trials
+
+
+def _select_features(
+    model: KidneyDiseaseModel,
+    data_path: str,
+    X_scaled: np.ndarray,
+    y: np.ndarray,
+    scale_pos_weight: float
+) -> List[str]:
+    """
+    Selecciona features con RFE, cacheando el resultado en disco.
+
+    La clave del caché depende del contenido del dataset, así que sucesivas
+    búsquedas sobre los mismos datos no vuelven a ejecutar RFE.
+    """
+    cache_path = os.path.join(os.path.dirname(model.model_path_json), "feature_cache.pkl")
+    with open(data_path, "rb") as f:
+        data_hash = hashlib.sha1(f.read()).hexdigest()
+    cache_key = f"{data_hash}:{N_FEATURES}"
+
+    cache = joblib.load(cache_path) if os.path.exists(cache_path) else {}
+    if cache_key in cache:
+        logger.info("Features seleccionadas recuperadas del caché")
+        return cache[cache_key]
+
+    logger.info("Seleccionando features con RFE...")
+    selector_model = XGBClassifier(
+        n_estimators=100,
+        max_depth=3,
+        random_state=42,
+        n_jobs=-1,
+        eval_metric='logloss',
+        scale_pos_weight=scale_pos_weight
+    )
+    rfe = RFE(estimator=selector_model, n_features_to_select=N_FEATURES, step=1)
+    rfe.fit(X_scaled, y)
+    columns = np.array(model.all_columns)[rfe.support_].tolist()
+
+    cache[cache_key] = columns
+    joblib.dump(cache, cache_path)
+    return columns
+
+
+def tune_model(
+    data_path: str,
+    n_trials: int = 24,
+    n_workers: Optional[int] = None,
+    seed: int = 42,
+    promote: bool = False
+) -> KidneyDiseaseModel:
+    """
+    Ejecuta la búsqueda de hiperparámetros y guarda leaderboard y mejor modelo.
+
+    Los trials se ordenan por especificidad a la sensibilidad objetivo
+    (validación), luego ROC AUC y por último menor número de árboles. Todas
+    las sensibilidades objetivo son >= MIN_TARGET_SENSITIVITY, y solo se
+    promociona un candidato que la alcanza en validación.
+
+    Args:
+        data_path: Ruta al CSV de entrenamiento
+        n_trials: Número de combinaciones a evaluar
+        n_workers: Procesos del pool (por defecto, núcleos disponibles)
+        seed: Semilla del muestreo de parámetros
+        promote: Si True, el mejor modelo sustituye a mi_modelo.json
+
+    Returns:
+        Modelo con la mejor configuración, entrenado y guardado
+    """
+    logger.info("=" * 50)
+    logger.info("INICIANDO BÚSQUEDA DE HIPERPARÁMETROS")
+    logger.info("=" * 50)
+
+    if min(SEARCH_SPACE['target_sensitivity']) < MIN_TARGET_SENSITIVITY:
+        raise ValueError(f"target_sensitivity por debajo del mínimo clínico ({MIN_TARGET_SENSITIVITY:.0%})")
+
+    model = KidneyDiseaseModel()
+    df = model.load_data(data_path)
+    X = df.drop('Diagnosis', axis=1)
+    y = df['Diagnosis'].astype(int)
+    model.all_columns = X.columns.tolist()
+    model.data_path = os.path.abspath(data_path)
+    model.rows_seen = len(df)
+
+    # Mismo split de test que train(); validación estratificada dentro de train
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42, stratify=y
+    )
+    X_fit, X_val, y_fit, y_val = train_test_split(
+        X_train, y_train, test_size=0.2, random_state=42, stratify=y_train
+    )
+
+    n_pos = y_fit.sum()
+    scale_pos_weight = (len(y_fit) - n_pos) / n_pos
+
+    model.scaler = StandardScaler()
+    X_fit_scaled = model.scaler.fit_transform(X_fit)
+    model.reference_profile = build_reference_profile(X_fit)
+    model.columns = _select_features(model, data_path, X_fit_scaled, y_fit.values, scale_pos_weight)
+    logger.info(f"Features seleccionadas ({len(model.columns)}): {model.columns}")
+
+    selected_idx = [model.all_columns.index(col) for col in model.columns]
+    X_fit_sel = X_fit_scaled[:, selected_idx]
+    X_val_sel = model.scaler.transform(X_val)[:, selected_idx]
+    X_test_sel = model.scaler.transform(X_test)[:, selected_idx]
+
+    # Lanzar trials en paralelo
+    trials = _sample_params(n_trials, seed)
+    n_workers = n_workers or os.cpu_count() or 1
+    logger.info(f"Ejecutando {len(trials)} trials en {n_workers} procesos...")
+
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        initializer=_init_worker,
+        initargs=(X_fit_sel, y_fit.values, X_val_sel, y_val.values, scale_pos_weight)
+    ) as pool:
+        futures = [pool.submit(_run_trial, i, params) for i, params in enumerate(trials)]
+        results = [f.result() for f in futures]
+
+    leaderboard = sorted(
+        results,
+        key=lambda r: (r['sensitivity'] >= r['params']['target_sensitivity'],
+                       r['specificity'], r['roc_auc'], -r['n_trees']),
+        reverse=True
+    )
+
+    output_dir = os.path.dirname(model.model_path_json)
+    leaderboard_path = os.path.join(output_dir, "tuning_leaderboard.json")
+    with open(leaderboard_path, "w") as f:
+        json.dump(leaderboard, f, indent=2)
+    logger.info(f"Leaderboard guardado en: {leaderboard_path}")
+
+    best = leaderboard[0]
+    logger.info(f"Mejor trial: {best['trial']} - {best['params']} ({best['n_trees']} árboles)")
+    if promote and best['sensitivity'] < MIN_TARGET_SENSITIVITY:
+        logger.warning(f"El mejor trial no alcanza {MIN_TARGET_SENSITIVITY:.0%} de sensibilidad "
+                       f"en validación ({best['sensitivity']:.3f}). No se promociona.")
+        promote = False
+
+    # Reentrenar el mejor candidato con el número de árboles hallado
+    booster_params = {k: v for k, v in best['params'].items() if k != 'target_sensitivity'}
+    model.model = XGBClassifier(
+        n_estimators=best['n_trees'],
+        scale_pos_weight=scale_pos_weight,
+        random_state=42,
+        n_jobs=-1,
+        eval_metric='logloss',
+        **booster_params
+    )
+    model.model.fit(X_fit_sel, y_fit)
+    model._record_train_params()
+    model._optimize_threshold(X_val_sel, y_val, best['params']['target_sensitivity'])
+    # Sin cascada, promocionar desactivaría NEPHROMIND_CASCADE en producción
+    model.cascade = fit_cascade(
+        model.model, X_fit_sel, X_val_sel, y_val, model.threshold, best['params']['target_sensitivity']
+    )
+
+    if not promote:
+        model.model_path_json = os.path.join(output_dir, "mi_modelo_tuned.json")
+        model.metadata_path = os.path.join(output_dir, "model_metadata_tuned.pkl")
+        model.metrics_path = os.path.join(output_dir, "tuned_metrics.json")
+
+    model._evaluate_model(X_test_sel, y_test)
+    model.save_model()
+
+    logger.info("=" * 50)
+    logger.info("BÚSQUEDA COMPLETADA")
+    logger.info("=" * 50)
+
+    return model
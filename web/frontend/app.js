@@ -1084,7 +1084,7 @@ async function handleFileUpload(file) {
     try {
         const baseUrl = getApiBaseUrl();
         // Remove /api from here because it's now part of baseUrl if needed
-        const response = await fetch(`${baseUrl}/analyze_pdf`, {
+        const response = await fetch(`${baseUrl}/analyze_pdf/stream`, {
             method: 'POST',
             body: formData
         });
@@ -1094,7 +1094,9 @@ async function handleFileUpload(file) {
             throw new Error(errorData.detail || 'Error en el análisis del PDF');
         }
 
-        const result = await response.json();
+        // Fields are shown as soon as they are decoded; the final result is authoritative
+        window.autoFilledFields.clear();
+        const result = await readExtractionStream(response);
 
         // Populate form with extracted data
         populateForm(result.extracted_data);
@@ -1114,48 +1116,104 @@ async function handleFileUpload(file) {
         uploadLoading.classList.add('hidden');
         uploadContent.classList.remove('hidden');
         fileInput.value = '';
+        setUploadStatus('Analizando documento con IA...');
     }
 }
 
-function populateForm(data) {
-    window.autoFilledFields.clear();
-
-    for (const [key, value] of Object.entries(data)) {
-        if (value === null || value === undefined || value === '') continue;
+const UPLOAD_STAGES = {
+    triage: (data) => `Seleccionadas ${data.kept_pages.length} de ${data.n_pages} páginas con datos clínicos...`,
+    upload: (data) => `Subiendo documento (intento ${data.attempt}/${data.max_attempts})...`,
+    extraction: () => 'Extrayendo datos con IA...',
+    hedge: (data) => `Extrayendo datos con IA (estrategia ${data.strategy})...`,
+    fallback: () => 'Reintentando con una estrategia alternativa...',
+    retry_wait: (data) => `Reintentando en ${data.wait_seconds} s...`
+};
 
-        let finalValue = value;
+function setUploadStatus(text) {
+    const status = uploadLoading.querySelector('p');
+    if (status) status.textContent = text;
+}
 
-        // Conversión de unidades para ProteinInUrine (mg/dL -> g/L)
-        if (key === 'ProteinInUrine' && typeof value === 'number' && value > 10) {
-            finalValue = (value / 100).toFixed(2);  // Redondear a 2 decimales
-            console.log(`Convirtiendo ProteinInUrine: ${value} mg/dL -> ${finalValue} g/L`);
+// Reads the Server-Sent Events of /analyze_pdf/stream and resolves with the final result
+async function readExtractionStream(response) {
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += value;
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const message = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            for (const line of message.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            if (!data) continue;  // keep-alive comment
+            const payload = JSON.parse(data);
+
+            if (event === 'progress' && UPLOAD_STAGES[payload.stage]) {
+                setUploadStatus(UPLOAD_STAGES[payload.stage](payload));
+            } else if (event === 'field') {
+                populateField(payload.field, payload.value);
+            } else if (event === 'result') {
+                return payload;
+            } else if (event === 'error') {
+                throw new Error(payload.detail || 'Error en el análisis del PDF');
+            }
         }
+    }
+    throw new Error('La conexión se cerró antes de terminar el análisis');
+}
 
-        const input = document.querySelector(`[name="${key}"]`);
-        if (input) {
-            // Asegurar que el valor es válido antes de asignarlo
-            if (input.type === 'number') {
-                const numValue = parseFloat(finalValue);
-                if (!isNaN(numValue)) {
-                    input.value = numValue;
-                } else {
-                    console.warn(`Valor inválido para ${key}: ${finalValue}, omitiendo`);
-                    continue;
-                }
-            } else {
-                input.value = finalValue;
-            }
+function populateField(key, value) {
+    if (value === null || value === undefined || value === '') return;
 
-            input.classList.add('auto-filled');
-            window.autoFilledFields.add(key);
+    let finalValue = value;
 
-            // Trigger change event for listeners
-            input.dispatchEvent(new Event('change'));
+    // Conversión de unidades para ProteinInUrine (mg/dL -> g/L)
+    if (key === 'ProteinInUrine' && typeof value === 'number' && value > 10) {
+        finalValue = (value / 100).toFixed(2);  // Redondear a 2 decimales
+        console.log(`Convirtiendo ProteinInUrine: ${value} mg/dL -> ${finalValue} g/L`);
+    }
+
+    const input = document.querySelector(`[name="${key}"]`);
+    if (!input) return;
 
-            // Highlight animation
-            input.classList.add('highlight-transition');
-            setTimeout(() => input.classList.remove('highlight-transition'), 2000);
+    // Asegurar que el valor es válido antes de asignarlo
+    if (input.type === 'number') {
+        const numValue = parseFloat(finalValue);
+        if (isNaN(numValue)) {
+            console.warn(`Valor inválido para ${key}: ${finalValue}, omitiendo`);
+            return;
         }
+        input.value = numValue;
+    } else {
+        input.value = finalValue;
+    }
+
+    input.classList.add('auto-filled');
+    window.autoFilledFields.add(key);
+
+    // Trigger change event for listeners
+    input.dispatchEvent(new Event('change'));
+
+    // Highlight animation
+    input.classList.add('highlight-transition');
+    setTimeout(() => input.classList.remove('highlight-transition'), 2000);
+}
+
+function populateForm(data) {
+    window.autoFilledFields.clear();
+
+    for (const [key, value] of Object.entries(data)) {
+        populateField(key, value);
     }
 
     // Recalculate GFR if creatinine was filled